@@ -9,19 +9,20 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 import django
-from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 from django.core.asgi import get_asgi_application
-from Techinicien import routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Tech.settings')
 django.setup()
 
+from Techinicien import routing
+from Techinicien.middleware import JWTAuthMiddleware
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AllowedHostsOriginValidator(
-        AuthMiddlewareStack(
+        JWTAuthMiddleware(
             URLRouter(
                 routing.websocket_urlpatterns
             )
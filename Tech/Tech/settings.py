@@ -77,13 +77,19 @@ TEMPLATES = [
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Templates compilés une fois par processus (emails de notification), y compris avec DEBUG
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -114,6 +120,26 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache (Redis si configuré, sinon cache mémoire local au processus)
+# Avec plusieurs processus, CACHE_REDIS_URL est nécessaire : le verrou et l'état des
+# diagnostics en arrière-plan, comme le cache des statistiques, doivent être partagés
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tech-cache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -151,6 +177,44 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
 
+# Nombre maximum d'utilisateurs gardés en cache par le middleware d'authentification WebSocket
+WEBSOCKET_AUTH_CACHE_TAILLE = 1024
+# Durée de vie (secondes) d'un utilisateur dans ce cache : délai maximal pour qu'un autre worker
+# voie une désactivation ou un changement de rôle
+WEBSOCKET_AUTH_CACHE_TTL = int(os.getenv('WEBSOCKET_AUTH_CACHE_TTL', 60))
+
+# Durée (secondes) de mise en cache de l'annuaire des destinataires de notifications
+NOTIFICATION_ANNUAIRE_CACHE_TTL = int(os.getenv('NOTIFICATION_ANNUAIRE_CACHE_TTL', 60))
+
+# Durée (secondes) de mise en cache des statistiques de tickets par périmètre
+TICKET_STATS_CACHE_TTL = int(os.getenv('TICKET_STATS_CACHE_TTL', 30))
+
+# Durée (secondes) de conservation d'une version sérialisée de ticket (TicketListSerializer)
+TICKET_SERIALISATION_CACHE_TTL = int(os.getenv('TICKET_SERIALISATION_CACHE_TTL', 600))
+
+# Diagnostic système : délai (secondes) par défaut d'une sonde et échéance globale de l'ensemble
+DIAGNOSTIC_DELAI_SONDE = float(os.getenv('DIAGNOSTIC_DELAI_SONDE', 10))
+DIAGNOSTIC_DELAI_GLOBAL = float(os.getenv('DIAGNOSTIC_DELAI_GLOBAL', 20))
+# Nombre de diagnostics système exécutés simultanément en arrière-plan
+DIAGNOSTIC_EXECUTIONS_SIMULTANEES = int(os.getenv('DIAGNOSTIC_EXECUTIONS_SIMULTANEES', 4))
+# Durée (secondes) du verrou d'une session en attente d'exécution dans la file
+DIAGNOSTIC_VERROU_ATTENTE = int(os.getenv('DIAGNOSTIC_VERROU_ATTENTE', 600))
+# Threads partagés par les sondes de toutes les exécutions (vide : 9 par exécution simultanée)
+DIAGNOSTIC_THREADS_SONDES = int(os.getenv('DIAGNOSTIC_THREADS_SONDES', 0)) or None
+# Durée de validité (secondes) de l'instantané psutil partagé par les sondes, et arrêt des
+# relevés CPU de référence en arrière-plan après cette durée (secondes) sans diagnostic
+DIAGNOSTIC_ECHANTILLON_TTL = float(os.getenv('DIAGNOSTIC_ECHANTILLON_TTL', 5))
+DIAGNOSTIC_ECHANTILLON_INACTIVITE = float(os.getenv('DIAGNOSTIC_ECHANTILLON_INACTIVITE', 120))
+# Banc d'essai du disque de la sonde de performance : répertoire du fichier de test (vide : répertoire
+# temporaire du système), taille de l'échantillon, nombre d'accès aléatoires de 4 Ko, synchronisation
+# ('direct' : O_DIRECT, 'fsync' ou 'aucune' : cache de pages) et lecture par mmap
+DIAGNOSTIC_DISQUE_ACTIF = os.getenv('DIAGNOSTIC_DISQUE_ACTIF', 'True').lower() == 'true'
+DIAGNOSTIC_DISQUE_REPERTOIRE = os.getenv('DIAGNOSTIC_DISQUE_REPERTOIRE') or None
+DIAGNOSTIC_DISQUE_TAILLE_MO = float(os.getenv('DIAGNOSTIC_DISQUE_TAILLE_MO', 4))
+DIAGNOSTIC_DISQUE_OPERATIONS_ALEATOIRES = int(os.getenv('DIAGNOSTIC_DISQUE_OPERATIONS_ALEATOIRES', 64))
+DIAGNOSTIC_DISQUE_SYNCHRONISATION = os.getenv('DIAGNOSTIC_DISQUE_SYNCHRONISATION', 'fsync')
+DIAGNOSTIC_DISQUE_MMAP = os.getenv('DIAGNOSTIC_DISQUE_MMAP', 'False').lower() == 'true'
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -189,8 +253,18 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
+# Connexions SMTP persistantes (services/smtp_service.py)
+SMTP_POOL_TAILLE = int(os.getenv('SMTP_POOL_TAILLE', 2))
+SMTP_POOL_KEEPALIVE = int(os.getenv('SMTP_POOL_KEEPALIVE', 60))  # secondes avant vérification NOOP
+
 # SendGrid API Configuration
 SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
+SENDGRID_API_HOST = os.getenv('SENDGRID_API_HOST')  # ex. serveur HTTP local pour les tests
+
+# File d'envoi des emails (commande traiter_emails)
+EMAIL_OUTBOX_TAILLE_LOT = int(os.getenv('EMAIL_OUTBOX_TAILLE_LOT', 50))
+EMAIL_OUTBOX_MAX_TENTATIVES = int(os.getenv('EMAIL_OUTBOX_MAX_TENTATIVES', 5))
+EMAIL_OUTBOX_DELAI_BASE = int(os.getenv('EMAIL_OUTBOX_DELAI_BASE', 60))  # secondes
 
 # Admin Emails
 ADMIN_EMAILS = [email.strip() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()]
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import CustomUser, Departement, Equipement, Categorie, Ticket, Commentaire, Notification
+from .models import CustomUser, Departement, Equipement, Categorie, Ticket, Commentaire, Notification, EmailSortant, \
+    StatistiqueTicketJour
 
 class CustomUserAdmin(admin.ModelAdmin):
     list_display = ('email', 'first_name', 'last_name', 'role', 'statut', 'departement')
@@ -37,6 +38,17 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('sujet', 'message')
     date_hierarchy = 'date_envoi'
 
+class EmailSortantAdmin(admin.ModelAdmin):
+    list_display = ('ticket', 'type_email', 'destinataire', 'statut', 'tentatives', 'prochaine_tentative', 'date_envoi')
+    list_filter = ('type_email', 'statut')
+    search_fields = ('cle_deduplication', 'derniere_erreur')
+    date_hierarchy = 'date_creation'
+
+class StatistiqueTicketJourAdmin(admin.ModelAdmin):
+    list_display = ('jour', 'statut_ticket', 'priorite', 'categorie', 'departement', 'technicien', 'nombre')
+    list_filter = ('statut_ticket', 'priorite', 'categorie')
+    date_hierarchy = 'jour'
+
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(Departement, DepartementAdmin)
 admin.site.register(Equipement, EquipementAdmin)
@@ -44,3 +56,5 @@ admin.site.register(Categorie, CategorieAdmin)
 admin.site.register(Ticket, TicketAdmin)
 admin.site.register(Commentaire, CommentaireAdmin)
 admin.site.register(Notification, NotificationAdmin)
+admin.site.register(EmailSortant, EmailSortantAdmin)
+admin.site.register(StatistiqueTicketJour, StatistiqueTicketJourAdmin)
@@ -0,0 +1,48 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) pour les vues en lecture interrogées régulièrement
+La version de la ressource est lue en base par une requête peu coûteuse (date de modification,
+compteurs, champs affichés des relations) avant toute sérialisation, sans état propre au
+processus : si le client envoie If-None-Match / If-Modified-Since et que rien n'a changé, la
+réponse est un 304 sans corps.
+Les réponses portent « Cache-Control: private, no-cache » pour que le navigateur revalide à
+chaque appel au lieu de resservir une copie jugée fraîche
+"""
+
+import hashlib
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+
+def etiquette(*parties) -> str:
+    """ETag opaque construit à partir des éléments de version"""
+    return hashlib.md5('|'.join(str(partie) for partie in parties).encode()).hexdigest()
+
+
+def get_conditionnel(version_func):
+    """
+    Décorateur de vue (ou de méthode avec method_decorator) : `version_func(request, *args, **kwargs)`
+    renvoie (etag, last_modified), l'un ou l'autre pouvant être None ; elle est appelée une seule
+    fois par requête, après l'authentification et les permissions DRF
+    """
+    def decorateur(vue):
+        def version(request, *args, **kwargs):
+            if not hasattr(request, '_version_conditionnelle'):
+                request._version_conditionnelle = version_func(request, *args, **kwargs)
+            return request._version_conditionnelle
+
+        vue_conditionnelle = condition(
+            etag_func=lambda request, *args, **kwargs: version(request, *args, **kwargs)[0],
+            last_modified_func=lambda request, *args, **kwargs: version(request, *args, **kwargs)[1],
+        )(vue)
+
+        @wraps(vue)
+        def _vue(request, *args, **kwargs):
+            response = vue_conditionnelle(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return _vue
+
+    return decorateur
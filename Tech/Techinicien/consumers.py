@@ -1,23 +1,43 @@
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import UntypedToken, AccessToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from .models import Ticket, Commentaire
+from django.db import transaction
+from .models import Commentaire, SessionDiagnostic
 from .serializers import CommentaireSerializer
+from .services.diagnostic_execution_service import groupe_diagnostic, obtenir_etat_execution
+from .services.guidage_service import (
+    obtenir_etat_guidage,
+    enregistrer_instruction,
+    enregistrer_confirmation,
+)
+from .services.notification_service import (
+    groupe_role,
+    groupe_utilisateur,
+    normaliser_filtres,
+    correspond_aux_filtres,
+    statistiques_notifications,
+    MODES_DIFFUSION,
+    formater_evenement_ticket,
+    serialiser_ticket_pour_utilisateur,
+)
+from .services.visibilite_service import peut_voir_ticket
+
+logger = logging.getLogger(__name__)
 
-User = get_user_model()
 
 class NotificationConsumer(AsyncWebsocketConsumer):
-    """Consumer pour les notifications globales (nouveaux tickets, assignations, etc.)"""
+    """
+    Consumer pour les notifications globales (nouveaux tickets, assignations, etc.)
+    Chaque socket rejoint le groupe de son rôle et son groupe personnel ; les événements
+    sont ensuite filtrés selon les abonnements envoyés par le client (message 'subscribe')
+    """
 
     async def connect(self):
-        # Vérifier l'authentification via le token JWT
-        token = self.scope['query_string'].decode().split('token=')[-1]
-        self.user = await self.get_user_from_token(token)
+        # Utilisateur authentifié par JWTAuthMiddleware
+        self.user = self.scope['user']
 
-        if self.user is None:
+        if not self.user.is_authenticated:
             await self.close()
             return
 
@@ -26,57 +46,86 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        # Rejoindre le groupe des notifications pour techniciens
-        self.notification_group_name = 'technician_notifications'
-        await self.channel_layer.group_add(
-            self.notification_group_name,
-            self.channel_name
-        )
+        # Rejoindre le groupe du rôle et le groupe personnel
+        self.filtres = {}
+        self.mode = 'complet'
+        self.compteurs = {'livrees': 0, 'filtrees': 0}
+        self.notification_groups = [groupe_role(self.user.role), groupe_utilisateur(self.user.id)]
+        for groupe in self.notification_groups:
+            await self.channel_layer.group_add(groupe, self.channel_name)
 
         await self.accept()
-        print(f"Utilisateur {self.user.email} connecté aux notifications globales")
+        logger.info(f"Utilisateur {self.user.email} connecté aux notifications globales")
 
     async def disconnect(self, close_code):
-        # Quitter le groupe des notifications
-        if hasattr(self, 'notification_group_name'):
-            await self.channel_layer.group_discard(
-                self.notification_group_name,
-                self.channel_name
+        # Quitter les groupes de notifications
+        for groupe in getattr(self, 'notification_groups', []):
+            await self.channel_layer.group_discard(groupe, self.channel_name)
+
+        if hasattr(self, 'compteurs'):
+            logger.info(
+                f"Utilisateur déconnecté des notifications globales "
+                f"(livrées: {self.compteurs['livrees']}, filtrées: {self.compteurs['filtrees']})"
             )
-        print(f"Utilisateur déconnecté des notifications globales")
+
+    async def receive(self, text_data):
+        try:
+            text_data_json = json.loads(text_data)
+        except json.JSONDecodeError:
+            return
+
+        message_type = text_data_json.get('type')
+
+        if message_type == 'subscribe':
+            # Filtres : priorites, categories, departements, assigne_a_moi
+            self.filtres = normaliser_filtres(text_data_json.get('filtres'))
+            # Mode de diffusion des mises à jour : 'complet' (par défaut) ou 'delta'
+            if text_data_json.get('mode') in MODES_DIFFUSION:
+                self.mode = text_data_json['mode']
+            await self.send(text_data=json.dumps({
+                'type': 'subscribed',
+                'filtres': self.filtres,
+                'mode': self.mode
+            }))
+        elif message_type == 'snapshot':
+            # Le client a détecté un écart de version : renvoyer le ticket complet
+            snapshot = await self.get_ticket_snapshot(text_data_json.get('ticket_id'))
+            if snapshot:
+                await self.send(text_data=json.dumps(snapshot))
+        elif message_type == 'stats':
+            await self.send(text_data=json.dumps({
+                'type': 'stats',
+                'connexion': self.compteurs,
+                'global': statistiques_notifications.obtenir() if self.user.role == 'admin' else None
+            }))
+
+    async def envoyer_si_abonne(self, type_message, event):
+        """Envoyer l'événement au client s'il correspond à ses filtres"""
+        if not correspond_aux_filtres(event.get('meta'), self.filtres, self.user.id):
+            self.compteurs['filtrees'] += 1
+            statistiques_notifications.incrementer('filtrees')
+            return
+
+        self.compteurs['livrees'] += 1
+        statistiques_notifications.incrementer('livrees')
+        await self.send(text_data=json.dumps(formater_evenement_ticket(type_message, event, self.mode)))
+
+    @database_sync_to_async
+    def get_ticket_snapshot(self, ticket_id):
+        return serialiser_ticket_pour_utilisateur(ticket_id, self.user)
 
     # Gestionnaires pour les différents types de notifications
     async def new_ticket_notification(self, event):
         """Envoyer une notification de nouveau ticket"""
-        await self.send(text_data=json.dumps({
-            'type': 'new_ticket',
-            'ticket': event['ticket']
-        }))
+        await self.envoyer_si_abonne('new_ticket', event)
 
     async def ticket_updated_notification(self, event):
         """Envoyer une notification de ticket mis à jour"""
-        await self.send(text_data=json.dumps({
-            'type': 'ticket_updated',
-            'ticket': event['ticket']
-        }))
+        await self.envoyer_si_abonne('ticket_updated', event)
 
     async def ticket_assigned_notification(self, event):
         """Envoyer une notification d'assignation de ticket"""
-        await self.send(text_data=json.dumps({
-            'type': 'ticket_assigned',
-            'ticket': event['ticket']
-        }))
-
-    @database_sync_to_async
-    def get_user_from_token(self, token):
-        try:
-            # Valider le token JWT
-            UntypedToken(token)
-            access_token = AccessToken(token)
-            user_id = access_token['user_id']
-            return User.objects.get(id=user_id)
-        except (InvalidToken, TokenError, User.DoesNotExist):
-            return None
+        await self.envoyer_si_abonne('ticket_assigned', event)
 
 
 class TicketConsumer(AsyncWebsocketConsumer):
@@ -84,14 +133,17 @@ class TicketConsumer(AsyncWebsocketConsumer):
         self.ticket_id = self.scope['url_route']['kwargs']['ticket_id']
         self.room_group_name = f'ticket_{self.ticket_id}'
 
-        # Vérifier l'authentification via le token JWT
-        token = self.scope['query_string'].decode().split('token=')[-1]
-        self.user = await self.get_user_from_token(token)
+        # Utilisateur authentifié par JWTAuthMiddleware
+        self.user = self.scope['user']
 
-        if self.user is None:
+        # Même règle de visibilité que l'API REST (mises à jour, deltas et instantanés du ticket)
+        if not self.user.is_authenticated or not await self.peut_voir_ticket():
             await self.close()
             return
 
+        # Mode de diffusion des mises à jour du ticket : 'complet' (par défaut) ou 'delta'
+        self.mode = 'complet'
+
         # Rejoindre le groupe du ticket
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -107,16 +159,33 @@ class TicketConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
+    @database_sync_to_async
+    def peut_voir_ticket(self):
+        return str(self.ticket_id).isdigit() and peut_voir_ticket(self.user, self.ticket_id)
+
     # Recevoir un message du WebSocket
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
         message_type = text_data_json.get('type', 'comment')
         message = text_data_json.get('message', '')
 
+        if message_type == 'mode':
+            if text_data_json.get('mode') in MODES_DIFFUSION:
+                self.mode = text_data_json['mode']
+            return
+
+        if message_type == 'snapshot':
+            # Le client a détecté un écart de version : renvoyer le ticket complet
+            snapshot = await self.get_ticket_snapshot()
+            if snapshot:
+                await self.send(text_data=json.dumps(snapshot))
+            return
+
         if message and message_type in ['comment', 'instruction', 'confirmation']:
-            # Vérifier si l'utilisateur peut envoyer ce type de message
-            can_send = await self.can_user_send_message(message_type)
-            if not can_send:
+            # Autoriser, sauvegarder et sérialiser en un seul passage en base
+            resultat = await self.traiter_message(text_data_json)
+
+            if resultat is None:
                 # Envoyer un message d'erreur à l'utilisateur
                 await self.send(text_data=json.dumps({
                     'type': 'error',
@@ -124,33 +193,16 @@ class TicketConsumer(AsyncWebsocketConsumer):
                 }))
                 return
 
-            # Sauvegarder le commentaire en base selon le type
-            comment = await self.save_comment(text_data_json)
-
-            if comment:
-                # Envoyer le message à tous les membres du groupe
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'chat_message',
-                        'comment': comment
-                    }
-                )
-
-                # Si c'est une confirmation, aussi notifier la mise à jour de l'instruction originale
-                if message_type == 'confirmation':
-                    # Recharger et envoyer l'instruction mise à jour
-                    instruction_id = text_data_json.get('instruction_id')
-                    if instruction_id:
-                        updated_instruction = await self.get_updated_instruction(instruction_id)
-                        if updated_instruction:
-                            await self.channel_layer.group_send(
-                                self.room_group_name,
-                                {
-                                    'type': 'instruction_updated',
-                                    'instruction': updated_instruction
-                                }
-                            )
+            # Une seule diffusion au groupe : le commentaire et, pour une confirmation,
+            # l'instruction mise à jour
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'chat_message',
+                    'comment': resultat['comment'],
+                    'instruction': resultat['instruction']
+                }
+            )
 
     # Recevoir un message du groupe
     async def chat_message(self, event):
@@ -162,6 +214,13 @@ class TicketConsumer(AsyncWebsocketConsumer):
             'comment': comment
         }))
 
+        # Instruction confirmée par ce message
+        if event.get('instruction'):
+            await self.send(text_data=json.dumps({
+                'type': 'instruction_updated',
+                'instruction': event['instruction']
+            }))
+
     # Gestionnaire pour les instructions mises à jour
     async def instruction_updated(self, event):
         instruction = event['instruction']
@@ -174,90 +233,84 @@ class TicketConsumer(AsyncWebsocketConsumer):
 
     # Gestionnaire pour les mises à jour de tickets
     async def ticket_updated(self, event):
-        ticket = event['ticket']
-
-        # Envoyer la mise à jour du ticket au WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'ticket_updated',
-            'ticket': ticket
-        }))
+        # Envoyer la mise à jour du ticket au WebSocket (complète ou en différences)
+        await self.send(text_data=json.dumps(formater_evenement_ticket('ticket_updated', event, self.mode)))
 
     @database_sync_to_async
-    def get_user_from_token(self, token):
-        try:
-            # Valider le token JWT
-            UntypedToken(token)
-            access_token = AccessToken(token)
-            user_id = access_token['user_id']
-            return User.objects.get(id=user_id)
-        except (InvalidToken, TokenError, User.DoesNotExist):
-            return None
+    def get_ticket_snapshot(self):
+        return serialiser_ticket_pour_utilisateur(self.ticket_id, self.user)
 
     @database_sync_to_async
-    def save_comment(self, data):
-        try:
-            ticket = Ticket.objects.get(id=self.ticket_id)
-
-            # Extraire les données selon le type de message
-            message_type = data.get('type', 'comment')
-            message_content = data.get('message', '')
-
-            # Déterminer si c'est une session de guidage active
-            # Chercher dans TOUS les commentaires du ticket, pas seulement les 10 derniers
-            guidage_actif = False
-            commentaires = ticket.commentaires.order_by('-date_commentaire')
+    def traiter_message(self, data):
+        """
+        Autoriser, sauvegarder et sérialiser un message reçu
+        Retourne None si l'utilisateur ne peut pas envoyer ce message
+        """
+        # Extraire les données selon le type de message
+        message_type = data.get('type', 'comment')
+        message_content = data.get('message', '')
+
+        # État du guidage maintenu par le service (une ligne lue en base), sans parcourir les commentaires
+        etat_guidage = obtenir_etat_guidage(self.ticket_id)
+        if etat_guidage is None:
+            return None
+        guidage_actif = etat_guidage['est_actif']
 
-            for comment in commentaires:
-                if comment.type_action == 'guidage_debut':
-                    guidage_actif = True
-                    break
-                elif comment.type_action == 'guidage_fin':
-                    guidage_actif = False
-                    break
+        # Si le guidage est actif et que l'utilisateur est un employé,
+        # il ne peut envoyer que des confirmations, pas des messages normaux
+        if guidage_actif and self.user.role == 'employe' and message_type == 'comment':
+            return None
 
-            print(f"DEBUG: Mode guidage actif: {guidage_actif}, User role: {self.user.role}")
+        instruction = None
 
+        with transaction.atomic():
             # Déterminer le type d'action selon le type de message et le contexte
             if message_type == 'instruction':
                 type_action = 'instruction'
                 est_instruction = True
-                numero_etape = data.get('numero_etape')
                 attendre_confirmation = data.get('attendre_confirmation', True)
+                numero_etape = enregistrer_instruction(
+                    self.ticket_id, data.get('numero_etape'), attendre_confirmation
+                )
             elif message_type == 'confirmation':
                 type_action = 'confirmation_etape'
                 est_instruction = False
                 numero_etape = None
                 attendre_confirmation = False
                 # Trouver et marquer l'instruction comme confirmée
-                commentaire_parent_id = data.get('commentaire_parent_id')
+                commentaire_parent_id = data.get('commentaire_parent_id') or data.get('instruction_id')
                 if commentaire_parent_id:
                     try:
-                        parent_comment = Commentaire.objects.get(id=commentaire_parent_id)
-                        parent_comment.marquer_comme_confirme()
+                        instruction = Commentaire.objects.select_related('utilisateur_auteur').get(
+                            id=commentaire_parent_id, ticket_id=self.ticket_id
+                        )
+                        # Seule une instruction peut être confirmée (comme ConfirmInstructionView)
+                        if not instruction.est_instruction:
+                            return None
+                        if not instruction.est_confirme:
+                            # La diffusion est faite par le consumer, pas par le signal
+                            instruction._sans_diffusion = True
+                            instruction.marquer_comme_confirme()
+                            enregistrer_confirmation(instruction)
                     except Commentaire.DoesNotExist:
-                        pass
+                        instruction = None
             else:  # message_type == 'comment'
                 # Si le guidage est actif et que l'utilisateur est un technicien,
                 # traiter le message comme une instruction
                 if guidage_actif and self.user.role == 'technicien':
                     type_action = 'instruction'
                     est_instruction = True
-                    # Calculer le numéro d'étape suivant
-                    derniere_instruction = ticket.commentaires.filter(
-                        est_instruction=True
-                    ).order_by('-numero_etape').first()
-                    numero_etape = (derniere_instruction.numero_etape + 1) if derniere_instruction and derniere_instruction.numero_etape else 1
+                    # Numéro d'étape suivant attribué par le service de guidage
                     attendre_confirmation = True
-                    print(f"DEBUG: Instruction créée - Étape {numero_etape}")
+                    numero_etape = enregistrer_instruction(self.ticket_id)
                 else:
                     type_action = 'ajout_commentaire'
                     est_instruction = False
                     numero_etape = None
                     attendre_confirmation = False
-                    print(f"DEBUG: Commentaire normal créé")
 
-            comment = Commentaire.objects.create(
-                ticket=ticket,
+            comment = Commentaire(
+                ticket_id=self.ticket_id,
                 utilisateur_auteur=self.user,
                 contenu=message_content,
                 type_action=type_action,
@@ -265,53 +318,60 @@ class TicketConsumer(AsyncWebsocketConsumer):
                 numero_etape=numero_etape,
                 attendre_confirmation=attendre_confirmation
             )
+            # La diffusion est faite par le consumer, pas par le signal
+            comment._sans_diffusion = True
+            comment.save()
 
-            print(f"DEBUG: Commentaire créé - ID: {comment.id}, est_instruction: {comment.est_instruction}, numero_etape: {comment.numero_etape}")
+        # Sérialiser les données à diffuser
+        return {
+            'comment': CommentaireSerializer(comment).data,
+            'instruction': CommentaireSerializer(instruction).data if instruction else None
+        }
 
-            # Sérialiser le commentaire pour l'envoyer
-            serializer = CommentaireSerializer(comment)
-            return serializer.data
-        except Ticket.DoesNotExist:
-            return None
 
-    @database_sync_to_async
-    def get_updated_instruction(self, instruction_id):
-        try:
-            commentaire = Commentaire.objects.get(id=instruction_id)
-            serializer = CommentaireSerializer(commentaire)
-            return serializer.data
-        except Commentaire.DoesNotExist:
-            return None
+class DiagnosticConsumer(AsyncWebsocketConsumer):
+    """
+    Progression du diagnostic système d'une session, exécuté en arrière-plan
+    Le client reçoit l'état courant à la connexion ('diagnostic_etat'), puis chaque résultat de
+    sonde dès qu'il est disponible ('diagnostic_progression') et la fin de l'exécution
+    ('diagnostic_termine' ou 'diagnostic_erreur')
+    """
 
-    @database_sync_to_async
-    def can_user_send_message(self, message_type):
-        """Vérifier si l'utilisateur peut envoyer ce type de message"""
-        try:
-            ticket = Ticket.objects.get(id=self.ticket_id)
+    async def connect(self):
+        self.session_id = int(self.scope['url_route']['kwargs']['session_id'])
+        self.room_group_name = groupe_diagnostic(self.session_id)
 
-            # Vérifier si une session de guidage est active
-            # Chercher le dernier événement de guidage dans l'ordre chronologique
-            guidage_actif = False
+        # Utilisateur authentifié par JWTAuthMiddleware
+        self.user = self.scope['user']
 
-            # Récupérer tous les événements de guidage ordonnés par date
-            derniers_guidages = ticket.commentaires.filter(
-                type_action__in=['guidage_debut', 'guidage_fin']
-            ).order_by('-date_commentaire')
+        if not self.user.is_authenticated or not await self.peut_suivre_session():
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.accept()
 
-            if derniers_guidages.exists():
-                dernier_evenement = derniers_guidages.first()
-                # Le guidage est actif si le dernier événement est un début
-                guidage_actif = dernier_evenement.type_action == 'guidage_debut'
+        # Rattrapage : résultats déjà publiés avant la connexion
+        etat = await database_sync_to_async(obtenir_etat_execution)(self.session_id)
+        if etat:
+            await self.send(text_data=json.dumps({'type': 'diagnostic_etat', **etat}))
 
-            print(f"DEBUG: Mode guidage actif (backend): {guidage_actif}, User role: {self.user.role}")
+    async def disconnect(self, close_code):
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    @database_sync_to_async
+    def peut_suivre_session(self):
+        """Le propriétaire de la session, les techniciens et les admins"""
+        if self.user.role in ['technicien', 'admin']:
+            return SessionDiagnostic.objects.filter(id=self.session_id).exists()
+        return SessionDiagnostic.objects.filter(id=self.session_id, utilisateur_id=self.user.id).exists()
 
-            # Si le guidage est actif et que l'utilisateur est un employé
-            if guidage_actif and self.user.role == 'employe':
-                # L'employé ne peut envoyer que des confirmations, pas des messages normaux
-                if message_type == 'comment':
-                    return False
+    async def diagnostic_progression(self, event):
+        await self.send(text_data=json.dumps(event))
 
-            return True
+    async def diagnostic_termine(self, event):
+        await self.send(text_data=json.dumps(event))
 
-        except Ticket.DoesNotExist:
-            return False
\ No newline at end of file
+    async def diagnostic_erreur(self, event):
+        await self.send(text_data=json.dumps(event))
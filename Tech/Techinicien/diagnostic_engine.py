@@ -4,11 +4,17 @@ import platform
 import psutil
 import subprocess
 import socket
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Callable, Dict, List, Any, Optional, Tuple
 
 from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .services.banc_disque_service import mesurer_disque
+from .services.echantillonnage_service import echantillonneur_systeme
 from .models import (
     SessionDiagnostic, QuestionDiagnostic, ReponseDiagnostic,
     DiagnosticSysteme, RegleDiagnostic, ChoixReponse, TemplateDiagnostic,
@@ -17,17 +23,87 @@ from .models import (
 
 logger = logging.getLogger(__name__)
 
+_pool_sondes = None
+_verrou_pool_sondes = threading.Lock()
+# Échéance (time.monotonic()) de la sonde exécutée par le thread courant
+_contexte_sonde = threading.local()
+
+
+def _obtenir_pool_sondes() -> ThreadPoolExecutor:
+    """
+    Pool borné partagé par toutes les exécutions : une sonde bloquée au-delà de son délai occupe
+    un thread de ce pool jusqu'à son retour, sans qu'un nouveau thread soit créé pour la suivante
+    """
+    global _pool_sondes
+    with _verrou_pool_sondes:
+        if _pool_sondes is None:
+            threads = getattr(settings, 'DIAGNOSTIC_THREADS_SONDES', None) or (
+                len(DiagnosticSystemeEngine.SONDES) * getattr(settings, 'DIAGNOSTIC_EXECUTIONS_SIMULTANEES', 4)
+            )
+            _pool_sondes = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='diagnostic')
+        return _pool_sondes
+
+
+def echeance_sonde() -> Optional[float]:
+    """Échéance de la sonde en cours dans ce thread (None hors d'une exécution de sondes)"""
+    return getattr(_contexte_sonde, 'echeance', None)
+
+
+def temps_restant(delai_max: float) -> float:
+    """Délai d'un appel bloquant d'une sonde : `delai_max`, réduit au temps restant avant son échéance"""
+    echeance = echeance_sonde()
+    if echeance is None:
+        return delai_max
+    return max(0.0, min(delai_max, echeance - time.monotonic()))
+
 
 class DiagnosticSystemeEngine:
-    """Moteur de diagnostic automatique du système"""
+    """
+    Moteur de diagnostic automatique du système
+    Les sondes sont indépendantes : elles s'exécutent en parallèle dans un pool de threads partagé
+    (la plupart attendent : connexion réseau, sous-processus, test disque), chacune avec son délai
+    et sous une échéance globale. Les appels bloquants reçoivent le temps restant avant cette
+    échéance (temps_restant). Une sonde qui dépasse son délai est rapportée comme interrompue,
+    les autres résultats restent disponibles. Les sondes mémoire, CPU, processus et performance
+    lisent un même instantané psutil (services/echantillonnage_service.py)
+    """
+
+    # Ordre des résultats : celui de l'ancienne exécution séquentielle
+    SONDES = {
+        'memoire': 'diagnostic_memoire',
+        'disque': 'diagnostic_disque',
+        'reseau': 'diagnostic_reseau',
+        'cpu': 'diagnostic_cpu',
+        'services': 'diagnostic_services_windows',
+        'logiciels': 'diagnostic_logiciels',
+        'securite': 'diagnostic_securite',
+        'performance': 'diagnostic_performance',
+        'systeme': 'diagnostic_systeme_os',
+    }
+    # Délais (secondes) par sonde, à compter du lancement commun de toutes les sondes
+    DELAIS_SONDES = {
+        'reseau': 6,
+        'services': 15,
+        'securite': 20,
+    }
+    DELAI_SONDE_PAR_DEFAUT = getattr(settings, 'DIAGNOSTIC_DELAI_SONDE', 10)
+    DELAI_GLOBAL = getattr(settings, 'DIAGNOSTIC_DELAI_GLOBAL', 20)
+    # Banc d'essai du disque dans la sonde de performance (services/banc_disque_service.py)
+    BANC_DISQUE_ACTIF = getattr(settings, 'DIAGNOSTIC_DISQUE_ACTIF', True)
 
     def __init__(self, session: SessionDiagnostic):
         self.session = session
         self.resultats = {}
+        self.latences = {}
         self.debut_diagnostic = time.time()
-
-    def executer_diagnostic_complet(self) -> Dict[str, Any]:
-        """Exécute un diagnostic complet du système"""
+        self._instantane = None
+        self._verrou_instantane = threading.Lock()
+
+    def executer_diagnostic_complet(self, sur_resultat: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Exécute un diagnostic complet du système
+        `sur_resultat(nom, resultat, latence)` est appelé pour chaque sonde dès qu'elle se termine
+        """
         # Enregistrer le début du diagnostic dans l'historique
         HistoriqueDiagnostic.objects.create(
             session=self.session,
@@ -36,33 +112,105 @@ class DiagnosticSystemeEngine:
             details={'action': 'debut_diagnostic_systeme'}
         )
 
-        diagnostics = {
-            'memoire': self.diagnostic_memoire(),
-            'disque': self.diagnostic_disque(),
-            'reseau': self.diagnostic_reseau(),
-            'cpu': self.diagnostic_cpu(),
-            'services': self.diagnostic_services_windows(),
-            'logiciels': self.diagnostic_logiciels(),
-            'securite': self.diagnostic_securite(),
-            'performance': self.diagnostic_performance(),
-            'systeme': self.diagnostic_systeme_os()
+        diagnostics = self.executer_sondes(sur_resultat)
+        logger.info(f"Diagnostic système de la session {self.session.id} : latences {self.latences}")
+
+        self.sauvegarder_resultats(diagnostics)
+
+        return diagnostics
+
+    def executer_sondes(self, sur_resultat: Optional[Callable] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Exécute toutes les sondes en parallèle ; renseigne self.latences (secondes par sonde)
+        Les résultats sont traités dans l'ordre où les sondes se terminent (puis transmis à
+        `sur_resultat`), le dictionnaire renvoyé garde l'ordre de SONDES
+        """
+        pool = _obtenir_pool_sondes()
+        debut = time.monotonic()
+        echeance_globale = debut + self.DELAI_GLOBAL
+        echeances = {
+            nom: min(debut + self.DELAIS_SONDES.get(nom, self.DELAI_SONDE_PAR_DEFAUT), echeance_globale)
+            for nom in self.SONDES
+        }
+        futures = {
+            pool.submit(self._mesurer_sonde, getattr(self, methode), echeances[nom]): nom
+            for nom, methode in self.SONDES.items()
         }
 
-        # Sauvegarder les résultats dans la base de données
-        for type_diag, resultat in diagnostics.items():
-            self.sauvegarder_diagnostic(type_diag, resultat)
+        diagnostics = {}
 
-        # Mettre à jour les données supplémentaires de la session
-        self.session.diagnostic_automatique = diagnostics
-        self.session.save(update_fields=['diagnostic_automatique'])
+        def enregistrer(nom, resultat, latence):
+            diagnostics[nom], self.latences[nom] = resultat, latence
+            if sur_resultat is not None:
+                try:
+                    sur_resultat(nom, resultat, latence)
+                except Exception as e:
+                    logger.error(f"Erreur lors de la transmission du résultat de la sonde '{nom}': {e}")
 
-        return diagnostics
+        en_attente = set(futures)
+        try:
+            while en_attente:
+                prochaine_echeance = min(echeances[futures[future]] for future in en_attente)
+                terminees, en_attente = wait(
+                    en_attente, timeout=max(0.0, prochaine_echeance - time.monotonic()), return_when=FIRST_COMPLETED
+                )
+                for future in terminees:
+                    nom = futures[future]
+                    try:
+                        enregistrer(nom, *future.result())
+                    except Exception as e:
+                        logger.error(f"Erreur sonde de diagnostic '{nom}': {e}")
+                        enregistrer(nom, {
+                            'statut': 'erreur',
+                            'message': f"Impossible d'exécuter le diagnostic {nom}: {str(e)}",
+                            'details': {}
+                        }, round(time.monotonic() - debut, 3))
+
+                maintenant = time.monotonic()
+                for future in [future for future in en_attente if echeances[futures[future]] <= maintenant]:
+                    # Une sonde pas encore démarrée est annulée ; un thread en cours ne peut pas être
+                    # interrompu, son résultat sera ignoré
+                    en_attente.discard(future)
+                    future.cancel()
+                    nom = futures[future]
+                    latence = round(maintenant - debut, 3)
+                    logger.warning(f"Sonde de diagnostic '{nom}' interrompue après {latence}s")
+                    enregistrer(nom, self._resultat_delai_depasse(nom, latence), latence)
+        finally:
+            for future in en_attente:
+                future.cancel()
+
+        return {nom: diagnostics[nom] for nom in self.SONDES}
+
+    def obtenir_instantane(self):
+        """Instantané psutil commun à toutes les sondes de l'exécution"""
+        with self._verrou_instantane:
+            if self._instantane is None:
+                self._instantane = echantillonneur_systeme.instantane()
+            return self._instantane
 
     @staticmethod
-    def diagnostic_memoire() -> Dict[str, Any]:
+    def _mesurer_sonde(sonde, echeance: float) -> Tuple[Dict[str, Any], float]:
+        debut = time.monotonic()
+        _contexte_sonde.echeance = echeance
+        try:
+            resultat = sonde()
+        finally:
+            _contexte_sonde.echeance = None
+        return resultat, round(time.monotonic() - debut, 3)
+
+    @staticmethod
+    def _resultat_delai_depasse(nom: str, duree: float) -> Dict[str, Any]:
+        return {
+            'statut': 'avertissement',
+            'message': f"Diagnostic {nom} interrompu : aucune réponse après {duree}s",
+            'details': {'delai_depasse': True, 'duree_secondes': duree}
+        }
+
+    def diagnostic_memoire(self) -> Dict[str, Any]:
         """Diagnostic de la mémoire système"""
         try:
-            memoire = psutil.virtual_memory()
+            memoire = self.obtenir_instantane().memoire
             resultat = {
                 'total_gb': round(memoire.total / (1024**3), 2),
                 'disponible_gb': round(memoire.available / (1024**3), 2),
@@ -147,8 +295,8 @@ class DiagnosticSystemeEngine:
 
             # Test de connectivité Internet
             try:
-                socket.create_connection(("8.8.8.8", 53), timeout=5)
-                resultats['internet'] = True
+                with socket.create_connection(("8.8.8.8", 53), timeout=temps_restant(5)):
+                    resultats['internet'] = True
             except OSError:
                 resultats['internet'] = False
 
@@ -197,23 +345,26 @@ class DiagnosticSystemeEngine:
                 'details': {}
             }
 
-    @staticmethod
-    def diagnostic_cpu() -> Dict[str, Any]:
+    def diagnostic_cpu(self) -> Dict[str, Any]:
         """Diagnostic du processeur"""
         try:
-            # Utilisation CPU
-            cpu_percent = psutil.cpu_percent(interval=1)
-            cpu_count = psutil.cpu_count()
-            cpu_freq = psutil.cpu_freq()
+            # Utilisation CPU depuis le relevé précédent de l'échantillonneur
+            instantane = self.obtenir_instantane()
+            cpu_percent = instantane.cpu_percent
+            cpu_freq = instantane.cpu_freq
 
             resultats = {
                 'utilisation_pourcentage': cpu_percent,
-                'nombre_coeurs': cpu_count,
+                'nombre_coeurs': instantane.cpu_count,
                 'frequence_mhz': cpu_freq.current if cpu_freq else 'Non disponible',
-                'charge_moyenne': psutil.getloadavg() if hasattr(psutil, 'getloadavg') else 'Non disponible'
+                'charge_moyenne': instantane.charge_moyenne if instantane.charge_moyenne is not None else 'Non disponible'
             }
 
-            if cpu_percent > 90:
+            if cpu_percent is None:
+                # Premier instantané : pas encore de relevé de référence pour calculer l'utilisation
+                statut = 'ok'
+                message = "Utilisation CPU non disponible pour le moment"
+            elif cpu_percent > 90:
                 statut = 'erreur'
                 message = f"CPU critique: {cpu_percent}% d'utilisation"
             elif cpu_percent > 80:
@@ -265,7 +416,7 @@ class DiagnosticSystemeEngine:
                         ['sc', 'query', service],
                         capture_output=True,
                         text=True,
-                        timeout=10
+                        timeout=temps_restant(10)
                     )
 
                     if 'RUNNING' in result.stdout:
@@ -307,32 +458,27 @@ class DiagnosticSystemeEngine:
                 'details': {}
             }
 
-    @staticmethod
-    def diagnostic_logiciels() -> Dict[str, Any]:
+    def diagnostic_logiciels(self) -> Dict[str, Any]:
         """Diagnostic des logiciels installés et processus"""
         try:
             # Processus en cours
             processus = []
             processus_suspects = []
-
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-                try:
-                    info = proc.info
-                    if info['cpu_percent'] > 10 or info['memory_percent'] > 5:
-                        processus.append({
-                            'pid': info['pid'],
-                            'nom': info['name'],
-                            'cpu': info['cpu_percent'],
-                            'memoire': info['memory_percent']
-                        })
-
-                    # Détecter des processus suspects (optionnel)
-                    nom_processus = info['name'].lower()
-                    if any(suspect in nom_processus for suspect in ['malware', 'virus', 'trojan']):
-                        processus_suspects.append(info['name'])
-
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
+            table_processus = self.obtenir_instantane().processus
+
+            for info in table_processus:
+                if (info['cpu_percent'] or 0) > 10 or (info['memory_percent'] or 0) > 5:
+                    processus.append({
+                        'pid': info['pid'],
+                        'nom': info['name'],
+                        'cpu': info['cpu_percent'] or 0,
+                        'memoire': info['memory_percent'] or 0
+                    })
+
+                # Détecter des processus suspects (optionnel)
+                nom_processus = info['name'].lower()
+                if any(suspect in nom_processus for suspect in ['malware', 'virus', 'trojan']):
+                    processus_suspects.append(info['name'])
 
             # Trier par utilisation CPU
             processus.sort(key=lambda x: x['cpu'], reverse=True)
@@ -340,7 +486,7 @@ class DiagnosticSystemeEngine:
 
             resultats = {
                 'processus_gourmands': top_processus,
-                'nombre_total_processus': len(list(psutil.process_iter())),
+                'nombre_total_processus': len(table_processus),
                 'processus_suspects': processus_suspects
             }
 
@@ -381,7 +527,7 @@ class DiagnosticSystemeEngine:
                         ['powershell', '-Command', 'Get-MpComputerStatus'],
                         capture_output=True,
                         text=True,
-                        timeout=15
+                        timeout=temps_restant(15)
                     )
 
                     if 'AntivirusEnabled' in result.stdout:
@@ -405,7 +551,7 @@ class DiagnosticSystemeEngine:
                         ['powershell', '-Command', 'Get-WULastResults | Select-Object LastSearchSuccessDate'],
                         capture_output=True,
                         text=True,
-                        timeout=10
+                        timeout=temps_restant(10)
                     )
 
                     if result.stdout:
@@ -444,18 +590,18 @@ class DiagnosticSystemeEngine:
                 'details': {}
             }
 
-    @staticmethod
-    def diagnostic_performance() -> Dict[str, Any]:
+    def diagnostic_performance(self) -> Dict[str, Any]:
         """Diagnostic de performance global avec détection des applications gourmandes"""
         try:
+            instantane = self.obtenir_instantane()
+
             # Temps de démarrage du système
-            boot_time = psutil.boot_time()
-            uptime_seconds = time.time() - boot_time
+            uptime_seconds = time.time() - instantane.boot_time
             uptime_hours = uptime_seconds / 3600
 
             # Statistiques de performance
-            cpu_count = psutil.cpu_count()
-            memory = psutil.virtual_memory()
+            cpu_count = instantane.cpu_count
+            memory = instantane.memoire
 
             # Score de performance basé sur plusieurs facteurs
             score_performance = 100
@@ -466,69 +612,58 @@ class DiagnosticSystemeEngine:
             elif memory.percent > 60:
                 score_performance -= 10
 
-            # Test rapide de lecture disque
+            # Banc d'essai du disque (fichier unique, hors cache de pages)
             disk_test_time = None
-            try:
-                disk_test_start = time.time()
-                test_file = "test_perf_temp.tmp"
-                with open(test_file, 'wb') as f:
-                    f.write(b'0' * 1024 * 1024)  # 1MB
-                with open(test_file, 'rb') as f:
-                    f.read()
-                disk_test_time = time.time() - disk_test_start
-
-                import os
-                os.remove(test_file)
-
-                if disk_test_time > 2:
-                    score_performance -= 15
-                elif disk_test_time > 1:
-                    score_performance -= 5
+            banc_disque = None
+            if self.BANC_DISQUE_ACTIF:
+                try:
+                    # Interrompu à l'échéance de la sonde, le reste du diagnostic est conservé
+                    banc_disque = mesurer_disque(echeance=echeance_sonde())
+                    # Temps d'écriture puis de relecture d'1 Mo, comme l'ancien test
+                    disk_test_time = banc_disque['secondes_par_mo']
+
+                    if disk_test_time > 2:
+                        score_performance -= 15
+                    elif disk_test_time > 1:
+                        score_performance -= 5
 
-            except Exception as e:
-                logger.error(f"Erreur diagnostic test disque: {e}")
-                disk_test_time = None
+                except Exception as e:
+                    logger.error(f"Erreur diagnostic test disque: {e}")
+                    disk_test_time = None
 
             # Détecter les applications gourmandes (processus avec forte utilisation)
             applications_gourmandes = []
             processus_total = 0
 
             try:
-                # Attendre un moment pour avoir des mesures précises du CPU
-                time.sleep(1)
-
-                for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'memory_info']):
-                    try:
-                        info = proc.info
-                        processus_total += 1
-
-                        # Critères pour une application gourmande
-                        cpu_seuil = 15.0  # Plus de 15% CPU
-                        mem_seuil = 5.0   # Plus de 5% RAM
+                # Pourcentages CPU mesurés par l'échantillonneur depuis son relevé précédent
+                for info in instantane.processus:
+                    processus_total += 1
 
-                        if (info['cpu_percent'] and info['cpu_percent'] > cpu_seuil) or \
-                           (info['memory_percent'] and info['memory_percent'] > mem_seuil):
+                    # Critères pour une application gourmande
+                    cpu_seuil = 15.0  # Plus de 15% CPU
+                    mem_seuil = 5.0   # Plus de 5% RAM
 
-                            # Calculer la mémoire en MB
-                            memory_mb = 0
-                            if info['memory_info']:
-                                memory_mb = round(info['memory_info'].rss / (1024 * 1024), 1)
+                    if (info['cpu_percent'] and info['cpu_percent'] > cpu_seuil) or \
+                       (info['memory_percent'] and info['memory_percent'] > mem_seuil):
 
-                            app_info = {
-                                'nom': info['name'],
-                                'pid': info['pid'],
-                                'cpu_percent': round(info['cpu_percent'] or 0, 1),
-                                'memory_percent': round(info['memory_percent'] or 0, 1),
-                                'memory_mb': memory_mb,
-                                'impact_performance': 'elevé' if (info['cpu_percent'] or 0) > 25 or (info['memory_percent'] or 0) > 10 else 'moyen'
-                            }
+                        # Calculer la mémoire en MB
+                        memory_mb = 0
+                        if info['rss']:
+                            memory_mb = round(info['rss'] / (1024 * 1024), 1)
 
-                            # Éviter les doublons (même nom de processus)
-                            if not any(app['nom'] == app_info['nom'] for app in applications_gourmandes):
-                                applications_gourmandes.append(app_info)
+                        app_info = {
+                            'nom': info['name'],
+                            'pid': info['pid'],
+                            'cpu_percent': round(info['cpu_percent'] or 0, 1),
+                            'memory_percent': round(info['memory_percent'] or 0, 1),
+                            'memory_mb': memory_mb,
+                            'impact_performance': 'elevé' if (info['cpu_percent'] or 0) > 25 or (info['memory_percent'] or 0) > 10 else 'moyen'
+                        }
 
-                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                        continue
+                        # Éviter les doublons (même nom de processus)
+                        if not any(app['nom'] == app_info['nom'] for app in applications_gourmandes):
+                            applications_gourmandes.append(app_info)
 
                 # Trier par impact (CPU + mémoire)
                 applications_gourmandes.sort(
@@ -556,11 +691,12 @@ class DiagnosticSystemeEngine:
                 'uptime_hours': round(uptime_hours, 1),
                 'score_performance': max(0, score_performance),
                 'temps_test_disque': disk_test_time,
+                'banc_disque': banc_disque,
                 'processeurs': cpu_count,
                 'memoire_totale_gb': round(memory.total / (1024**3), 2),
                 'applications_gourmandes': applications_gourmandes,
                 'nombre_processus_total': processus_total,
-                'utilisation_cpu_actuelle': psutil.cpu_percent(interval=0.1),
+                'utilisation_cpu_actuelle': instantane.cpu_percent,
                 'utilisation_memoire_actuelle': memory.percent
             }
 
@@ -645,11 +781,30 @@ class DiagnosticSystemeEngine:
                 'details': {}
             }
 
-    def sauvegarder_diagnostic(self, type_diagnostic: str, resultat: Dict[str, Any]):
-        """Sauvegarde un diagnostic dans la base de données avec durée d'exécution"""
+    def sauvegarder_resultats(self, diagnostics: Dict[str, Dict[str, Any]]):
+        """
+        Enregistre les résultats de l'exécution : un INSERT groupé des diagnostics puis la mise à
+        jour de la session, dans une même transaction
+        """
+        lignes = [
+            ligne for ligne in (
+                self.construire_diagnostic(type_diag, resultat) for type_diag, resultat in diagnostics.items()
+            )
+            if ligne is not None
+        ]
         try:
-            duree_execution = time.time() - self.debut_diagnostic
+            with transaction.atomic():
+                DiagnosticSysteme.objects.bulk_create(lignes)
 
+                # Mettre à jour les données supplémentaires de la session
+                self.session.diagnostic_automatique = diagnostics
+                self.session.save(update_fields=['diagnostic_automatique'])
+        except DatabaseError as e:
+            logger.error(f"Erreur sauvegarde du diagnostic système de la session {self.session.id}: {e}")
+
+    def construire_diagnostic(self, type_diagnostic: str, resultat: Dict[str, Any]) -> Optional[DiagnosticSysteme]:
+        """Ligne DiagnosticSysteme (non enregistrée) avec la durée d'exécution propre à la sonde"""
+        try:
             # Déterminer le niveau d'impact
             niveau_impact = 1
             if resultat['statut'] == 'erreur':
@@ -667,19 +822,21 @@ class DiagnosticSystemeEngine:
                 if 'score_performance' in resultat['details']:
                     balises.append('performance_mesuree')
 
-            DiagnosticSysteme.objects.create(
+            return DiagnosticSysteme(
                 session=self.session,
                 type_diagnostic=type_diagnostic,
                 resultat=resultat['details'],
                 statut=resultat['statut'],
                 message=resultat['message'],
-                duree_execution=duree_execution,
+                # Mesurée par executer_sondes, du lancement de la sonde à son résultat
+                duree_execution=self.latences.get(type_diagnostic),
                 niveau_impact=niveau_impact,
                 balises=balises
             )
 
         except Exception as e:
             logger.error(f"Erreur sauvegarde diagnostic {type_diagnostic}: {e}")
+            return None
 
 
 class ArbreDecisionEngine:
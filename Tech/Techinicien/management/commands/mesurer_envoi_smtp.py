@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import Counter
+
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from Techinicien.services.smtp_service import PoolSMTP, construire_message
+
+try:
+    from aiosmtpd.controller import Controller
+    AIOSMTPD_AVAILABLE = True
+except ImportError:
+    AIOSMTPD_AVAILABLE = False
+
+EXPEDITEUR = 'benchmark@techsystem.local'
+
+
+class ServeurTest:
+    """Serveur SMTP local qui compte les messages reçus et peut couper une session"""
+
+    def __init__(self):
+        self.destinataires = Counter()
+        self.sessions = set()
+        self.couper_apres = None
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.destinataires.update(envelope.rcpt_tos)
+        if self.couper_apres is not None and sum(self.destinataires.values()) == self.couper_apres:
+            # Le message est accepté, puis la session est coupée par le serveur
+            self.couper_apres = None
+            asyncio.get_running_loop().call_soon(server.transport.close)
+        return '250 OK'
+
+    def reinitialiser(self):
+        self.destinataires.clear()
+        self.sessions.clear()
+
+
+class Command(BaseCommand):
+    help = "Compare send_mail (une session par message) et le pool SMTP sur un serveur aiosmtpd local"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200, help='Nombre de messages envoyés')
+        parser.add_argument('--port', type=int, default=8025, help='Port du serveur SMTP local')
+
+    def handle(self, *args, **options):
+        if not AIOSMTPD_AVAILABLE:
+            raise CommandError("aiosmtpd n'est pas installé. Utilisez: pip install aiosmtpd")
+
+        nombre = options['messages']
+        serveur = ServeurTest()
+        controleur = Controller(serveur, hostname='127.0.0.1', port=options['port'])
+        controleur.start()
+        try:
+            with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=options['port'], EMAIL_USE_TLS=False,
+                EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', DEFAULT_FROM_EMAIL=EXPEDITEUR,
+            ):
+                self.comparer(serveur, nombre)
+                self.verifier_reprise(serveur, nombre)
+        finally:
+            controleur.stop()
+
+    def comparer(self, serveur, nombre):
+        debut = time.perf_counter()
+        for numero in range(nombre):
+            send_mail('Test', 'Corps', EXPEDITEUR, [f'u{numero}@test.local'], html_message='<b>Corps</b>')
+        duree_send_mail = time.perf_counter() - debut
+        sessions_send_mail = len(serveur.sessions)
+        serveur.reinitialiser()
+
+        pool = PoolSMTP()
+        messages = [construire_message('Test', 'Corps', [f'u{numero}@test.local'], '<b>Corps</b>')
+                    for numero in range(nombre)]
+        debut = time.perf_counter()
+        pool.envoyer(messages)
+        duree_pool = time.perf_counter() - debut
+        pool.fermer()
+
+        self.stdout.write(
+            f'📧 send_mail : {duree_send_mail * 1000 / nombre:.2f} ms/message ({sessions_send_mail} sessions)'
+        )
+        self.stdout.write(
+            f'📧 pool SMTP : {duree_pool * 1000 / nombre:.2f} ms/message ({len(serveur.sessions)} session(s))'
+        )
+        serveur.reinitialiser()
+
+    def verifier_reprise(self, serveur, nombre):
+        """Coupure du serveur au milieu du lot : chaque message doit être reçu une seule fois"""
+        serveur.couper_apres = nombre // 2
+        pool = PoolSMTP()
+        messages = [construire_message('Test', 'Corps', [f'r{numero}@test.local'])
+                    for numero in range(nombre)]
+        envoyes = pool.envoyer(messages)
+        pool.fermer()
+
+        doublons = sum(1 for recus in serveur.destinataires.values() if recus > 1)
+        manquants = nombre - len(serveur.destinataires)
+        message = (f'🔌 Coupure après {nombre // 2} messages : {envoyes} envoyés, '
+                   f'{len(serveur.sessions)} sessions, {doublons} doublon(s), {manquants} manquant(s)')
+        if doublons or manquants:
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS(message))
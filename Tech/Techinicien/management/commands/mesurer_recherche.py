@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.db import connection
+from django.core.management.base import BaseCommand, CommandError
+
+from Techinicien.models import Categorie, Commentaire, CustomUser, Ticket
+from Techinicien.services.recherche_service import moteur_recherche, rechercher_tickets, reconstruire_index
+
+MOTS = (
+    "imprimante écran réseau câble clavier souris serveur mot de passe connexion lent bloqué erreur "
+    "mise à jour logiciel licence wifi vpn messagerie outlook disque plein sauvegarde fichier partage "
+    "droits accès badge téléphone poste redémarrer pilote"
+).split()
+RECHERCHES = ('vpn outlook', 'sauveg', 'onduleur', 'ondul defectueux')
+
+
+class Command(BaseCommand):
+    help = ("Compare la recherche FTS5 et icontains (rechercher_tickets) sur une base de test "
+            "temporaire remplie de tickets et de commentaires générés")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=20000, help='Nombre de tickets générés')
+        parser.add_argument('--commentaires', type=int, default=500000, help='Nombre de commentaires générés')
+        parser.add_argument('--repetitions', type=int, default=5, help='Exécutions par recherche')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("La comparaison FTS5 / icontains nécessite SQLite")
+
+        # Base de test jetable : la base configurée n'est jamais modifiée
+        nom_base = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            if moteur_recherche() != 'fts5':
+                raise CommandError("Table FTS5 absente de la base de test (SQLite compilé sans FTS5 ?)")
+            self.remplir(options['tickets'], options['commentaires'])
+            for texte in RECHERCHES:
+                self.comparer(texte, options['repetitions'])
+        finally:
+            connection.creation.destroy_test_db(nom_base, verbosity=0)
+
+    def remplir(self, nombre_tickets, nombre_commentaires):
+        generateur = random.Random(1)
+
+        def phrase(longueur):
+            return ' '.join(generateur.choice(MOTS) for _ in range(longueur))
+
+        debut = time.perf_counter()
+        categorie = Categorie.objects.create(nom_categorie='Benchmark')
+        auteur = CustomUser.objects.create_user(email='benchmark@techsystem.local', password='x', role='technicien')
+        Ticket.objects.bulk_create(
+            (Ticket(titre=phrase(4), description=phrase(30), categorie=categorie, utilisateur_createur=auteur)
+             for _ in range(nombre_tickets)),
+            batch_size=2000
+        )
+        ids_tickets = list(Ticket.objects.values_list('id', flat=True))
+        # Quelques commentaires rares, retrouvés par les deux dernières recherches
+        rares = set(generateur.sample(range(nombre_commentaires), min(50, nombre_commentaires)))
+        Commentaire.objects.bulk_create(
+            (Commentaire(ticket_id=generateur.choice(ids_tickets), utilisateur_auteur=auteur,
+                         contenu=phrase(25) + (' onduleur défectueux' if numero in rares else ''))
+             for numero in range(nombre_commentaires)),
+            batch_size=5000
+        )
+
+        # bulk_create ne déclenche pas les signaux d'indexation
+        lignes = reconstruire_index()
+        self.stdout.write(
+            f'🗄️  {nombre_tickets} tickets, {nombre_commentaires} commentaires, {lignes} documents indexés '
+            f'en {time.perf_counter() - debut:.1f} s'
+        )
+
+    def comparer(self, texte, repetitions):
+        mesures = []
+        for moteur in ('icontains', 'fts5'):
+            debut = time.perf_counter()
+            for _ in range(repetitions):
+                tickets = rechercher_tickets(texte, Ticket.objects.all(), moteur=moteur)
+            mesures.append(f'{moteur} {(time.perf_counter() - debut) * 1000 / repetitions:8.1f} ms '
+                           f'({len(tickets)} tickets)')
+        self.stdout.write(f'🔎 « {texte} » : ' + ' | '.join(mesures))
@@ -0,0 +1,72 @@
+import copy
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from Techinicien.email_utils import contexte_email_ticket, contexte_email_urgence, rendre_email
+from Techinicien.models import Categorie, CustomUser, Departement, Ticket
+
+TEMPLATES_EMAILS = ('nouveau_ticket', 'confirmation_employe', 'urgence_technicien')
+
+
+class Command(BaseCommand):
+    help = "Mesure le coût du rendu des emails de notification (contexte, HTML, texte) pour 1 000 notifications"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notifications', type=int, default=1000, help='Nombre de notifications rendues')
+
+    def handle(self, *args, **options):
+        nombre = options['notifications']
+        ticket, technicien = self.ticket_exemple()
+
+        self.stdout.write(f'✉️  Rendu de {nombre} notifications par template (ms pour {nombre})')
+        self.mesurer('chargeur en cache', ticket, technicien, nombre)
+        with override_settings(TEMPLATES=self.templates_sans_cache()):
+            self.mesurer('chargeur sans cache', ticket, technicien, nombre)
+
+    @staticmethod
+    def ticket_exemple():
+        """Ticket en mémoire (aucun accès à la base) représentatif d'une notification"""
+        createur = CustomUser(email='employe@techsystem.local', first_name='Jean', last_name='Rakoto',
+                              departement=Departement(nom_departement='Comptabilité'))
+        technicien = CustomUser(email='tech@techsystem.local', first_name='Aina', last_name='Rabe')
+        ticket = Ticket(
+            id=1234, titre='Imprimante hors ligne <bureau 2>', description='La file reste bloquée. ' * 20,
+            priorite='urgent', statut_ticket='ouvert', categorie=Categorie(nom_categorie='Matériel'),
+            utilisateur_createur=createur, technicien_assigne=technicien, date_creation=datetime.now(),
+        )
+        return ticket, technicien
+
+    @staticmethod
+    def templates_sans_cache():
+        templates = copy.deepcopy(settings.TEMPLATES)
+        templates[0]['OPTIONS']['loaders'] = [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]
+        return templates
+
+    def mesurer(self, libelle, ticket, technicien, nombre):
+        self.stdout.write(f'\n📊 {libelle}')
+        for nom in TEMPLATES_EMAILS:
+            construire = (lambda: contexte_email_urgence(ticket, technicien)) if nom == 'urgence_technicien' \
+                else (lambda: contexte_email_ticket(ticket))
+            rendre_email(nom, construire())  # Compilation hors mesure
+
+            debut = time.perf_counter()
+            for _ in range(nombre):
+                contexte = construire()
+            duree_contexte = time.perf_counter() - debut
+
+            debut = time.perf_counter()
+            for _ in range(nombre):
+                html, texte = rendre_email(nom, contexte)
+            duree_rendu = time.perf_counter() - debut
+
+            self.stdout.write(
+                f'  {nom:<22} contexte {duree_contexte * 1000:7.1f}  rendu HTML+texte {duree_rendu * 1000:7.1f}  '
+                f'total {(duree_contexte + duree_rendu) * 1000:7.1f} ({len(html)} + {len(texte)} caractères)'
+            )
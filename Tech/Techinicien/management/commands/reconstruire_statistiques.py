@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from Techinicien.services.statistiques_service import reconstruire_statistiques
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats journaliers des tableaux de bord (à planifier chaque nuit)"
+
+    def handle(self, *args, **options):
+        lignes = reconstruire_statistiques()
+        self.stdout.write(self.style.SUCCESS(f'📊 Statistiques des tickets reconstruites : {lignes} lignes'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from Techinicien.services.recherche_service import moteur_recherche, reconstruire_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des tickets et commentaires (SQLite FTS5)"
+
+    def handle(self, *args, **options):
+        moteur = moteur_recherche()
+        if moteur != 'fts5':
+            self.stdout.write(f"ℹ️  Moteur de recherche « {moteur} » : aucun index à reconstruire")
+            return
+
+        lignes = reconstruire_index()
+        self.stdout.write(self.style.SUCCESS(f'🔎 Index de recherche reconstruit : {lignes} documents indexés'))
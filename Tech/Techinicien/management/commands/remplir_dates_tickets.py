@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from Techinicien.services.statistiques_service import reconstruire_statistiques, remplir_dates_tickets
+
+
+class Command(BaseCommand):
+    help = "Reconstitue les dates d'assignation, de résolution et de fermeture depuis l'historique des commentaires"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ecraser',
+            action='store_true',
+            help='Recalcule aussi les dates déjà renseignées',
+        )
+
+    def handle(self, *args, **options):
+        compteurs = remplir_dates_tickets(ecraser=options['ecraser'])
+        self.stdout.write(
+            f"🕒 Assignation : {compteurs['date_assignation']} | "
+            f"Résolution : {compteurs['date_resolution']} | "
+            f"Fermeture : {compteurs['date_fermeture']}"
+        )
+
+        # bulk_update ne déclenche pas les signaux : les agrégats sont recalculés
+        lignes = reconstruire_statistiques()
+        self.stdout.write(self.style.SUCCESS(f'✅ Dates des tickets complétées, {lignes} lignes de statistiques recalculées'))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Techinicien.services.email_outbox_service import traiter_emails_en_attente, TAILLE_LOT
+
+
+class Command(BaseCommand):
+    help = "Envoie les emails en attente (file EmailSortant) par lots, avec nouvelles tentatives en cas d'échec"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--taille-lot',
+            type=int,
+            default=TAILLE_LOT,
+            help="Nombre maximum d'emails traités par lot",
+        )
+        parser.add_argument(
+            '--boucle',
+            action='store_true',
+            help='Tourne en continu (worker) au lieu de traiter un seul passage',
+        )
+        parser.add_argument(
+            '--intervalle',
+            type=float,
+            default=5,
+            help='Pause en secondes entre deux lots vides en mode --boucle',
+        )
+
+    def handle(self, *args, **options):
+        taille_lot = options['taille_lot']
+
+        if not options['boucle']:
+            self.traiter_tout(taille_lot)
+            return
+
+        self.stdout.write(self.style.SUCCESS('📬 Worker d\'envoi des emails démarré (Ctrl+C pour arrêter)'))
+        try:
+            while True:
+                resultats = self.traiter_lot(taille_lot)
+                # Lot plein : il reste probablement des emails, on enchaîne sans attendre
+                if sum(resultats.values()) < taille_lot:
+                    time.sleep(options['intervalle'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('🛑 Worker arrêté'))
+
+    def traiter_tout(self, taille_lot):
+        """Vider la file des emails actuellement dus"""
+        while True:
+            resultats = self.traiter_lot(taille_lot)
+            if sum(resultats.values()) < taille_lot:
+                break
+
+    def traiter_lot(self, taille_lot):
+        resultats = traiter_emails_en_attente(taille_lot)
+        if any(resultats.values()):
+            self.stdout.write(
+                f"✉️  Envoyés : {resultats['envoyes']} | "
+                f"Reportés : {resultats['reportes']} | "
+                f"Échecs : {resultats['echecs']}"
+            )
+        return resultats
@@ -0,0 +1,133 @@
+import re
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Max, Q, QuerySet
+from django.test.utils import CaptureQueriesContext
+
+from Techinicien.models import Ticket, Commentaire
+from Techinicien.services.statistiques_service import calculer_stats_tickets
+
+# Tables qui ne doivent pas être parcourues entièrement par les requêtes fréquentes
+TABLES_SURVEILLEES = {Ticket._meta.db_table, Commentaire._meta.db_table}
+# « SCAN table » : toutes les lignes ; « SCAN table USING INDEX x » : tout l'index, dans son ordre
+MOTIF_PARCOURS = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$')
+
+
+def requetes_frequentes():
+    """
+    Requêtes des vues et du consumer, telles qu'elles sont exécutées (identifiants fictifs) :
+    un queryset, ou une fonction des services dont les requêtes sont capturées.
+    Chaque requête est associée à un booléen : True si elle peut parcourir un index dans l'ordre
+    (listes complètes limitées, réservées aux admins), jamais la table elle-même
+    """
+    utilisateur_id, ticket_id = 1, 1
+    curseur = Q(date_creation__lt=datetime(2026, 1, 1, tzinfo=timezone.utc)) | Q(
+        date_creation=datetime(2026, 1, 1, tzinfo=timezone.utc), id__lt=ticket_id
+    )
+    tickets = Ticket.objects.order_by('-date_creation', '-id')
+    commentaires = Commentaire.objects.order_by('date_commentaire')
+
+    return [
+        ('Mes tickets (MyTicketsView)', tickets.filter(utilisateur_createur_id=utilisateur_id)[:51], False),
+        ('Mes tickets, page suivante', tickets.filter(curseur, utilisateur_createur_id=utilisateur_id)[:51], False),
+        ('Tickets du technicien (TechnicianTicketsView)', tickets.filter(
+            Q(technicien_assigne=None) | Q(technicien_assigne_id=utilisateur_id)
+        )[:51], False),
+        ('Tous les tickets (admin)', tickets[:51], True),
+        ('Tous les tickets, page suivante', tickets.filter(curseur)[:51], True),
+        ('Détail du ticket (technicien)', Ticket.objects.filter(
+            Q(technicien_assigne_id=utilisateur_id) | Q(utilisateur_createur_id=utilisateur_id), id=ticket_id
+        ), False),
+        ('Statistiques employé', lambda: calculer_stats_tickets(
+            Ticket.objects.filter(utilisateur_createur_id=utilisateur_id)
+        ), False),
+        ('Statistiques technicien', lambda: calculer_stats_tickets(
+            Ticket.objects.filter(technicien_assigne_id=utilisateur_id)
+        ), False),
+        ('Tickets assignés récents', tickets.filter(technicien_assigne_id=utilisateur_id)[:5], False),
+        ('Commentaires du ticket (TicketCommentsView)', commentaires.filter(
+            ticket_id=ticket_id, commentaire_parent=None
+        ), False),
+        ('Dernier événement de guidage', commentaires.filter(
+            ticket_id=ticket_id, type_action__in=['guidage_debut', 'guidage_fin']
+        ).reverse().values_list('type_action', flat=True)[:1], False),
+        ('État des instructions de guidage', Commentaire.objects.filter(
+            ticket_id=ticket_id, est_instruction=True
+        ).values('ticket_id').annotate(
+            derniere_etape=Max('numero_etape'),
+            en_attente=Count('id', filter=Q(attendre_confirmation=True, est_confirme=False))
+        ), False),
+        ('Instruction à confirmer (consumer)', Commentaire.objects.filter(id=1, ticket_id=ticket_id), False),
+        ('Commentaires récents sur les tickets assignés', commentaires.filter(
+            ticket__technicien_assigne_id=utilisateur_id
+        ).reverse()[:5], False),
+        ('Commentaires récents de l\'auteur',
+         commentaires.filter(utilisateur_auteur_id=utilisateur_id).reverse()[:5], False),
+    ]
+
+
+def plan_sql(sql, params=()):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [ligne[-1] for ligne in cursor.fetchall()]
+
+
+def plan_requete(requete):
+    """Étapes du plan d'un queryset, ou de toutes les lectures exécutées par une fonction"""
+    if isinstance(requete, QuerySet):
+        return plan_sql(*requete.query.sql_with_params())
+
+    with CaptureQueriesContext(connection) as requetes:
+        requete()
+    return [
+        etape
+        for capturee in requetes.captured_queries if capturee['sql'].startswith('SELECT')
+        for etape in plan_sql(capturee['sql'])
+    ]
+
+
+def parcours_complets(plan, parcours_index_autorise=False):
+    """Étapes du plan qui parcourent entièrement les tickets ou les commentaires"""
+    return [
+        etape for etape in plan
+        if (correspondance := MOTIF_PARCOURS.match(etape))
+        and correspondance.group(1) in TABLES_SURVEILLEES
+        and not (parcours_index_autorise and ' USING ' in etape)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Vérifie avec EXPLAIN QUERY PLAN qu'aucune requête fréquente ne parcourt entièrement les tickets ou les commentaires"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--details',
+            action='store_true',
+            help='Affiche le plan complet de chaque requête',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN est propre à SQLite')
+
+        echecs = []
+        for nom, requete, parcours_index_autorise in requetes_frequentes():
+            plan = plan_requete(requete)
+            parcours = parcours_complets(plan, parcours_index_autorise)
+
+            if parcours:
+                echecs.append(nom)
+                self.stdout.write(self.style.ERROR(f'❌ {nom} : {", ".join(parcours)}'))
+            else:
+                self.stdout.write(f'✅ {nom}')
+
+            if options['details'] or parcours:
+                for etape in plan:
+                    self.stdout.write(f'     {etape}')
+
+        if echecs:
+            raise CommandError(f'{len(echecs)} requête(s) parcourent une table entière : {", ".join(echecs)}')
+
+        self.stdout.write(self.style.SUCCESS('🔎 Toutes les requêtes fréquentes utilisent un index'))
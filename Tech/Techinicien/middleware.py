@@ -0,0 +1,128 @@
+"""
+Middleware d'authentification WebSocket par token JWT
+Le token passé dans la query string (?token=...) est décodé une seule fois ;
+l'utilisateur résolu est gardé dans un cache LRU pour éviter une requête en base à chaque
+(re)connexion. Une entrée vit au plus WEBSOCKET_AUTH_CACHE_TTL secondes (et jamais plus que le
+token) : les signaux ne vident que le cache du processus qui enregistre l'utilisateur, les autres
+workers voient une désactivation ou un changement de rôle à l'expiration de l'entrée
+"""
+
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class CacheUtilisateursToken:
+    """
+    Cache LRU (token -> utilisateur) dont chaque entrée expire après `duree` secondes, ou avant
+    avec son token. Chaque connexion reçoit sa propre copie de l'utilisateur
+    """
+
+    def __init__(self, taille_max=1024, duree=60):
+        self.taille_max = taille_max
+        self.duree = duree
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, token):
+        with self._verrou:
+            entree = self._entrees.get(token)
+            if entree is None:
+                return None
+
+            user, expiration = entree
+            if expiration <= time.time():
+                del self._entrees[token]
+                return None
+
+            self._entrees.move_to_end(token)
+            return copy.copy(user)
+
+    def ajouter(self, token, user, expiration_token):
+        with self._verrou:
+            self._entrees[token] = (user, min(expiration_token, time.time() + self.duree))
+            self._entrees.move_to_end(token)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def invalider_utilisateur(self, user_id):
+        """Retirer toutes les entrées d'un utilisateur (modification, désactivation, suppression)"""
+        with self._verrou:
+            tokens = [token for token, (user, _) in self._entrees.items() if user.pk == user_id]
+            for token in tokens:
+                del self._entrees[token]
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+
+cache_utilisateurs = CacheUtilisateursToken(
+    getattr(settings, 'WEBSOCKET_AUTH_CACHE_TAILLE', 1024),
+    getattr(settings, 'WEBSOCKET_AUTH_CACHE_TTL', 60),
+)
+
+
+def extraire_token(scope):
+    """Récupérer le token JWT depuis la query string de la connexion"""
+    parametres = parse_qs(scope.get('query_string', b'').decode())
+    valeurs = parametres.get('token')
+    return valeurs[0] if valeurs else None
+
+
+@database_sync_to_async
+def _charger_utilisateur(user_id):
+    try:
+        return User.objects.select_related('departement').get(pk=user_id)
+    except User.DoesNotExist:
+        return None
+
+
+async def obtenir_utilisateur_depuis_token(token):
+    """Décoder le token (une seule fois) et résoudre l'utilisateur, en passant par le cache"""
+    user = cache_utilisateurs.obtenir(token)
+    if user is not None:
+        return user
+
+    try:
+        access_token = AccessToken(token)
+    except TokenError:
+        return None
+
+    user_id = access_token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+
+    user = await _charger_utilisateur(user_id)
+    if user is None or not user.is_active:
+        return None
+
+    cache_utilisateurs.ajouter(token, user, access_token['exp'])
+    return copy.copy(user)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Place dans scope['user'] l'utilisateur correspondant au token JWT (AnonymousUser sinon)"""
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        token = extraire_token(scope)
+        user = await obtenir_utilisateur_depuis_token(token) if token else None
+        scope['user'] = user or AnonymousUser()
+        return await super().__call__(scope, receive, send)
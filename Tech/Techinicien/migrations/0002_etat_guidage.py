@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EtatGuidage',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='etat_guidage', serialize=False, to='Techinicien.ticket')),
+                ('est_actif', models.BooleanField(default=False, help_text='Une session de guidage est en cours')),
+                ('derniere_etape', models.PositiveIntegerField(default=0, help_text='Numéro de la dernière instruction envoyée')),
+                ('confirmations_en_attente', models.PositiveIntegerField(default=0, help_text='Instructions en attente de confirmation')),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'État du guidage',
+                'verbose_name_plural': 'États du guidage',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0002_etat_guidage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='version',
+            field=models.PositiveIntegerField(default=1, help_text="Incrémentée à chaque modification d'un champ suivi"),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0003_ticket_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailSortant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_email', models.CharField(choices=[('nouveau_ticket', 'Nouveau ticket (techniciens et admins)'), ('confirmation_employe', 'Confirmation de création (employé)'), ('urgence_technicien', 'Assignation urgente (technicien)')], max_length=30)),
+                ('cle_deduplication', models.CharField(max_length=100, unique=True)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', "En cours d'envoi"), ('envoye', 'Envoyé'), ('echec', 'Échec définitif')], default='en_attente', max_length=20)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_envoi', models.DateTimeField(blank=True, null=True)),
+                ('destinataire', models.ForeignKey(blank=True, help_text="Destinataire unique (sinon calculé à l'envoi selon le type)", null=True, on_delete=django.db.models.deletion.CASCADE, related_name='emails_sortants', to=settings.AUTH_USER_MODEL)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails_sortants', to='Techinicien.ticket')),
+            ],
+            options={
+                'verbose_name': 'Email sortant',
+                'verbose_name_plural': 'Emails sortants',
+                'ordering': ['prochaine_tentative'],
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative'], name='Techinicien_statut_201d1c_idx')],
+            },
+        ),
+    ]
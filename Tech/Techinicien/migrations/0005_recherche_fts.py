@@ -0,0 +1,42 @@
+from django.db import migrations
+
+TABLE_FTS = 'Techinicien_recherche_fts'
+
+
+def creer_index_recherche(apps, schema_editor):
+    """Index FTS5 (SQLite) ou extension unaccent (PostgreSQL) ; rien pour les autres bases"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS "{TABLE_FTS}" USING fts5(
+                ticket_id UNINDEXED,
+                titre,
+                contenu,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """)
+        # rowid : 2 * id + 1 pour un ticket, 2 * id pour un commentaire
+        schema_editor.execute(f"""
+            INSERT INTO "{TABLE_FTS}" (rowid, ticket_id, titre, contenu)
+            SELECT id * 2 + 1, id, titre, description FROM "Techinicien_ticket"
+            UNION ALL
+            SELECT id * 2, ticket_id, '', contenu FROM "Techinicien_commentaire"
+        """)
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+
+
+def supprimer_index_recherche(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{TABLE_FTS}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0004_email_sortant'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index_recherche, supprimer_index_recherche),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, DateField, DurationField, ExpressionWrapper, F, Q, Sum, When
+from django.db.models.functions import TruncDate, TruncMonth
+
+
+def remplir_statistiques(apps, schema_editor):
+    """
+    Agrégats initiaux, calculés comme reconstruire_statistiques au moment de cette migration
+    (copie figée : le service évolue avec le modèle courant, pas avec l'état historique)
+    """
+    Ticket = apps.get_model('Techinicien', 'Ticket')
+    StatistiqueTicketJour = apps.get_model('Techinicien', 'StatistiqueTicketJour')
+
+    est_resolu = Q(statut_ticket='resolu', date_modification__isnull=False)
+    duree = ExpressionWrapper(F('date_modification') - F('date_creation'), output_field=DurationField())
+    lignes = (
+        Ticket.objects
+        .annotate(
+            jour=TruncDate('date_creation'),
+            mois_resolution=Case(When(est_resolu, then=TruncMonth('date_modification', output_field=DateField()))),
+        )
+        .values('jour', 'statut_ticket', 'priorite', 'categorie_id', 'utilisateur_createur__departement_id',
+                'technicien_assigne_id', 'mois_resolution')
+        .annotate(nombre=Count('id'), duree=Sum(Case(When(est_resolu, then=duree))))
+        .order_by()
+    )
+    StatistiqueTicketJour.objects.all().delete()
+    StatistiqueTicketJour.objects.bulk_create(
+        [
+            StatistiqueTicketJour(
+                jour=ligne['jour'],
+                statut_ticket=ligne['statut_ticket'],
+                priorite=ligne['priorite'],
+                categorie_id=ligne['categorie_id'],
+                departement_id=ligne['utilisateur_createur__departement_id'],
+                technicien_id=ligne['technicien_assigne_id'],
+                mois_resolution=ligne['mois_resolution'],
+                nombre=ligne['nombre'],
+                duree_resolution_totale=ligne['duree'].total_seconds() if ligne['duree'] else 0.0,
+            )
+            for ligne in lignes
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0005_recherche_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueTicketJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(help_text='Jour de création des tickets')),
+                ('statut_ticket', models.CharField(choices=[('ouvert', 'Ouvert'), ('en cours', 'En cours'), ('resolu', 'Résolu'), ('ferme', 'Fermé'), ('annule', 'Annulé')], max_length=20)),
+                ('priorite', models.CharField(choices=[('faible', 'Faible'), ('normal', 'Normal'), ('urgent', 'Urgent'), ('critique', 'Critique')], max_length=10)),
+                ('mois_resolution', models.DateField(blank=True, help_text='Premier jour du mois de résolution (tickets résolus)', null=True)),
+                ('nombre', models.IntegerField(default=0)),
+                ('duree_resolution_totale', models.FloatField(default=0, help_text='Somme des durées de résolution (secondes)')),
+                ('categorie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistiques', to='Techinicien.categorie')),
+                ('departement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='statistiques', to='Techinicien.departement')),
+                ('technicien', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='statistiques_tickets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Statistique journalière des tickets',
+                'verbose_name_plural': 'Statistiques journalières des tickets',
+                'indexes': [models.Index(fields=['jour'], name='Techinicien_jour_159ef9_idx'), models.Index(fields=['technicien', 'jour'], name='Techinicien_technic_e68d94_idx')],
+            },
+        ),
+        migrations.RunPython(remplir_statistiques, migrations.RunPython.noop),
+    ]
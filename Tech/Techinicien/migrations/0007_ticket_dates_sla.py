@@ -0,0 +1,135 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:49
+
+import re
+
+from django.db import migrations, models
+from django.db.models import Case, Count, DateField, DurationField, ExpressionWrapper, F, Q, Sum, When
+from django.db.models.functions import TruncDate, TruncMonth
+
+# Copie figée de la logique des services à la date de cette migration (modèles historiques)
+MOTIF_CHANGEMENT_STATUT = re.compile(r"vers '(?P<statut>[^']+)'")
+STATUTS_PAR_LIBELLE = {'Résolu': 'resolu', 'Fermé': 'ferme'}
+CHAMPS_DATES = ('date_assignation', 'date_resolution', 'date_fermeture')
+
+
+def _remplir_dates_tickets(Ticket, Commentaire):
+    """
+    Dernière transition connue dans l'historique des commentaires ; date_modification pour un
+    ticket assigné, résolu ou fermé sans trace dans l'historique (approximation)
+    """
+    dates = {}
+    historique = Commentaire.objects.filter(
+        type_action__in=['assignation', 'changement_statut', 'resolution', 'fermeture']
+    ).order_by('date_commentaire').values_list('ticket_id', 'type_action', 'contenu', 'date_commentaire')
+
+    for ticket_id, type_action, contenu, date_commentaire in historique.iterator():
+        if type_action == 'assignation':
+            champ = 'date_assignation'
+        elif type_action == 'resolution':
+            champ = 'date_resolution'
+        elif type_action == 'fermeture':
+            champ = 'date_fermeture'
+        else:
+            correspondance = MOTIF_CHANGEMENT_STATUT.search(contenu)
+            statut = STATUTS_PAR_LIBELLE.get(correspondance.group('statut')) if correspondance else None
+            if statut is None:
+                continue
+            champ = 'date_resolution' if statut == 'resolu' else 'date_fermeture'
+        dates.setdefault(ticket_id, {})[champ] = date_commentaire
+
+    a_mettre_a_jour = []
+    tickets = Ticket.objects.values('id', 'statut_ticket', 'technicien_assigne_id', 'date_modification')
+    for ticket in tickets.iterator():
+        connues = dates.get(ticket['id'], {})
+        approximations = {
+            'date_assignation': ticket['technicien_assigne_id'] is not None,
+            'date_resolution': ticket['statut_ticket'] == 'resolu',
+            'date_fermeture': ticket['statut_ticket'] == 'ferme',
+        }
+        nouvelles = {
+            champ: connues.get(champ) or (ticket['date_modification'] if approximations[champ] else None)
+            for champ in CHAMPS_DATES
+        }
+        if any(nouvelles.values()):
+            a_mettre_a_jour.append(Ticket(id=ticket['id'], **nouvelles))
+
+    Ticket.objects.bulk_update(a_mettre_a_jour, list(CHAMPS_DATES), batch_size=500)
+
+
+def _reconstruire_statistiques(Ticket, StatistiqueTicketJour):
+    """Agrégats recalculés : la résolution se base désormais sur date_resolution"""
+    est_resolu = Q(statut_ticket='resolu', date_resolution__isnull=False)
+    duree = ExpressionWrapper(F('date_resolution') - F('date_creation'), output_field=DurationField())
+    lignes = (
+        Ticket.objects
+        .annotate(
+            jour=TruncDate('date_creation'),
+            mois_resolution=Case(When(est_resolu, then=TruncMonth('date_resolution', output_field=DateField()))),
+        )
+        .values('jour', 'statut_ticket', 'priorite', 'categorie_id', 'utilisateur_createur__departement_id',
+                'technicien_assigne_id', 'mois_resolution')
+        .annotate(nombre=Count('id'), duree=Sum(Case(When(est_resolu, then=duree))))
+        .order_by()
+    )
+    StatistiqueTicketJour.objects.all().delete()
+    StatistiqueTicketJour.objects.bulk_create(
+        [
+            StatistiqueTicketJour(
+                jour=ligne['jour'],
+                statut_ticket=ligne['statut_ticket'],
+                priorite=ligne['priorite'],
+                categorie_id=ligne['categorie_id'],
+                departement_id=ligne['utilisateur_createur__departement_id'],
+                technicien_id=ligne['technicien_assigne_id'],
+                mois_resolution=ligne['mois_resolution'],
+                nombre=ligne['nombre'],
+                duree_resolution_totale=ligne['duree'].total_seconds() if ligne['duree'] else 0.0,
+            )
+            for ligne in lignes
+        ],
+        batch_size=1000
+    )
+
+
+def remplir_dates(apps, schema_editor):
+    Ticket = apps.get_model('Techinicien', 'Ticket')
+    _remplir_dates_tickets(Ticket, apps.get_model('Techinicien', 'Commentaire'))
+    _reconstruire_statistiques(Ticket, apps.get_model('Techinicien', 'StatistiqueTicketJour'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0006_statistique_ticket_jour'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='date_assignation',
+            field=models.DateTimeField(blank=True, help_text='Dernière prise en charge par un technicien', null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='date_fermeture',
+            field=models.DateTimeField(blank=True, help_text='Dernière fermeture du ticket', null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='date_resolution',
+            field=models.DateTimeField(blank=True, help_text='Dernier passage au statut résolu', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['statut_ticket', 'date_resolution', 'date_creation'], name='Techinicien_statut__45f629_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['statut_ticket', 'date_fermeture', 'date_creation'], name='Techinicien_statut__c83793_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['technicien_assigne', 'date_assignation', 'date_creation'], name='Techinicien_technic_720e58_idx'),
+        ),
+        migrations.RunPython(remplir_dates, migrations.RunPython.noop),
+    ]
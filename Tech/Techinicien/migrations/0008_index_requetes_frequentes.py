@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0007_ticket_dates_sla'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='commentaire',
+            name='ticket',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='commentaires', to='Techinicien.ticket'),
+        ),
+        migrations.AlterField(
+            model_name='commentaire',
+            name='utilisateur_auteur',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='commentaires', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='technicien_assigne',
+            field=models.ForeignKey(blank=True, db_index=False, limit_choices_to={'role': 'technicien'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tickets_assignes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='utilisateur_createur',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='tickets_crees', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='commentaire',
+            index=models.Index(fields=['ticket', 'date_commentaire'], name='commentaire_ticket_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commentaire',
+            index=models.Index(condition=models.Q(('est_instruction', True)), fields=['ticket', 'numero_etape', 'attendre_confirmation', 'est_confirme'], name='commentaire_instruction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commentaire',
+            index=models.Index(fields=['utilisateur_auteur', '-date_commentaire'], name='commentaire_auteur_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['utilisateur_createur', '-date_creation', '-id'], name='ticket_createur_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['technicien_assigne', '-date_creation', '-id'], name='ticket_technicien_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['-date_creation', '-id'], name='ticket_date_creation_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:25
+
+import datetime
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Case, Count, DateField, DurationField, ExpressionWrapper, F, OuterRef, Q, Subquery, \
+    Sum, When
+from django.db.models.functions import TruncDate, TruncMonth
+
+
+def rattacher_departements(apps, schema_editor):
+    """
+    Département actuel du créateur pour les tickets existants, puis agrégats recalculés sur ce
+    champ (les lignes faussées par les changements de département et les doublons éventuels sont
+    supprimés avant la contrainte unique). Logique figée ici, indépendante du code des services
+    """
+    Ticket = apps.get_model('Techinicien', 'Ticket')
+    StatistiqueTicketJour = apps.get_model('Techinicien', 'StatistiqueTicketJour')
+    CustomUser = apps.get_model('Techinicien', 'CustomUser')
+
+    Ticket.objects.filter(departement__isnull=True).update(departement=Subquery(
+        CustomUser.objects.filter(id=OuterRef('utilisateur_createur_id')).values('departement_id')[:1]
+    ))
+
+    est_resolu = Q(statut_ticket='resolu', date_resolution__isnull=False)
+    duree = ExpressionWrapper(F('date_resolution') - F('date_creation'), output_field=DurationField())
+    lignes = (
+        Ticket.objects
+        .annotate(
+            jour=TruncDate('date_creation'),
+            mois_resolution=Case(When(est_resolu, then=TruncMonth('date_resolution', output_field=DateField()))),
+        )
+        .values('jour', 'statut_ticket', 'priorite', 'categorie_id', 'departement_id', 'technicien_assigne_id',
+                'mois_resolution')
+        .annotate(nombre=Count('id'), duree=Sum(Case(When(est_resolu, then=duree))))
+        .order_by()
+    )
+    StatistiqueTicketJour.objects.all().delete()
+    StatistiqueTicketJour.objects.bulk_create(
+        [
+            StatistiqueTicketJour(
+                jour=ligne['jour'],
+                statut_ticket=ligne['statut_ticket'],
+                priorite=ligne['priorite'],
+                categorie_id=ligne['categorie_id'],
+                departement_id=ligne['departement_id'],
+                technicien_id=ligne['technicien_assigne_id'],
+                mois_resolution=ligne['mois_resolution'],
+                nombre=ligne['nombre'],
+                duree_resolution_totale=ligne['duree'].total_seconds() if ligne['duree'] else 0.0,
+            )
+            for ligne in lignes
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0008_index_requetes_frequentes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='departement',
+            field=models.ForeignKey(blank=True, help_text='Département du créateur à la création du ticket', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tickets', to='Techinicien.departement'),
+        ),
+        migrations.RunPython(rattacher_departements, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='statistiqueticketjour',
+            constraint=models.UniqueConstraint(models.F('jour'), models.F('statut_ticket'), models.F('priorite'), models.F('categorie'), django.db.models.functions.comparison.Coalesce('departement', models.Value(0)), django.db.models.functions.comparison.Coalesce('technicien', models.Value(0)), django.db.models.functions.comparison.Coalesce('mois_resolution', models.Value(datetime.date(1, 1, 1))), name='statistique_ticket_jour_unique'),
+        ),
+    ]
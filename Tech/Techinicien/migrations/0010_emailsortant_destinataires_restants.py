@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0009_ticket_departement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailsortant',
+            name='destinataires_restants',
+            field=models.JSONField(blank=True, help_text="Adresses pas encore servies après un envoi partiel (vide : toute l'audience du type)", null=True),
+        ),
+    ]
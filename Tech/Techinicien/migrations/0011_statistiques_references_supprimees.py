@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Techinicien', '0010_emailsortant_destinataires_restants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='statistiqueticketjour',
+            name='departement',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statistiques', to='Techinicien.departement'),
+        ),
+        migrations.AlterField(
+            model_name='statistiqueticketjour',
+            name='technicien',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statistiques_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
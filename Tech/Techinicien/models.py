@@ -1,9 +1,12 @@
-from datetime import timezone
+from datetime import date, timezone
 
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db.models.signals import post_save
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate
 from django.dispatch import receiver
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from model_utils import FieldTracker
@@ -86,6 +89,10 @@ class CustomUser(AbstractUser):
 
     objects = CustomUserManager()
 
+    # Champs déterminant les destinataires des notifications (annuaire mis en cache)
+    CHAMPS_ANNUAIRE = ['role', 'statut', 'email']
+    tracker = FieldTracker(fields=CHAMPS_ANNUAIRE)
+
     def __str__(self):
         return f"{self.get_full_name() or self.email} ({self.get_role_display()})"
 
@@ -170,10 +177,12 @@ class Ticket(models.Model):
     statut_ticket = models.CharField(max_length=20, choices=STATUT_TICKET_CHOICES, default='ouvert')
     priorite = models.CharField(max_length=10, choices=PRIORITE_CHOICES, default='normal')
     categorie = models.ForeignKey(Categorie, on_delete=models.PROTECT, related_name='tickets')
+    # Pas d'index simple sur les deux clés ci-dessous : les index composites de Meta commencent par elles
     utilisateur_createur = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.PROTECT,
-        related_name='tickets_crees'
+        related_name='tickets_crees',
+        db_index=False
     )
     technicien_assigne = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -181,7 +190,8 @@ class Ticket(models.Model):
         null=True,
         blank=True,
         related_name='tickets_assignes',
-        limit_choices_to={'role': 'technicien'}
+        limit_choices_to={'role': 'technicien'},
+        db_index=False
     )
     equipement = models.ForeignKey(
         Equipement,
@@ -190,14 +200,75 @@ class Ticket(models.Model):
         blank=True,
         related_name='tickets'
     )
+    # Département du créateur au moment de la création : les statistiques restent rattachées
+    # à ce département si le créateur change de département ensuite
+    departement = models.ForeignKey(
+        Departement,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='tickets',
+        help_text="Département du créateur à la création du ticket"
+    )
+    version = models.PositiveIntegerField(default=1, help_text="Incrémentée à chaque modification d'un champ suivi")
+
+    # Étapes du cycle de vie (indicateurs SLA), renseignées par save() lors des transitions
+    date_assignation = models.DateTimeField(null=True, blank=True, help_text="Dernière prise en charge par un technicien")
+    date_resolution = models.DateTimeField(null=True, blank=True, help_text="Dernier passage au statut résolu")
+    date_fermeture = models.DateTimeField(null=True, blank=True, help_text="Dernière fermeture du ticket")
+
+    # Champs dont les modifications sont diffusées (sous forme de différences) via WebSocket
+    CHAMPS_SUIVIS = ['titre', 'description', 'statut_ticket', 'priorite', 'categorie', 'technicien_assigne',
+                     'equipement']
+    tracker = FieldTracker(fields=CHAMPS_SUIVIS)
 
     def __str__(self):
         return f"{self.titre} ({self.get_statut_ticket_display()})"
 
+    def save(self, *args, **kwargs):
+        champs_modifies = set()
+
+        if not self.pk and self.departement_id is None:
+            self.departement_id = self.utilisateur_createur.departement_id
+
+        # Nouvelle version uniquement si un champ suivi a changé (pas pour date_modification seule)
+        if self.pk and self.tracker.changed():
+            self.version += 1
+            champs_modifies.add('version')
+
+        # Horodatage des transitions (assignation, résolution, fermeture)
+        maintenant = now()
+        if self.technicien_assigne_id is not None and (not self.pk or self.tracker.has_changed('technicien_assigne')):
+            self.date_assignation = maintenant
+            champs_modifies.add('date_assignation')
+        if not self.pk or self.tracker.has_changed('statut_ticket'):
+            if self.statut_ticket == 'resolu':
+                self.date_resolution = maintenant
+                champs_modifies.add('date_resolution')
+            elif self.statut_ticket == 'ferme':
+                self.date_fermeture = maintenant
+                champs_modifies.add('date_fermeture')
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and champs_modifies:
+            kwargs['update_fields'] = set(update_fields) | champs_modifies
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-date_creation']
         verbose_name = "Ticket"
         verbose_name_plural = "Tickets"
+        indexes = [
+            # Listes et tableaux de bord : filtre sur le périmètre, tri par (-date_creation, -id)
+            # comme la pagination par curseur, sans tri temporaire
+            models.Index(fields=['utilisateur_createur', '-date_creation', '-id'], name='ticket_createur_date_idx'),
+            models.Index(fields=['technicien_assigne', '-date_creation', '-id'], name='ticket_technicien_date_idx'),
+            models.Index(fields=['-date_creation', '-id'], name='ticket_date_creation_idx'),
+            # Indicateurs SLA : les durées se calculent depuis l'index, sans lire les lignes
+            models.Index(fields=['statut_ticket', 'date_resolution', 'date_creation']),
+            models.Index(fields=['statut_ticket', 'date_fermeture', 'date_creation']),
+            models.Index(fields=['technicien_assigne', 'date_assignation', 'date_creation']),
+        ]
 
 
 class Commentaire(models.Model):
@@ -219,9 +290,10 @@ class Commentaire(models.Model):
         ('guidage_fin', 'Fin du guidage à distance'),
     ]
 
-    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='commentaires')
+    # Index simples remplacés par les index composites de Meta
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='commentaires', db_index=False)
     utilisateur_auteur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT,
-                                           related_name='commentaires')
+                                           related_name='commentaires', db_index=False)
     date_commentaire = models.DateTimeField(auto_now_add=True)
     contenu = models.TextField()
     type_action = models.CharField(max_length=25, choices=TYPE_ACTION_CHOICES, default='ajout_commentaire')
@@ -256,6 +328,32 @@ class Commentaire(models.Model):
         ordering = ['date_commentaire']
         verbose_name = "Commentaire"
         verbose_name_plural = "Commentaires"
+        indexes = [
+            # Fil des commentaires d'un ticket, dans l'ordre chronologique
+            models.Index(fields=['ticket', 'date_commentaire'], name='commentaire_ticket_date_idx'),
+            # Instructions de guidage : étape courante et confirmations en attente lues dans l'index seul
+            models.Index(fields=['ticket', 'numero_etape', 'attendre_confirmation', 'est_confirme'],
+                         condition=models.Q(est_instruction=True), name='commentaire_instruction_idx'),
+            # Derniers commentaires d'un auteur (tableau de bord technicien)
+            models.Index(fields=['utilisateur_auteur', '-date_commentaire'], name='commentaire_auteur_date_idx'),
+        ]
+
+
+class EtatGuidage(models.Model):
+    """État courant du guidage à distance d'un ticket (évite de parcourir tous les commentaires)"""
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, primary_key=True, related_name='etat_guidage')
+    est_actif = models.BooleanField(default=False, help_text="Une session de guidage est en cours")
+    derniere_etape = models.PositiveIntegerField(default=0, help_text="Numéro de la dernière instruction envoyée")
+    confirmations_en_attente = models.PositiveIntegerField(default=0,
+                                                           help_text="Instructions en attente de confirmation")
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Guidage {'actif' if self.est_actif else 'inactif'} - {self.ticket_id}"
+
+    class Meta:
+        verbose_name = "État du guidage"
+        verbose_name_plural = "États du guidage"
 
 
 class Notification(models.Model):
@@ -288,6 +386,100 @@ class Notification(models.Model):
         verbose_name_plural = "Notifications"
 
 
+class EmailSortant(models.Model):
+    """Email en attente d'envoi (file durable traitée par la commande traiter_emails)"""
+    TYPE_EMAIL_CHOICES = [
+        ('nouveau_ticket', 'Nouveau ticket (techniciens et admins)'),
+        ('confirmation_employe', 'Confirmation de création (employé)'),
+        ('urgence_technicien', 'Assignation urgente (technicien)'),
+    ]
+
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours d\'envoi'),
+        ('envoye', 'Envoyé'),
+        ('echec', 'Échec définitif'),
+    ]
+
+    type_email = models.CharField(max_length=30, choices=TYPE_EMAIL_CHOICES)
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='emails_sortants')
+    destinataire = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='emails_sortants',
+        help_text="Destinataire unique (sinon calculé à l'envoi selon le type)"
+    )
+    destinataires_restants = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Adresses pas encore servies après un envoi partiel (vide : toute l'audience du type)"
+    )
+    cle_deduplication = models.CharField(max_length=100, unique=True)
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    tentatives = models.PositiveIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=now)
+    derniere_erreur = models.TextField(blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_envoi = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_type_email_display()} - Ticket #{self.ticket_id} ({self.get_statut_display()})"
+
+    class Meta:
+        ordering = ['prochaine_tentative']
+        verbose_name = "Email sortant"
+        verbose_name_plural = "Emails sortants"
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative']),
+        ]
+
+
+class StatistiqueTicketJour(models.Model):
+    """
+    Agrégat des tickets par jour de création et par état courant (statut, priorité, catégorie,
+    département du créateur, technicien). Maintenu par les signaux de Ticket et reconstruit
+    chaque nuit par la commande `reconstruire_statistiques` ; lu par les tableaux de bord
+    """
+    jour = models.DateField(help_text="Jour de création des tickets")
+    statut_ticket = models.CharField(max_length=20, choices=Ticket.STATUT_TICKET_CHOICES)
+    priorite = models.CharField(max_length=10, choices=Ticket.PRIORITE_CHOICES)
+    # Une catégorie n'est supprimable que sans ticket (PROTECT) : ses lignes sont alors à zéro
+    categorie = models.ForeignKey(Categorie, on_delete=models.CASCADE, related_name='statistiques')
+    # Comme pour Ticket : les lignes d'un département ou d'un technicien supprimé sont fusionnées
+    # dans les lignes sans département / sans technicien (signal pre_delete, detacher_statistiques)
+    departement = models.ForeignKey(Departement, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='statistiques')
+    technicien = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='statistiques_tickets')
+    mois_resolution = models.DateField(null=True, blank=True,
+                                       help_text="Premier jour du mois de résolution (tickets résolus)")
+    nombre = models.IntegerField(default=0)
+    duree_resolution_totale = models.FloatField(default=0, help_text="Somme des durées de résolution (secondes)")
+
+    def __str__(self):
+        return f"{self.jour} - {self.statut_ticket} / {self.priorite} : {self.nombre}"
+
+    class Meta:
+        verbose_name = "Statistique journalière des tickets"
+        verbose_name_plural = "Statistiques journalières des tickets"
+        indexes = [
+            models.Index(fields=['jour']),
+            models.Index(fields=['technicien', 'jour']),
+        ]
+        constraints = [
+            # Une seule ligne par clé d'agrégat (les clés nulles comptent comme égales) : deux
+            # créations concurrentes de la même ligne se résolvent par une mise à jour
+            models.UniqueConstraint(
+                'jour', 'statut_ticket', 'priorite', 'categorie',
+                Coalesce('departement', Value(0)), Coalesce('technicien', Value(0)),
+                Coalesce('mois_resolution', Value(date(1, 1, 1))),
+                name='statistique_ticket_jour_unique'
+            ),
+        ]
+
+
 # Signal to set default department when a new user is created
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def set_default_department(sender, instance, created, **kwargs):
@@ -303,52 +495,62 @@ def set_default_department(sender, instance, created, **kwargs):
         instance.departement = default_dept
 
 
+
+# Signal pour retirer un utilisateur modifié ou supprimé du cache d'authentification WebSocket
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalider_cache_auth_websocket(sender, instance, **kwargs):
+    from .middleware import cache_utilisateurs
+    cache_utilisateurs.invalider_utilisateur(instance.pk)
+
+
+# Signal pour invalider l'annuaire des destinataires de notifications
+# (création, suppression, ou modification du rôle, du statut ou de l'email)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalider_annuaire_notifications(sender, instance, created=None, **kwargs):
+    # created vaut False pour une mise à jour, None pour une suppression
+    if created is False and not any(instance.tracker.has_changed(champ) for champ in instance.CHAMPS_ANNUAIRE):
+        return
+
+    from .email_utils import invalider_annuaire_destinataires
+    invalider_annuaire_destinataires()
+
+
 # Signal pour envoyer un email lors de la création d'un ticket
 @receiver(post_save, sender=Ticket)
 def envoyer_email_creation_ticket(sender, instance, created, **kwargs):
     if created:
-        from .email_utils import (
-            envoyer_email_nouveau_ticket,
-            envoyer_email_confirmation_employe,
-            auto_assign_urgent_ticket
-        )
+        from .email_utils import auto_assign_urgent_ticket
+        from .services.email_outbox_service import planifier_email
         from .serializers import TicketListSerializer
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
+        from .services.notification_service import diffuser_evenement_ticket
 
         # Vérifier et assigner automatiquement si c'est un ticket urgent/critique
         technicien_assigne = auto_assign_urgent_ticket(instance)
 
-        # Envoyer les emails (les fonctions principales gèrent déjà SendGrid + fallback SMTP)
+        # Planifier les emails : ils sont envoyés hors requête par la commande traiter_emails
         try:
-            # Envoyer email aux techniciens et admins
-            envoyer_email_nouveau_ticket(instance)
+            # Email aux techniciens et admins
+            planifier_email('nouveau_ticket', instance)
 
-            # Envoyer email de confirmation à l'employé
-            envoyer_email_confirmation_employe(instance)
+            # Email de confirmation à l'employé
+            planifier_email('confirmation_employe', instance)
 
         except Exception as e:
-            logger.error(f"Erreur lors de l'envoi des emails pour le ticket {instance.id}: {str(e)}")
+            logger.error(f"Erreur lors de la planification des emails pour le ticket {instance.id}: {str(e)}")
 
         # Envoyer notification WebSocket pour les nouveaux tickets
-        channel_layer = get_channel_layer()
         try:
-            if channel_layer:
-                # Sérialiser le ticket pour l'envoi WebSocket
-                serializer = TicketListSerializer(instance)
-                ticket_data = serializer.data
+            # Sérialiser le ticket une seule fois pour les deux notifications
+            ticket_data = TicketListSerializer(instance).data
 
-                # Envoyer la notification aux techniciens connectés
-                async_to_sync(channel_layer.group_send)(
-                    'technician_notifications',
-                    {
-                        'type': 'new_ticket_notification',
-                        'ticket': ticket_data
-                    }
-                )
-                logger.info(f"Notification WebSocket envoyée pour le nouveau ticket {instance.id}")
+            # Envoyer la notification aux techniciens concernés
+            diffuser_evenement_ticket('new_ticket_notification', instance, ticket_data)
+            logger.info(f"Notification WebSocket envoyée pour le nouveau ticket {instance.id}")
         except Exception as e:
             logger.error(f"Erreur lors de l'envoi de la notification WebSocket pour le ticket {instance.id}: {str(e)}")
+            ticket_data = None
 
         # Log pour les tickets urgents assignés automatiquement
         if technicien_assigne:
@@ -356,40 +558,45 @@ def envoyer_email_creation_ticket(sender, instance, created, **kwargs):
 
             # Envoyer notification d'assignation WebSocket
             try:
-                if channel_layer:
-                    serializer = TicketListSerializer(instance)
-                    ticket_data = serializer.data
-
-                    async_to_sync(channel_layer.group_send)(
-                        'technician_notifications',
-                        {
-                            'type': 'ticket_assigned_notification',
-                            'ticket': ticket_data
-                        }
-                    )
+                diffuser_evenement_ticket(
+                    'ticket_assigned_notification', instance, ticket_data, etait_non_assigne=True
+                )
             except Exception as e:
                 logger.error(f"Erreur lors de l'envoi de la notification d'assignation WebSocket: {str(e)}")
 
     else:
         # Ticket mis à jour (pas créé)
+        # Rien à diffuser si seul date_modification a changé
+        changements = instance.tracker.changed()
+        if not changements:
+            return
+
         try:
             from .serializers import TicketListSerializer
+            from .services.notification_service import diffuser_evenement_ticket, serialiser_changements
             from channels.layers import get_channel_layer
             from asgiref.sync import async_to_sync
 
             channel_layer = get_channel_layer()
             if channel_layer:
-                # Sérialiser le ticket mis à jour
+                # Sérialiser le ticket mis à jour et les seuls champs modifiés
                 serializer = TicketListSerializer(instance)
                 ticket_data = serializer.data
-
-                # Envoyer la notification de mise à jour aux techniciens
-                async_to_sync(channel_layer.group_send)(
-                    'technician_notifications',
-                    {
-                        'type': 'ticket_updated_notification',
-                        'ticket': ticket_data
-                    }
+                delta = serialiser_changements(serializer, changements)
+
+                # Envoyer la notification de mise à jour aux techniciens concernés
+                # (y compris l'ancien technicien en cas de réassignation)
+                ancien_technicien_id = None
+                etait_non_assigne = False
+                if instance.tracker.has_changed('technicien_assigne'):
+                    ancien_technicien_id = instance.tracker.previous('technicien_assigne')
+                    etait_non_assigne = ancien_technicien_id is None
+
+                diffuser_evenement_ticket(
+                    'ticket_updated_notification', instance, ticket_data,
+                    etait_non_assigne=etait_non_assigne,
+                    ancien_technicien_id=ancien_technicien_id,
+                    changements=delta
                 )
 
                 # Envoyer aussi aux utilisateurs connectés au ticket spécifique
@@ -397,7 +604,9 @@ def envoyer_email_creation_ticket(sender, instance, created, **kwargs):
                     f'ticket_{instance.id}',
                     {
                         'type': 'ticket_updated',
-                        'ticket': ticket_data
+                        'ticket': ticket_data,
+                        'version': instance.version,
+                        'changements': delta
                     }
                 )
                 logger.info(f"Notification WebSocket de mise à jour envoyée pour le ticket {instance.id}")
@@ -408,6 +617,10 @@ def envoyer_email_creation_ticket(sender, instance, created, **kwargs):
 # Signal pour envoyer des notifications WebSocket lors de la création de commentaires
 @receiver(post_save, sender=Commentaire)
 def envoyer_notification_commentaire(sender, instance, created, **kwargs):
+    # Commentaires issus du WebSocket : le consumer diffuse lui-même le message
+    if getattr(instance, '_sans_diffusion', False):
+        return
+
     if created:
         try:
             from .serializers import CommentaireSerializer
@@ -457,6 +670,92 @@ def envoyer_notification_commentaire(sender, instance, created, **kwargs):
             logger.error(f"Erreur lors de l'envoi de la notification WebSocket d'instruction mise à jour: {str(e)}")
 
 
+
+# Signaux pour invalider les statistiques mises en cache des périmètres concernés par le ticket
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def invalider_cache_stats_tickets(sender, instance, **kwargs):
+    from .services.statistiques_service import invalider_stats_tickets
+    invalider_stats_tickets(instance, instance.tracker.previous('technicien_assigne'))
+
+
+# Signaux pour tenir à jour les agrégats des tableaux de bord (StatistiqueTicketJour)
+# _contribution_statistiques mémorise la ligne où l'instance est comptée ; elle couvre aussi les
+# sauvegardes imbriquées dans le post_save de création (assignation automatique des tickets urgents)
+@receiver(pre_save, sender=Ticket)
+def memoriser_contribution_statistiques(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, '_contribution_statistiques') or not instance.tracker.saved_data:
+        return
+    from .services.statistiques_service import contribution_ticket
+    instance._contribution_statistiques = contribution_ticket(instance, precedente=True)
+
+
+@receiver(post_save, sender=Ticket)
+def mettre_a_jour_statistiques(sender, instance, **kwargs):
+    from .services.statistiques_service import contribution_ticket, deplacer_contribution
+    nouvelle = contribution_ticket(instance)
+    deplacer_contribution(getattr(instance, '_contribution_statistiques', None), nouvelle)
+    instance._contribution_statistiques = nouvelle
+
+
+@receiver(post_delete, sender=Ticket)
+def retirer_statistiques(sender, instance, **kwargs):
+    from .services.statistiques_service import contribution_ticket, deplacer_contribution
+    if hasattr(instance, '_contribution_statistiques'):
+        ancienne = instance._contribution_statistiques
+    else:
+        ancienne = contribution_ticket(instance, precedente=True)
+    deplacer_contribution(ancienne, None)
+
+
+# Les tickets d'un technicien ou d'un département supprimé passent à NULL par une mise à jour
+# groupée (SET_NULL, sans signal) : leurs agrégats suivent avant la suppression
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def detacher_statistiques_technicien(sender, instance, **kwargs):
+    from .services.statistiques_service import detacher_statistiques
+    detacher_statistiques('technicien_id', instance.pk)
+
+
+@receiver(pre_delete, sender=Departement)
+def detacher_statistiques_departement(sender, instance, **kwargs):
+    from .services.statistiques_service import detacher_statistiques
+    detacher_statistiques('departement_id', instance.pk)
+
+
+# Signaux pour tenir à jour l'index de recherche plein texte
+@receiver(post_save, sender=Ticket)
+def indexer_ticket_recherche(sender, instance, created, **kwargs):
+    if not created and not (instance.tracker.has_changed('titre') or instance.tracker.has_changed('description')):
+        return
+    from .services.recherche_service import indexer_ticket
+    indexer_ticket(instance)
+
+
+@receiver(post_delete, sender=Ticket)
+def desindexer_ticket_recherche(sender, instance, **kwargs):
+    from .services.recherche_service import desindexer_ticket
+    desindexer_ticket(instance.id)
+
+
+@receiver(post_save, sender=Commentaire)
+def indexer_commentaire_recherche(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields is not None and 'contenu' not in update_fields:
+        return
+    from .services.recherche_service import indexer_commentaire
+    indexer_commentaire(instance)
+
+
+@receiver(post_delete, sender=Commentaire)
+def desindexer_commentaire_recherche(sender, instance, **kwargs):
+    from .services.recherche_service import desindexer_commentaire
+    desindexer_commentaire(instance.id)
+
+
+@receiver(post_migrate)
+def reinitialiser_moteur_recherche(sender, **kwargs):
+    from .services.recherche_service import reinitialiser_moteur
+    reinitialiser_moteur()
+
 class QuestionDiagnostic(models.Model):
     """Représente une question dans l'arbre de décision du diagnostic"""
     TYPE_QUESTION_CHOICES = [
@@ -0,0 +1,107 @@
+"""
+Pagination par curseur (keyset) des listes de tickets
+La position est le couple (date_creation, id) du dernier ticket de la page : chaque page
+est une requête « WHERE (date_creation, id) < curseur ORDER BY ... LIMIT n », dont le coût ne
+dépend pas de la profondeur de la page (contrairement à OFFSET)
+La pagination est optionnelle : sans paramètre `cursor` ni `page_size`, la liste complète est
+renvoyée comme auparavant
+"""
+
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TicketCursorPagination(BasePagination):
+    """Pagination keyset sur (date_creation, id), du plus récent au plus ancien"""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+    invalid_cursor_message = 'Curseur invalide'
+
+    def __init__(self):
+        self.request = None
+        self.page_size_effective = self.page_size
+        self.suivant = None
+
+    def est_demandee(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            taille = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(taille, self.max_page_size))
+
+    @staticmethod
+    def encoder_curseur(ticket):
+        position = f"{ticket.date_creation.isoformat()}|{ticket.id}"
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decoder_curseur(self, valeur):
+        try:
+            date_iso, ticket_id = base64.urlsafe_b64decode(valeur.encode()).decode().split('|')
+            date_creation = parse_datetime(date_iso)
+            ticket_id = int(ticket_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if date_creation is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date_creation, ticket_id
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.est_demandee(request):
+            return None
+
+        self.request = request
+        self.page_size_effective = self.get_page_size(request)
+
+        queryset = queryset.order_by('-date_creation', '-id')
+        curseur = request.query_params.get(self.cursor_query_param)
+        if curseur:
+            date_creation, ticket_id = self.decoder_curseur(curseur)
+            queryset = queryset.filter(
+                Q(date_creation__lt=date_creation) | Q(date_creation=date_creation, id__lt=ticket_id)
+            )
+
+        # Un élément de plus pour savoir s'il existe une page suivante
+        tickets = list(queryset[:self.page_size_effective + 1])
+        page = tickets[:self.page_size_effective]
+        self.suivant = self.encoder_curseur(page[-1]) if len(tickets) > self.page_size_effective else None
+        return page
+
+    def get_next_link(self):
+        if self.suivant is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.suivant)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('next_cursor', self.suivant),
+            ('page_size', self.page_size_effective),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'page_size': {'type': 'integer'},
+                'results': schema,
+            },
+        }
@@ -4,4 +4,5 @@ from . import consumers
 websocket_urlpatterns = [
     re_path(r'ws/ticket/(?P<ticket_id>\w+)/$', consumers.TicketConsumer.as_asgi()),
     re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
+    re_path(r'ws/diagnostic/(?P<session_id>\d+)/$', consumers.DiagnosticConsumer.as_asgi()),
 ]
@@ -1,4 +1,5 @@
 from django.contrib.auth.password_validation import validate_password
+from django.db import models
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
@@ -8,6 +9,7 @@ from .models import (
     RegleDiagnostic, DiagnosticSysteme, TemplateDiagnostic, TemplateQuestion,
     HistoriqueDiagnostic
 )
+from .services.serialisation_service import est_serialisable_en_cache, serialiser_avec_cache
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -270,8 +272,49 @@ class TicketCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class TicketListSerializer(serializers.ModelSerializer):
-    """Serializer for listing tickets."""
+class ChampsDynamiquesMixin:
+    """
+    Sparse fieldsets: only the fields listed in `?fields=id,titre,...` (or the `fields`
+    argument) are serialized. Unknown names are ignored; without the parameter nothing changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        champs = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if champs is None:
+            champs = self.champs_demandes(self.context.get('request'))
+        if champs:
+            for nom in set(self.fields) - set(champs):
+                self.fields.pop(nom)
+
+    @staticmethod
+    def champs_demandes(request):
+        """Noms de champs demandés dans la query string (None si non précisé)"""
+        if request is None:
+            return None
+        valeur = request.query_params.get('fields')
+        if not valeur:
+            return None
+        return [nom.strip() for nom in valeur.split(',') if nom.strip()]
+
+
+class TicketCacheListSerializer(serializers.ListSerializer):
+    """List serializer reading and writing the ticket serialization cache in batches."""
+
+    def to_representation(self, data):
+        tickets = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if not self.child.est_complet() or not all(est_serialisable_en_cache(ticket) for ticket in tickets):
+            return [self.child.to_representation(ticket) for ticket in tickets]
+        return serialiser_avec_cache(tickets, self.child.representation_sans_cache)
+
+
+class TicketListSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    """
+    Serializer for listing tickets.
+    Full representations are cached per ticket version (see services/serialisation_service.py);
+    sparse fieldsets and deferred instances bypass the cache.
+    """
     categorie = CategorieSerializer(read_only=True)
     equipement = EquipementSerializer(read_only=True)
     utilisateur_createur = serializers.SerializerMethodField()
@@ -282,8 +325,21 @@ class TicketListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'titre', 'description', 'date_creation', 'date_modification',
             'statut_ticket', 'priorite', 'categorie', 'utilisateur_createur',
-            'technicien_assigne', 'equipement'
+            'technicien_assigne', 'equipement', 'version'
         ]
+        list_serializer_class = TicketCacheListSerializer
+
+    def est_complet(self):
+        """True when no field was dropped by a sparse fieldset."""
+        return len(self.fields) == len(self.Meta.fields)
+
+    def representation_sans_cache(self, instance):
+        return super().to_representation(instance)
+
+    def to_representation(self, instance):
+        if self.est_complet() and est_serialisable_en_cache(instance):
+            return serialiser_avec_cache([instance], self.representation_sans_cache)[0]
+        return super().to_representation(instance)
 
     @staticmethod
     def get_utilisateur_createur(obj):
@@ -339,8 +395,10 @@ class CommentaireSerializer(serializers.ModelSerializer):
         return None
 
     def get_reponses(self, obj):
-        """Get direct responses to this comment."""
-        reponses = obj.reponses.all()
+        """Get direct responses to this comment (preloaded tree when available)."""
+        reponses = getattr(obj, 'reponses_prechargees', None)
+        if reponses is None:
+            reponses = obj.reponses.select_related('utilisateur_auteur')
         if reponses:
             return CommentaireSerializer(reponses, many=True, context=self.context).data
         return []
@@ -0,0 +1,215 @@
+"""
+Banc d'essai du disque pour le diagnostic de performance
+Le test écrit un fichier au nom unique (sessions simultanées) dans DIAGNOSTIC_DISQUE_REPERTOIRE
+puis mesure les débits séquentiels et aléatoires ainsi que les latences des accès aléatoires.
+Pour mesurer le disque et non le cache de pages :
+- 'direct' : fichier ouvert avec O_DIRECT (Linux ; repli sur 'fsync' si indisponible)
+- 'fsync' : écritures synchronisées (fsync après la passe séquentielle, fdatasync après chaque
+  écriture aléatoire) et cache du fichier vidé avant les lectures (posix_fadvise)
+- 'aucune' : aucune synchronisation, le cache de pages est mesuré
+Avec une échéance (time.monotonic()), le test s'arrête entre deux opérations dès qu'elle est
+atteinte (TimeoutError) : il ne retient pas le thread d'une sonde au-delà de son délai
+"""
+
+import logging
+import math
+import mmap
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+REPERTOIRE = getattr(settings, 'DIAGNOSTIC_DISQUE_REPERTOIRE', None)  # None : répertoire temporaire du système
+TAILLE_MO = getattr(settings, 'DIAGNOSTIC_DISQUE_TAILLE_MO', 4)
+OPERATIONS_ALEATOIRES = getattr(settings, 'DIAGNOSTIC_DISQUE_OPERATIONS_ALEATOIRES', 64)
+SYNCHRONISATION = getattr(settings, 'DIAGNOSTIC_DISQUE_SYNCHRONISATION', 'fsync')
+LECTURE_MMAP = getattr(settings, 'DIAGNOSTIC_DISQUE_MMAP', False)
+
+MODES_SYNCHRONISATION = ('direct', 'fsync', 'aucune')
+TAILLE_BLOC_SEQUENTIEL = 1024 * 1024
+# Taille des accès aléatoires, alignée pour O_DIRECT
+TAILLE_BLOC_ALEATOIRE = 4096
+MO = 1024 * 1024
+
+
+def _tampon(taille: int) -> mmap.mmap:
+    """Tampon aligné sur une page (exigé par O_DIRECT), rempli de données non compressibles"""
+    tampon = mmap.mmap(-1, taille)
+    tampon.write(os.urandom(taille))
+    return tampon
+
+
+def _ecrire(fd: int, tampon, position: int) -> int:
+    if hasattr(os, 'pwrite'):
+        return os.pwrite(fd, tampon, position)
+    os.lseek(fd, position, os.SEEK_SET)
+    return os.write(fd, tampon)
+
+
+def _lire(fd: int, tampon, position: int) -> int:
+    if hasattr(os, 'preadv'):
+        return os.preadv(fd, [tampon], position)
+    os.lseek(fd, position, os.SEEK_SET)
+    return len(os.read(fd, len(tampon)))
+
+
+def _synchroniser_donnees(fd: int):
+    (os.fdatasync if hasattr(os, 'fdatasync') else os.fsync)(fd)
+
+
+def _vider_cache(fd: int) -> bool:
+    """Retire le fichier du cache de pages (données déjà synchronisées) ; False si impossible"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    return True
+
+
+def _verifier_echeance(echeance: Optional[float]) -> None:
+    if echeance is not None and time.monotonic() >= echeance:
+        raise TimeoutError("Banc d'essai du disque interrompu : échéance atteinte")
+
+
+def _debit(octets: int, duree: float) -> Optional[float]:
+    return round(octets / MO / duree, 1) if duree > 0 else None
+
+
+def _percentiles(latences: List[float]) -> Dict[str, float]:
+    """Percentiles (rang le plus proche) de latences en secondes, exprimés en millisecondes"""
+    triees = sorted(latences)
+
+    def rang(p):
+        return round(triees[max(0, math.ceil(p / 100 * len(triees)) - 1)] * 1000, 3)
+
+    return {'p50': rang(50), 'p95': rang(95), 'p99': rang(99), 'max': round(triees[-1] * 1000, 3)}
+
+
+def _ouvrir(chemin: str, mode: str):
+    """Descripteur du fichier de test et mode effectivement appliqué"""
+    if mode == 'direct':
+        if hasattr(os, 'O_DIRECT'):
+            try:
+                return os.open(chemin, os.O_RDWR | os.O_DIRECT), 'direct'
+            except OSError as e:
+                # Systèmes de fichiers sans O_DIRECT (tmpfs...)
+                logger.warning(f"O_DIRECT indisponible pour {chemin} ({e}), repli sur fsync")
+        mode = 'fsync'
+    return os.open(chemin, os.O_RDWR | getattr(os, 'O_BINARY', 0)), mode
+
+
+def mesurer_disque(repertoire: Optional[str] = None, taille_mo: Optional[float] = None,
+                   synchronisation: Optional[str] = None, operations_aleatoires: Optional[int] = None,
+                   lecture_mmap: Optional[bool] = None, echeance: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Débits (Mo/s) séquentiels et aléatoires, latences des accès aléatoires (ms) et, en option,
+    débit de lecture par mmap. Les paramètres absents prennent les valeurs des réglages
+    DIAGNOSTIC_DISQUE_*. Le fichier de test est toujours supprimé, y compris quand `echeance`
+    interrompt le test
+    """
+    repertoire = repertoire or REPERTOIRE or tempfile.gettempdir()
+    taille_mo = taille_mo or TAILLE_MO
+    synchronisation = synchronisation or SYNCHRONISATION
+    operations_aleatoires = operations_aleatoires or OPERATIONS_ALEATOIRES
+    lecture_mmap = LECTURE_MMAP if lecture_mmap is None else lecture_mmap
+    if synchronisation not in MODES_SYNCHRONISATION:
+        raise ValueError(f"Mode de synchronisation inconnu : {synchronisation}")
+
+    nombre_blocs = max(1, int(taille_mo * MO) // TAILLE_BLOC_SEQUENTIEL)
+    taille = nombre_blocs * TAILLE_BLOC_SEQUENTIEL
+    synchroniser = synchronisation != 'aucune'
+
+    descripteur, chemin = tempfile.mkstemp(prefix='diagnostic_disque_', suffix='.tmp', dir=repertoire)
+    os.close(descripteur)
+    fd = None
+    tampon_sequentiel = _tampon(TAILLE_BLOC_SEQUENTIEL)
+    tampon_aleatoire = _tampon(TAILLE_BLOC_ALEATOIRE)
+    try:
+        fd, mode = _ouvrir(chemin, synchronisation)
+
+        # Écriture séquentielle, synchronisée sur le disque
+        debut = time.perf_counter()
+        for bloc in range(nombre_blocs):
+            _verifier_echeance(echeance)
+            _ecrire(fd, tampon_sequentiel, bloc * TAILLE_BLOC_SEQUENTIEL)
+        if synchroniser:
+            os.fsync(fd)
+        duree_ecriture = time.perf_counter() - debut
+
+        # Lecture séquentielle, hors cache de pages
+        cache_contourne = mode == 'direct' or (synchroniser and _vider_cache(fd))
+        debut = time.perf_counter()
+        for bloc in range(nombre_blocs):
+            _verifier_echeance(echeance)
+            _lire(fd, tampon_sequentiel, bloc * TAILLE_BLOC_SEQUENTIEL)
+        duree_lecture = time.perf_counter() - debut
+
+        # Accès aléatoires par blocs de 4 Ko
+        positions_possibles = taille // TAILLE_BLOC_ALEATOIRE
+        generateur = random.Random()
+        if mode != 'direct' and synchroniser:
+            _vider_cache(fd)
+        latences_lecture = []
+        for _ in range(operations_aleatoires):
+            _verifier_echeance(echeance)
+            position = generateur.randrange(positions_possibles) * TAILLE_BLOC_ALEATOIRE
+            debut = time.perf_counter()
+            _lire(fd, tampon_aleatoire, position)
+            latences_lecture.append(time.perf_counter() - debut)
+
+        latences_ecriture = []
+        for _ in range(operations_aleatoires):
+            _verifier_echeance(echeance)
+            position = generateur.randrange(positions_possibles) * TAILLE_BLOC_ALEATOIRE
+            debut = time.perf_counter()
+            _ecrire(fd, tampon_aleatoire, position)
+            if synchroniser:
+                _synchroniser_donnees(fd)
+            latences_ecriture.append(time.perf_counter() - debut)
+
+        octets_aleatoires = operations_aleatoires * TAILLE_BLOC_ALEATOIRE
+        resultats = {
+            'repertoire': repertoire,
+            'taille_mo': round(taille / MO, 2),
+            'mode': mode,
+            'cache_contourne': cache_contourne,
+            'ecriture_sequentielle_mo_s': _debit(taille, duree_ecriture),
+            'lecture_sequentielle_mo_s': _debit(taille, duree_lecture),
+            'ecriture_aleatoire_mo_s': _debit(octets_aleatoires, sum(latences_ecriture)),
+            'lecture_aleatoire_mo_s': _debit(octets_aleatoires, sum(latences_lecture)),
+            'latences_ms': {
+                'ecriture_aleatoire': _percentiles(latences_ecriture),
+                'lecture_aleatoire': _percentiles(latences_lecture),
+            },
+            # Temps d'écriture puis de lecture séquentielles d'1 Mo
+            'secondes_par_mo': round((duree_ecriture + duree_lecture) * MO / taille, 4),
+        }
+
+        if lecture_mmap:
+            if synchroniser and mode != 'direct':
+                _synchroniser_donnees(fd)
+                _vider_cache(fd)
+            projection = mmap.mmap(fd, taille, access=mmap.ACCESS_READ)
+            try:
+                debut = time.perf_counter()
+                for position in range(0, taille, TAILLE_BLOC_SEQUENTIEL):
+                    _verifier_echeance(echeance)
+                    projection[position:position + TAILLE_BLOC_SEQUENTIEL]
+                resultats['lecture_mmap_mo_s'] = _debit(taille, time.perf_counter() - debut)
+            finally:
+                projection.close()
+
+        return resultats
+    finally:
+        tampon_sequentiel.close()
+        tampon_aleatoire.close()
+        if fd is not None:
+            os.close(fd)
+        try:
+            os.remove(chemin)
+        except OSError as e:
+            logger.warning(f"Impossible de supprimer le fichier de test disque {chemin}: {e}")
@@ -0,0 +1,75 @@
+"""
+Service de chargement du fil de commentaires d'un ticket
+Le fil est lu en une requête (fil complet) ou deux (une page de commentaires principaux puis
+tous leurs descendants via une CTE récursive), auteurs compris, puis assemblé en arbre en
+mémoire : chaque commentaire porte la liste `reponses_prechargees` utilisée par le serializer
+"""
+
+from typing import List, Optional, Tuple
+
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from ..models import Commentaire
+
+TABLE_COMMENTAIRES = Commentaire._meta.db_table
+
+SQL_DESCENDANTS = f"""
+    WITH RECURSIVE arbre(id) AS (
+        SELECT id FROM "{TABLE_COMMENTAIRES}" WHERE commentaire_parent_id IN ({{racines}})
+        UNION ALL
+        SELECT c.id FROM "{TABLE_COMMENTAIRES}" c INNER JOIN arbre ON c.commentaire_parent_id = arbre.id
+    )
+    SELECT id FROM arbre
+"""
+
+
+def _commentaires():
+    return Commentaire.objects.select_related('utilisateur_auteur').order_by('date_commentaire', 'id')
+
+
+def assembler_arbre(commentaires: List[Commentaire]) -> None:
+    """Rattache chaque commentaire à son parent (les commentaires doivent être triés chronologiquement)"""
+    par_id = {commentaire.id: commentaire for commentaire in commentaires}
+    for commentaire in commentaires:
+        commentaire.reponses_prechargees = []
+    for commentaire in commentaires:
+        parent = par_id.get(commentaire.commentaire_parent_id)
+        if parent is not None:
+            parent.reponses_prechargees.append(commentaire)
+
+
+def charger_fil_commentaires(ticket_id: int, apres: Optional[int] = None,
+                             limite: Optional[int] = None) -> Tuple[List[Commentaire], Optional[int]]:
+    """
+    Commentaires principaux du ticket (avec leurs réponses préchargées) et identifiant du dernier
+    commentaire de la page s'il en existe une suivante.
+    Sans `limite`, le fil complet est renvoyé ; `apres` (identifiant d'un commentaire principal
+    du ticket) reprend la lecture juste après ce commentaire. Lève Commentaire.DoesNotExist si
+    `apres` n'est pas un commentaire principal du ticket
+    """
+    if limite is None:
+        commentaires = list(_commentaires().filter(ticket_id=ticket_id))
+        assembler_arbre(commentaires)
+        return [commentaire for commentaire in commentaires if commentaire.commentaire_parent_id is None], None
+
+    racines = _commentaires().filter(ticket_id=ticket_id, commentaire_parent=None)
+    if apres is not None:
+        repere = Commentaire.objects.filter(
+            id=apres, ticket_id=ticket_id, commentaire_parent=None
+        ).values_list('date_commentaire', flat=True).get()
+        racines = racines.filter(Q(date_commentaire__gt=repere) | Q(date_commentaire=repere, id__gt=apres))
+
+    # Un élément de plus pour savoir s'il existe une page suivante
+    racines = list(racines[:limite + 1])
+    suivant = racines[limite - 1].id if len(racines) > limite else None
+    racines = racines[:limite]
+
+    descendants = []
+    if racines:
+        ids = [racine.id for racine in racines]
+        sql = SQL_DESCENDANTS.format(racines=', '.join(['%s'] * len(ids)))
+        descendants = list(_commentaires().filter(id__in=RawSQL(sql, ids)))
+
+    assembler_arbre(racines + descendants)
+    return racines, suivant
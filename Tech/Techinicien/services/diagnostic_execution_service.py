@@ -0,0 +1,194 @@
+"""
+Exécution du diagnostic système en arrière-plan
+Les vues ne font que lancer l'exécution (après la validation de la transaction) et renvoient
+aussitôt un identifiant d'exécution. Un pool de threads du processus exécute le moteur ; chaque
+sonde terminée est publiée sur le groupe WebSocket `diagnostic_<session_id>`
+(DiagnosticConsumer) et l'état courant est conservé dans le cache, pour les clients qui se
+connectent en cours de route. Une seule exécution à la fois par session
+
+Le verrou et l'état d'exécution sont dans le cache Django : avec plusieurs processus (workers
+ASGI/WSGI), le cache doit être partagé (CACHE_REDIS_URL). Le cache mémoire local par défaut ne
+garantit l'exécution unique et le rattrapage WebSocket qu'au sein d'un même processus
+"""
+
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from ..diagnostic_engine import DiagnosticSystemeEngine
+from ..models import SessionDiagnostic
+
+logger = logging.getLogger(__name__)
+
+EXECUTIONS_SIMULTANEES = getattr(settings, 'DIAGNOSTIC_EXECUTIONS_SIMULTANEES', 4)
+# L'état d'une exécution reste consultable une heure après la fin
+DUREE_ETAT = 60 * 60  # secondes
+# Le verrou d'une session expire même si le processus s'arrête : à la soumission, il couvre
+# l'attente dans la file du pool, puis il est prolongé au démarrage pour la durée de l'exécution
+DUREE_VERROU_ATTENTE = getattr(settings, 'DIAGNOSTIC_VERROU_ATTENTE', 10 * 60)  # secondes
+DUREE_VERROU = DiagnosticSystemeEngine.DELAI_GLOBAL + 60  # secondes
+
+_executeur = None
+_verrou_executeur = threading.Lock()
+
+
+def groupe_diagnostic(session_id) -> str:
+    return f"diagnostic_{session_id}"
+
+
+def cle_etat_execution(session_id) -> str:
+    return f"diagnostic_execution_{session_id}"
+
+
+def cle_verrou_execution(session_id) -> str:
+    return f"diagnostic_execution_verrou_{session_id}"
+
+
+def obtenir_etat_execution(session_id) -> Optional[Dict[str, Any]]:
+    """Dernier état connu de l'exécution du diagnostic de la session (None si aucune)"""
+    return cache.get(cle_etat_execution(session_id))
+
+
+def _obtenir_executeur() -> ThreadPoolExecutor:
+    global _executeur
+    with _verrou_executeur:
+        if _executeur is None:
+            _executeur = ThreadPoolExecutor(
+                max_workers=EXECUTIONS_SIMULTANEES, thread_name_prefix='diagnostic_execution'
+            )
+        return _executeur
+
+
+def lancer_diagnostic(session: SessionDiagnostic, remplacer: bool = False) -> Tuple[str, bool]:
+    """
+    Lance le diagnostic système de la session en arrière-plan, une fois la transaction courante
+    validée. `remplacer` supprime d'abord les résultats précédents.
+    Renvoie (execution_id, lance) : si une exécution est déjà en cours pour la session, son
+    identifiant est renvoyé et aucune nouvelle exécution n'est lancée
+    """
+    execution_id = uuid.uuid4().hex
+    if not cache.add(cle_verrou_execution(session.id), execution_id, DUREE_VERROU_ATTENTE):
+        execution_en_cours = cache.get(cle_verrou_execution(session.id))
+        if execution_en_cours:
+            return execution_en_cours, False
+        # Verrou expiré entre les deux lectures
+        cache.set(cle_verrou_execution(session.id), execution_id, DUREE_VERROU_ATTENTE)
+
+    cache.set(cle_etat_execution(session.id), {
+        'execution_id': execution_id,
+        'session_id': session.id,
+        'statut': 'en_cours',
+        'total': len(DiagnosticSystemeEngine.SONDES),
+        'termines': 0,
+        'resultats': {},
+        'latences': {},
+    }, DUREE_ETAT)
+
+    session_id = session.id
+    transaction.on_commit(
+        lambda: _obtenir_executeur().submit(_executer_diagnostic, session_id, execution_id, remplacer)
+    )
+    return execution_id, True
+
+
+def _diffuser(session_id, evenement: Dict[str, Any]) -> None:
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(groupe_diagnostic(session_id), evenement)
+    except Exception as e:
+        logger.error(f"Erreur lors de la diffusion du diagnostic de la session {session_id}: {e}")
+
+
+def _prendre_verrou(session_id, execution_id: str) -> bool:
+    """
+    Prolonge le verrou de la session pour la durée de l'exécution, à partir de son démarrage.
+    False si une autre exécution a pris le verrou entre-temps (verrou expiré pendant l'attente)
+    """
+    cle = cle_verrou_execution(session_id)
+    proprietaire = cache.get(cle)
+    if proprietaire is None:
+        return cache.add(cle, execution_id, DUREE_VERROU)
+    if proprietaire != execution_id:
+        return False
+    cache.set(cle, execution_id, DUREE_VERROU)
+    return True
+
+
+def _liberer_verrou(session_id, execution_id: str) -> None:
+    """Supprime le verrou seulement s'il appartient encore à cette exécution"""
+    cle = cle_verrou_execution(session_id)
+    if cache.get(cle) == execution_id:
+        cache.delete(cle)
+
+
+def _executer_diagnostic(session_id, execution_id: str, remplacer: bool) -> None:
+    """Exécuté dans un thread du pool : le thread a ses propres connexions, fermées à la fin"""
+    if not _prendre_verrou(session_id, execution_id):
+        logger.warning(f"Diagnostic de la session {session_id} déjà repris par une autre exécution")
+        return
+
+    etat = obtenir_etat_execution(session_id) or {
+        'execution_id': execution_id,
+        'session_id': session_id,
+        'total': len(DiagnosticSystemeEngine.SONDES),
+        'termines': 0,
+        'resultats': {},
+        'latences': {},
+    }
+    etat['statut'] = 'en_cours'
+
+    def sur_resultat(nom, resultat, latence):
+        etat['resultats'][nom] = resultat
+        etat['latences'][nom] = latence
+        etat['termines'] = len(etat['resultats'])
+        cache.set(cle_etat_execution(session_id), etat, DUREE_ETAT)
+        _diffuser(session_id, {
+            'type': 'diagnostic_progression',
+            'execution_id': execution_id,
+            'session_id': session_id,
+            'sonde': nom,
+            'resultat': resultat,
+            'latence': latence,
+            'termines': etat['termines'],
+            'total': etat['total'],
+        })
+
+    try:
+        session = SessionDiagnostic.objects.select_related('utilisateur').get(id=session_id)
+        if remplacer:
+            session.diagnostics_systeme.all().delete()
+
+        resultats = DiagnosticSystemeEngine(session).executer_diagnostic_complet(sur_resultat=sur_resultat)
+
+        etat.update(statut='termine', resultats=resultats, termines=len(resultats))
+        cache.set(cle_etat_execution(session_id), etat, DUREE_ETAT)
+        _diffuser(session_id, {
+            'type': 'diagnostic_termine',
+            'execution_id': execution_id,
+            'session_id': session_id,
+            'resultats': resultats,
+            'latences': etat['latences'],
+        })
+    except Exception as e:
+        logger.error(f"Erreur lors du diagnostic système de la session {session_id}: {e}")
+        etat.update(statut='erreur', erreur=str(e))
+        cache.set(cle_etat_execution(session_id), etat, DUREE_ETAT)
+        _diffuser(session_id, {
+            'type': 'diagnostic_erreur',
+            'execution_id': execution_id,
+            'session_id': session_id,
+            'erreur': str(e),
+        })
+    finally:
+        _liberer_verrou(session_id, execution_id)
+        connections.close_all()
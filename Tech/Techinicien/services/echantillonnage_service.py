@@ -0,0 +1,142 @@
+"""
+Échantillonnage partagé des métriques de l'hôte (psutil) pour les sondes du diagnostic système
+Un instantané (mémoire, CPU, table des processus) est mesuré une fois puis servi à toutes les
+sondes d'une exécution et aux sessions simultanées tant qu'il a moins de DIAGNOSTIC_ECHANTILLON_TTL
+secondes : la table des processus n'est parcourue qu'une fois.
+Les pourcentages CPU de psutil (système et par processus) se calculent entre deux relevés : tant
+que des diagnostics sont demandés, un thread d'arrière-plan relève seulement les compteurs CPU
+(référence du prochain calcul) ; l'instantané complet n'est mesuré qu'à la demande, sans jamais
+attendre. Sans référence utilisable (premier instantané, ou après une longue inactivité), les
+pourcentages CPU de l'instantané valent None (non disponibles).
+Coût du thread : chaque relevé parcourt la table des processus. Il ne relève que si aucun
+parcours (relevé ou instantané) n'a eu lieu depuis `duree` secondes, soit au plus un parcours
+toutes les `duree` secondes au total, et s'arrête DIAGNOSTIC_ECHANTILLON_INACTIVITE secondes
+après la dernière demande
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import psutil
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DUREE_INSTANTANE = getattr(settings, 'DIAGNOSTIC_ECHANTILLON_TTL', 5)  # secondes
+DELAI_INACTIVITE = getattr(settings, 'DIAGNOSTIC_ECHANTILLON_INACTIVITE', 120)  # secondes
+# En dessous, les pourcentages CPU sont trop bruités : l'instantané précédent est servi à la place
+FENETRE_MINIMALE = 0.5  # secondes
+FENETRE_MAXIMALE = 60  # secondes : au-delà, la moyenne ne décrit plus l'état actuel
+
+ATTRIBUTS_PROCESSUS = ['pid', 'name', 'cpu_percent', 'memory_percent', 'memory_info']
+
+
+class InstantaneSysteme:
+    """Métriques de l'hôte relevées au même moment (lecture seule, partagé entre threads)"""
+
+    def __init__(self, memoire, cpu_percent: Optional[float], cpu_count: Optional[int], cpu_freq,
+                 charge_moyenne, boot_time: float, processus: List[Dict[str, Any]]):
+        self.horodatage = time.monotonic()
+        self.memoire = memoire
+        self.cpu_percent = cpu_percent  # None si aucune référence CPU n'était disponible
+        self.cpu_count = cpu_count
+        self.cpu_freq = cpu_freq
+        self.charge_moyenne = charge_moyenne
+        self.boot_time = boot_time
+        # pid, name, cpu_percent, memory_percent (None si accès refusé ou non disponible) et rss (octets)
+        self.processus = processus
+
+    def age(self) -> float:
+        return time.monotonic() - self.horodatage
+
+
+class EchantillonneurSysteme:
+    """Cache de l'instantané courant et thread de renouvellement, sûr entre threads"""
+
+    def __init__(self, duree: float = DUREE_INSTANTANE, inactivite: float = DELAI_INACTIVITE):
+        self.duree = duree
+        self.inactivite = inactivite
+        self._verrou = threading.Lock()
+        self._instantane = None
+        self._dernier_releve = None
+        self._derniere_demande = 0.0
+        self._thread = None
+
+    def instantane(self) -> InstantaneSysteme:
+        """
+        Instantané de moins de `duree` secondes ; les appels simultanés attendent la même mesure
+        au lieu de parcourir chacun la table des processus
+        """
+        with self._verrou:
+            self._derniere_demande = time.monotonic()
+            self._demarrer_renouvellement()
+            if self._instantane is None or self._instantane.age() >= self.duree:
+                self._mesurer()
+            return self._instantane
+
+    def _demarrer_renouvellement(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._renouveler, name='diagnostic_echantillonnage', daemon=True
+            )
+            self._thread.start()
+
+    def _renouveler(self):
+        """Relevés de référence réguliers, sans mesurer d'instantané"""
+        while True:
+            time.sleep(self.duree / 2)
+            with self._verrou:
+                maintenant = time.monotonic()
+                if maintenant - self._derniere_demande > self.inactivite:
+                    self._thread = None
+                    return
+                if self._dernier_releve is not None and maintenant - self._dernier_releve < self.duree:
+                    # Un instantané ou un relevé récent sert déjà de référence
+                    continue
+                try:
+                    self._relever_cpu()
+                except Exception as e:
+                    logger.error(f"Erreur lors du relevé CPU de référence: {e}")
+
+    def _relever_cpu(self):
+        """Relevé de référence des compteurs CPU (système et processus), appelé avec le verrou"""
+        psutil.cpu_percent(interval=None)
+        for _ in psutil.process_iter(['cpu_percent']):
+            pass
+        self._dernier_releve = time.monotonic()
+
+    def _mesurer(self):
+        """Mesure un nouvel instantané (appelé avec le verrou), sans attendre"""
+        ecart = None if self._dernier_releve is None else time.monotonic() - self._dernier_releve
+        if ecart is not None and ecart < FENETRE_MINIMALE and self._instantane is not None:
+            # Relevé de référence trop récent : l'instantané précédent reste plus fiable
+            return
+        cpu_disponible = ecart is not None and ecart <= FENETRE_MAXIMALE
+
+        cpu_percent = psutil.cpu_percent(interval=None)
+        processus = []
+        for proc in psutil.process_iter(ATTRIBUTS_PROCESSUS):
+            info = proc.info
+            processus.append({
+                'pid': info['pid'],
+                'name': info['name'] or '',
+                'cpu_percent': info['cpu_percent'] if cpu_disponible else None,
+                'memory_percent': info['memory_percent'],
+                'rss': info['memory_info'].rss if info['memory_info'] else None,
+            })
+        self._dernier_releve = time.monotonic()
+
+        self._instantane = InstantaneSysteme(
+            memoire=psutil.virtual_memory(),
+            cpu_percent=cpu_percent if cpu_disponible else None,
+            cpu_count=psutil.cpu_count(),
+            cpu_freq=psutil.cpu_freq(),
+            charge_moyenne=psutil.getloadavg() if hasattr(psutil, 'getloadavg') else None,
+            boot_time=psutil.boot_time(),
+            processus=processus,
+        )
+
+
+echantillonneur_systeme = EchantillonneurSysteme()
@@ -0,0 +1,180 @@
+"""
+Service de file d'attente des emails sortants
+Les emails sont enregistrés dans la table EmailSortant au moment de l'événement (création de ticket,
+assignation urgente) puis envoyés par lots par la commande `traiter_emails`, avec nouvelles
+tentatives espacées en cas d'échec. Chaque envoi est tracé dans le modèle Notification.
+Après un envoi partiel (lot SendGrid ou repli SMTP interrompu), seules les adresses restantes
+sont conservées sur la ligne et retentées : les destinataires déjà servis ne reçoivent pas
+l'email une seconde fois.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import EmailSortant, Notification
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT = getattr(settings, 'EMAIL_OUTBOX_TAILLE_LOT', 50)
+MAX_TENTATIVES = getattr(settings, 'EMAIL_OUTBOX_MAX_TENTATIVES', 5)
+DELAI_BASE = getattr(settings, 'EMAIL_OUTBOX_DELAI_BASE', 60)  # secondes, doublé à chaque échec
+DELAI_MAX = getattr(settings, 'EMAIL_OUTBOX_DELAI_MAX', 60 * 60)
+DUREE_BAIL = getattr(settings, 'EMAIL_OUTBOX_DUREE_BAIL', 5 * 60)  # un email "en_cours" bloqué est repris après ce délai
+
+
+def planifier_email(type_email: str, ticket, destinataire=None) -> EmailSortant:
+    """
+    Ajouter un email à la file d'envoi
+    La clé de déduplication garantit qu'un même email n'est envoyé qu'une fois par ticket (et destinataire)
+    """
+    cle = f"{type_email}:{ticket.id}"
+    if destinataire is not None:
+        cle = f"{cle}:{destinataire.id}"
+
+    email, cree = EmailSortant.objects.get_or_create(
+        cle_deduplication=cle,
+        defaults={
+            'type_email': type_email,
+            'ticket': ticket,
+            'destinataire': destinataire,
+        }
+    )
+    if not cree:
+        logger.info(f"Email {cle} déjà planifié, ignoré")
+    return email
+
+
+def _envoyer(email: EmailSortant) -> bool:
+    """Envoyer un email de la file avec les fonctions existantes (SendGrid puis SMTP)"""
+    from ..email_utils import (
+        envoyer_email_nouveau_ticket,
+        envoyer_email_confirmation_employe,
+        envoyer_email_urgence_technicien,
+    )
+
+    if email.type_email == 'nouveau_ticket':
+        return envoyer_email_nouveau_ticket(email.ticket, email.destinataires_restants)
+    if email.type_email == 'confirmation_employe':
+        return envoyer_email_confirmation_employe(email.ticket)
+    if email.type_email == 'urgence_technicien':
+        return envoyer_email_urgence_technicien(email.ticket, email.destinataire)
+
+    raise ValueError(f"Type d'email inconnu : {email.type_email}")
+
+
+def _destinataires(email: EmailSortant) -> List[int]:
+    """Identifiants des utilisateurs concernés par l'email (pour l'historique des notifications)"""
+    from ..email_utils import get_notification_recipient_ids
+
+    ticket = email.ticket
+    if email.type_email == 'nouveau_ticket':
+        return get_notification_recipient_ids(ticket)
+    if email.type_email == 'confirmation_employe':
+        return [ticket.utilisateur_createur_id]
+    return [email.destinataire_id] if email.destinataire_id else []
+
+
+def _sujet(email: EmailSortant) -> str:
+    ticket = email.ticket
+    if email.type_email == 'nouveau_ticket':
+        return f"🎫 Nouveau ticket #{ticket.id} - {ticket.titre}"
+    if email.type_email == 'confirmation_employe':
+        return f"✅ Confirmation - Ticket #{ticket.id} créé avec succès"
+    return f"🚨 URGENT - Ticket #{ticket.id} assigné - {ticket.titre}"
+
+
+def _enregistrer_notifications(email: EmailSortant, statut_notification: str) -> None:
+    sujet = _sujet(email)
+    Notification.objects.bulk_create([
+        Notification(
+            ticket=email.ticket,
+            destinataire_id=destinataire_id,
+            type_notification='email',
+            sujet=sujet,
+            message=email.get_type_email_display(),
+            statut_notification=statut_notification
+        )
+        for destinataire_id in _destinataires(email)
+    ])
+
+
+def _reserver(email: EmailSortant, maintenant) -> bool:
+    """Réserver l'email pour ce worker (mise à jour conditionnelle, sûre avec plusieurs workers)"""
+    reserve = EmailSortant.objects.filter(
+        id=email.id,
+        statut=email.statut,
+        prochaine_tentative=email.prochaine_tentative
+    ).update(
+        statut='en_cours',
+        prochaine_tentative=maintenant + timedelta(seconds=DUREE_BAIL)
+    )
+    return reserve == 1
+
+
+def traiter_emails_en_attente(taille_lot: Optional[int] = None) -> Dict[str, int]:
+    """
+    Envoyer un lot d'emails dus
+    Retourne les compteurs du lot (envoyes, reportes, echecs)
+    """
+    from ..email_utils import EnvoiIncomplet
+
+    maintenant = timezone.now()
+    resultats = {'envoyes': 0, 'reportes': 0, 'echecs': 0}
+
+    # Les emails "en_cours" dont le bail a expiré (worker interrompu) sont repris
+    lot = list(
+        EmailSortant.objects.filter(
+            Q(statut='en_attente') | Q(statut='en_cours'),
+            prochaine_tentative__lte=maintenant
+        ).select_related(
+            'ticket__categorie', 'ticket__equipement',
+            'ticket__utilisateur_createur__departement', 'destinataire'
+        ).order_by('prochaine_tentative')[:taille_lot or TAILLE_LOT]
+    )
+
+    for email in lot:
+        if not _reserver(email, maintenant):
+            continue
+
+        try:
+            succes = _envoyer(email)
+            erreur = '' if succes else "L'envoi a échoué (voir les logs)"
+        except EnvoiIncomplet as e:
+            succes = False
+            erreur = str(e)
+            email.destinataires_restants = list(e.non_envoyes)
+        except Exception as e:
+            succes = False
+            erreur = str(e)
+
+        email.tentatives += 1
+        if succes:
+            email.statut = 'envoye'
+            email.date_envoi = timezone.now()
+            email.derniere_erreur = ''
+            resultats['envoyes'] += 1
+            _enregistrer_notifications(email, 'envoye')
+        elif email.tentatives >= MAX_TENTATIVES:
+            email.statut = 'echec'
+            email.derniere_erreur = erreur
+            resultats['echecs'] += 1
+            _enregistrer_notifications(email, 'echec')
+            logger.error(f"Échec définitif de l'email {email.cle_deduplication} après {email.tentatives} tentatives")
+        else:
+            delai = min(DELAI_BASE * 2 ** (email.tentatives - 1), DELAI_MAX)
+            email.statut = 'en_attente'
+            email.prochaine_tentative = timezone.now() + timedelta(seconds=delai)
+            email.derniere_erreur = erreur
+            resultats['reportes'] += 1
+            logger.warning(f"Email {email.cle_deduplication} reporté de {delai}s (tentative {email.tentatives})")
+
+        email.save(update_fields=[
+            'statut', 'tentatives', 'prochaine_tentative', 'derniere_erreur', 'date_envoi', 'destinataires_restants'
+        ])
+
+    return resultats
@@ -0,0 +1,142 @@
+"""
+Service pour l'état du guidage à distance
+Maintient, pour chaque ticket, un état compact (actif, dernière étape, confirmations en attente)
+afin que l'admission des messages WebSocket ne parcoure plus les commentaires. L'état est lu en
+base (une ligne par clé primaire) plutôt que dans le cache local au processus : la fin d'un
+guidage enregistrée par un worker est vue immédiatement par les autres
+"""
+
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from ..models import Commentaire, EtatGuidage, Ticket
+
+logger = logging.getLogger(__name__)
+
+def _vers_dict(etat: EtatGuidage) -> Dict[str, Any]:
+    return {
+        'est_actif': etat.est_actif,
+        'derniere_etape': etat.derniere_etape,
+        'confirmations_en_attente': etat.confirmations_en_attente,
+    }
+
+
+def _reconstruire_depuis_commentaires(ticket_id) -> Dict[str, Any]:
+    """Calcule l'état à partir de l'historique des commentaires (tickets antérieurs à l'état maintenu)"""
+    commentaires = Commentaire.objects.filter(ticket_id=ticket_id)
+
+    dernier_evenement = commentaires.filter(
+        type_action__in=['guidage_debut', 'guidage_fin']
+    ).order_by('-date_commentaire').values_list('type_action', flat=True).first()
+
+    instructions = commentaires.filter(est_instruction=True).aggregate(
+        derniere_etape=Max('numero_etape'),
+        en_attente=Count('id', filter=Q(attendre_confirmation=True, est_confirme=False))
+    )
+
+    return {
+        'est_actif': dernier_evenement == 'guidage_debut',
+        'derniere_etape': instructions['derniere_etape'] or 0,
+        'confirmations_en_attente': instructions['en_attente'] or 0,
+    }
+
+
+def _obtenir_ou_creer(ticket_id, verrouiller: bool = False) -> EtatGuidage:
+    queryset = EtatGuidage.objects.select_for_update() if verrouiller else EtatGuidage.objects
+    try:
+        return queryset.get(ticket_id=ticket_id)
+    except EtatGuidage.DoesNotExist:
+        etat, _ = EtatGuidage.objects.get_or_create(
+            ticket_id=ticket_id,
+            defaults=_reconstruire_depuis_commentaires(ticket_id)
+        )
+        return etat
+
+
+def obtenir_etat_guidage(ticket_id) -> Optional[Dict[str, Any]]:
+    """
+    Retourne l'état du guidage d'un ticket (une requête quand l'état existe déjà)
+    Retourne None si le ticket n'existe pas
+    """
+    try:
+        return _vers_dict(EtatGuidage.objects.get(ticket_id=ticket_id))
+    except EtatGuidage.DoesNotExist:
+        pass
+
+    if not Ticket.objects.filter(id=ticket_id).exists():
+        return None
+    return _vers_dict(_obtenir_ou_creer(ticket_id))
+
+
+def _modifier_etat(ticket_id, modification: Callable[[EtatGuidage], Any]) -> Any:
+    """Applique une modification à l'état sous verrou"""
+    with transaction.atomic():
+        etat = _obtenir_ou_creer(ticket_id, verrouiller=True)
+        resultat = modification(etat)
+        etat.save()
+
+    return resultat
+
+
+def demarrer_guidage(ticket_id) -> None:
+    """Marque le guidage comme actif pour le ticket"""
+    def modification(etat):
+        etat.est_actif = True
+
+    _modifier_etat(ticket_id, modification)
+
+
+def terminer_guidage(ticket_id) -> None:
+    """Marque le guidage comme terminé pour le ticket"""
+    def modification(etat):
+        etat.est_actif = False
+
+    _modifier_etat(ticket_id, modification)
+
+
+def enregistrer_instruction(ticket_id, numero_etape: Optional[int] = None,
+                            attendre_confirmation: bool = True) -> int:
+    """
+    Enregistre une nouvelle instruction et retourne son numéro d'étape
+    Si aucun numéro n'est fourni, l'étape suivante est attribuée
+    """
+    def modification(etat):
+        numero = int(numero_etape) if numero_etape else etat.derniere_etape + 1
+        etat.derniere_etape = max(etat.derniere_etape, numero)
+        if attendre_confirmation:
+            etat.confirmations_en_attente += 1
+        return numero
+
+    return _modifier_etat(ticket_id, modification)
+
+
+def enregistrer_confirmation(instruction: Commentaire) -> None:
+    """
+    Décrémente le nombre d'instructions en attente de confirmation
+    Seules les instructions qui attendaient une confirmation sont comptées
+    """
+    if not (instruction.est_instruction and instruction.attendre_confirmation):
+        return
+
+    def modification(etat):
+        etat.confirmations_en_attente = max(0, etat.confirmations_en_attente - 1)
+
+    _modifier_etat(instruction.ticket_id, modification)
+
+
+def synchroniser_avec_commentaire(commentaire: Commentaire) -> None:
+    """Met à jour l'état du guidage après la création d'un commentaire (API REST générique)"""
+    if commentaire.type_action == 'guidage_debut':
+        demarrer_guidage(commentaire.ticket_id)
+    elif commentaire.type_action == 'guidage_fin':
+        terminer_guidage(commentaire.ticket_id)
+    elif commentaire.est_instruction:
+        enregistrer_instruction(
+            commentaire.ticket_id,
+            commentaire.numero_etape,
+            commentaire.attendre_confirmation
+        )
+
@@ -0,0 +1,207 @@
+"""
+Service de diffusion des notifications de tickets
+Chaque événement n'est envoyé qu'aux groupes concernés (administrateurs, technicien assigné,
+techniciens pour les tickets non assignés) puis filtré par socket selon ses abonnements
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Optional, Set
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+# Filtres d'abonnement acceptés par NotificationConsumer
+FILTRES_LISTE = ['priorites', 'categories', 'departements']
+
+# Modes de diffusion des mises à jour de tickets : ticket complet ou différences seules
+MODES_DIFFUSION = ['complet', 'delta']
+
+
+def groupe_role(role: str) -> str:
+    return f"notifications_role_{role}"
+
+
+def groupe_utilisateur(user_id) -> str:
+    return f"notifications_user_{user_id}"
+
+
+class StatistiquesNotifications:
+    """Compteurs (par processus) des notifications livrées et filtrées"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._compteurs = {'publiees': 0, 'envois_groupes': 0, 'livrees': 0, 'filtrees': 0}
+
+    def incrementer(self, compteur: str, valeur: int = 1) -> None:
+        with self._verrou:
+            self._compteurs[compteur] += valeur
+
+    def obtenir(self) -> Dict[str, int]:
+        with self._verrou:
+            return dict(self._compteurs)
+
+
+statistiques_notifications = StatistiquesNotifications()
+
+
+def meta_ticket(ticket) -> Dict[str, Any]:
+    """Informations compactes utilisées pour filtrer les événements côté serveur"""
+    createur = ticket.utilisateur_createur
+    return {
+        'ticket_id': ticket.id,
+        'priorite': ticket.priorite,
+        'categorie_id': ticket.categorie_id,
+        'technicien_id': ticket.technicien_assigne_id,
+        'departement_id': createur.departement_id if createur else None,
+    }
+
+
+def groupes_destinataires(ticket, etait_non_assigne: bool = False, ancien_technicien_id=None) -> Set[str]:
+    """
+    Groupes concernés par un événement sur ce ticket :
+    - les administrateurs voient tous les tickets
+    - les techniciens voient les tickets non assignés (ou qui viennent d'être pris en charge)
+    - le technicien assigné (ancien et nouveau) voit ses tickets
+    """
+    groupes = {groupe_role('admin')}
+
+    if ticket.technicien_assigne_id is None or etait_non_assigne:
+        # Tous les techniciens (dont l'assigné) sont concernés : inutile d'ajouter les groupes personnels
+        groupes.add(groupe_role('technicien'))
+        return groupes
+
+    for user_id in (ticket.technicien_assigne_id, ancien_technicien_id):
+        if user_id is not None:
+            groupes.add(groupe_utilisateur(user_id))
+
+    return groupes
+
+
+def serialiser_changements(serializer, changements: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Représentation des seuls champs modifiés (mêmes formats que TicketListSerializer)
+    `changements` est le dictionnaire renvoyé par `tracker.changed()`
+    """
+    ticket = serializer.instance
+    delta = {}
+
+    for nom in list(changements) + ['date_modification']:
+        if nom not in serializer.fields and nom.endswith('_id'):
+            nom = nom[:-3]
+        champ = serializer.fields.get(nom)
+        if champ is None:
+            continue
+        attribut = champ.get_attribute(ticket)
+        delta[nom] = champ.to_representation(attribut) if attribut is not None else None
+
+    return delta
+
+
+def formater_evenement_ticket(type_message: str, event: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    """
+    Message envoyé au client pour un événement ticket
+    - mode 'complet' (par défaut) : le ticket entier, comme auparavant
+    - mode 'delta' : uniquement les champs modifiés et la version (le client demande un
+      'snapshot' s'il détecte un écart de version)
+    """
+    changements = event.get('changements')
+    if mode == 'delta' and changements is not None:
+        return {
+            'type': f"{type_message}_delta",
+            'ticket_id': event['ticket']['id'],
+            'version': event.get('version'),
+            'changements': changements
+        }
+
+    message = {
+        'type': type_message,
+        'ticket': event['ticket']
+    }
+    if event.get('version') is not None:
+        message['version'] = event['version']
+    return message
+
+
+def serialiser_ticket_pour_utilisateur(ticket_id, user) -> Optional[Dict[str, Any]]:
+    """Instantané complet d'un ticket (demande 'snapshot'), si l'utilisateur peut le voir"""
+    from ..serializers import TicketListSerializer
+    from .visibilite_service import tickets_visibles
+
+    ticket = tickets_visibles(user).select_related(
+        'categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne'
+    ).filter(id=ticket_id).first()
+    if ticket is None:
+        return None
+
+    return {
+        'type': 'ticket_snapshot',
+        'ticket': TicketListSerializer(ticket).data,
+        'version': ticket.version
+    }
+
+
+def diffuser_evenement_ticket(type_evenement: str, ticket, ticket_data: Optional[Dict] = None,
+                              etait_non_assigne: bool = False, ancien_technicien_id=None,
+                              changements: Optional[Dict] = None) -> None:
+    """
+    Envoyer un événement ticket (new_ticket_notification, ticket_updated_notification, ...)
+    uniquement aux groupes concernés
+    """
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return
+
+    if ticket_data is None:
+        from ..serializers import TicketListSerializer
+        ticket_data = TicketListSerializer(ticket).data
+
+    groupes = groupes_destinataires(ticket, etait_non_assigne, ancien_technicien_id)
+    evenement = {
+        'type': type_evenement,
+        'ticket': ticket_data,
+        'meta': meta_ticket(ticket),
+        'version': ticket.version,
+        'changements': changements,
+    }
+
+    for groupe in groupes:
+        async_to_sync(channel_layer.group_send)(groupe, evenement)
+
+    statistiques_notifications.incrementer('publiees')
+    statistiques_notifications.incrementer('envois_groupes', len(groupes))
+
+
+def normaliser_filtres(donnees: Optional[Dict]) -> Dict[str, Any]:
+    """Valider les filtres envoyés par le client (les valeurs inconnues sont ignorées)"""
+    donnees = donnees or {}
+    filtres = {}
+
+    for nom in FILTRES_LISTE:
+        valeurs = donnees.get(nom)
+        if isinstance(valeurs, (list, tuple)) and valeurs:
+            filtres[nom] = [str(valeur) for valeur in valeurs]
+
+    if donnees.get('assigne_a_moi'):
+        filtres['assigne_a_moi'] = True
+
+    return filtres
+
+
+def correspond_aux_filtres(meta: Dict[str, Any], filtres: Dict[str, Any], user_id) -> bool:
+    """Vérifier qu'un événement correspond aux abonnements d'une socket"""
+    if not filtres or not meta:
+        return True
+
+    if 'priorites' in filtres and str(meta.get('priorite')) not in filtres['priorites']:
+        return False
+    if 'categories' in filtres and str(meta.get('categorie_id')) not in filtres['categories']:
+        return False
+    if 'departements' in filtres and str(meta.get('departement_id')) not in filtres['departements']:
+        return False
+    if filtres.get('assigne_a_moi') and meta.get('technicien_id') != user_id:
+        return False
+
+    return True
@@ -0,0 +1,222 @@
+"""
+Service de recherche plein texte sur les tickets (titre, description) et leurs commentaires
+- SQLite : table virtuelle FTS5 (tokenizer unicode61 sans accents) tenue à jour par les signaux,
+  classement bm25 (le titre pèse plus que le contenu) et recherche par préfixe
+- PostgreSQL : tsvector calculé à la requête (configuration 'french', unaccent) et SearchRank
+- Autres bases : repli sur icontains
+Chaque ligne de l'index a un rowid dérivé de l'objet (2 * id pour un commentaire,
+2 * id + 1 pour un ticket) afin que la mise à jour et la suppression se fassent par clé
+"""
+
+import logging
+import re
+import unicodedata
+from typing import List, Optional
+
+from django.db import connection
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+TABLE_FTS = 'Techinicien_recherche_fts'
+POIDS_TITRE = 10.0
+POIDS_CONTENU = 1.0
+MAX_TERMES = 10
+
+SQL_REMPLISSAGE = f"""
+    INSERT INTO "{TABLE_FTS}" (rowid, ticket_id, titre, contenu)
+    SELECT id * 2 + 1, id, titre, description FROM "Techinicien_ticket"
+    UNION ALL
+    SELECT id * 2, ticket_id, '', contenu FROM "Techinicien_commentaire"
+"""
+
+_fts5_disponible = None
+
+
+def rowid_ticket(ticket_id: int) -> int:
+    return ticket_id * 2 + 1
+
+
+def rowid_commentaire(commentaire_id: int) -> int:
+    return commentaire_id * 2
+
+
+def moteur_recherche() -> str:
+    """'fts5', 'postgres' ou 'icontains' selon la base configurée"""
+    global _fts5_disponible
+
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    if connection.vendor != 'sqlite':
+        return 'icontains'
+
+    # Résultat mémorisé, positif comme négatif ; oublié après chaque migrate (reinitialiser_moteur)
+    if _fts5_disponible is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE_FTS])
+            _fts5_disponible = cursor.fetchone() is not None
+    return 'fts5' if _fts5_disponible else 'icontains'
+
+
+def reinitialiser_moteur() -> None:
+    """Oublier le moteur mémorisé (la table FTS5 peut avoir été créée ou supprimée par migrate)"""
+    global _fts5_disponible
+    _fts5_disponible = None
+
+
+def termes_recherche(texte: str) -> List[str]:
+    """Mots de la requête (la ponctuation et les opérateurs sont ignorés)"""
+    return re.findall(r'\w+', (texte or '').lower())[:MAX_TERMES]
+
+
+def sans_accents(texte: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFD', texte) if unicodedata.category(c) != 'Mn')
+
+
+def _remplacer_ligne(rowid: int, ticket_id: int, titre: str, contenu: str) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{TABLE_FTS}" WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO "{TABLE_FTS}" (rowid, ticket_id, titre, contenu) VALUES (%s, %s, %s, %s)',
+            [rowid, ticket_id, titre or '', contenu or '']
+        )
+
+
+def _supprimer_ligne(rowid: int) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{TABLE_FTS}" WHERE rowid = %s', [rowid])
+
+
+def indexer_ticket(ticket) -> None:
+    if moteur_recherche() == 'fts5':
+        _remplacer_ligne(rowid_ticket(ticket.id), ticket.id, ticket.titre, ticket.description)
+
+
+def indexer_commentaire(commentaire) -> None:
+    if moteur_recherche() == 'fts5':
+        _remplacer_ligne(rowid_commentaire(commentaire.id), commentaire.ticket_id, '', commentaire.contenu)
+
+
+def desindexer_ticket(ticket_id: int) -> None:
+    # Les commentaires du ticket sont retirés par leurs propres signaux post_delete (cascade)
+    if moteur_recherche() == 'fts5':
+        _supprimer_ligne(rowid_ticket(ticket_id))
+
+
+def desindexer_commentaire(commentaire_id: int) -> None:
+    if moteur_recherche() == 'fts5':
+        _supprimer_ligne(rowid_commentaire(commentaire_id))
+
+
+def reconstruire_index() -> int:
+    """Reconstruire entièrement l'index FTS5 (retourne le nombre de lignes indexées)"""
+    if moteur_recherche() != 'fts5':
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{TABLE_FTS}"')
+        cursor.execute(SQL_REMPLISSAGE)
+        cursor.execute(f"INSERT INTO \"{TABLE_FTS}\" (\"{TABLE_FTS}\") VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM "{TABLE_FTS}"')
+        return cursor.fetchone()[0]
+
+
+def _rechercher_fts5(termes: List[str], tickets_visibles, limite: int):
+    """(ticket_id, score) triés par pertinence, restreints aux tickets visibles"""
+    expression = ' '.join(f'"{terme}"*' for terme in termes)
+    sql_visibles, params_visibles = tickets_visibles.values('id').query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH correspondances AS MATERIALIZED (
+                SELECT ticket_id, bm25("{TABLE_FTS}", %s, %s) AS score
+                FROM "{TABLE_FTS}"
+                WHERE "{TABLE_FTS}" MATCH %s
+            )
+            SELECT ticket_id, MIN(score) AS score
+            FROM correspondances
+            WHERE ticket_id IN ({sql_visibles})
+            GROUP BY ticket_id
+            ORDER BY score
+            LIMIT %s
+            """,
+            [POIDS_TITRE, POIDS_CONTENU, expression, *params_visibles, limite]
+        )
+        # bm25 est négatif (plus petit = plus pertinent) : on renvoie un score positif
+        return [(ticket_id, -score) for ticket_id, score in cursor.fetchall()]
+
+
+def _rechercher_postgres(termes: List[str], tickets_visibles, limite: int):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+    from django.db.models import F, Func, Max
+
+    from ..models import Commentaire
+
+    requete = SearchQuery(
+        ' & '.join(f"{sans_accents(terme)}:*" for terme in termes),
+        search_type='raw',
+        config='french'
+    )
+
+    def vecteur(champ, poids):
+        return SearchVector(Func(F(champ), function='unaccent'), weight=poids, config='french')
+
+    scores = dict(
+        tickets_visibles.annotate(document=vecteur('titre', 'A') + vecteur('description', 'B'))
+        .filter(document=requete)
+        .annotate(score=SearchRank(F('document'), requete))
+        .values_list('id', 'score')
+    )
+    commentaires = (
+        Commentaire.objects.filter(ticket__in=tickets_visibles)
+        .annotate(document=vecteur('contenu', 'C'))
+        .filter(document=requete)
+        .values('ticket_id')
+        .annotate(score=Max(SearchRank(F('document'), requete)))
+        .values_list('ticket_id', 'score')
+    )
+    for ticket_id, score in commentaires:
+        scores[ticket_id] = max(score, scores.get(ticket_id, 0))
+
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limite]
+
+
+def _rechercher_icontains(termes: List[str], tickets_visibles, limite: int):
+    for terme in termes:
+        tickets_visibles = tickets_visibles.filter(
+            Q(titre__icontains=terme) | Q(description__icontains=terme) | Q(commentaires__contenu__icontains=terme)
+        )
+    ids = tickets_visibles.order_by('-date_creation').values_list('id', flat=True).distinct()[:limite]
+    return [(ticket_id, None) for ticket_id in ids]
+
+
+def rechercher_tickets(texte: str, tickets_visibles, limite: int = 20, moteur: Optional[str] = None):
+    """
+    Tickets (parmi `tickets_visibles`) correspondant à tous les mots de `texte`, par préfixe,
+    triés par pertinence. Avec FTS5, les mots doivent figurer dans un même document (le ticket
+    ou l'un de ses commentaires). Chaque ticket renvoyé porte un attribut `score_recherche`
+    """
+    termes = termes_recherche(texte)
+    if not termes:
+        return []
+
+    moteur = moteur or moteur_recherche()
+    if moteur == 'fts5':
+        resultats = _rechercher_fts5(termes, tickets_visibles, limite)
+    elif moteur == 'postgres':
+        resultats = _rechercher_postgres(termes, tickets_visibles, limite)
+    else:
+        resultats = _rechercher_icontains(termes, tickets_visibles, limite)
+
+    tickets = tickets_visibles.model.objects.select_related(
+        'categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne'
+    ).in_bulk([ticket_id for ticket_id, _ in resultats])
+
+    classement = []
+    for ticket_id, score in resultats:
+        ticket = tickets.get(ticket_id)
+        if ticket is not None:
+            ticket.score_recherche = score
+            classement.append(ticket)
+    return classement
@@ -0,0 +1,120 @@
+"""
+Cache de sérialisation des tickets (TicketListSerializer)
+Chaque version d'un ticket n'est sérialisée qu'une fois, puis partagée par les vues REST, les
+signaux et les notifications WebSocket. La clé contient tout ce dont dépend le résultat :
+- le ticket : id, date_modification et version (toute sauvegarde change date_modification)
+- une empreinte des champs affichés de ses relations (catégorie, équipement et son département,
+  créateur, technicien), lus sur les instances chargées avec select_related ou, à défaut, en une
+  requête groupée. Un renommage est donc vu par tous les processus, même fait par
+  QuerySet.update() ou dans un autre worker, sans dépendre d'une invalidation par signal
+"""
+
+import hashlib
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import Ticket
+
+DUREE_CACHE_SERIALISATION = getattr(settings, 'TICKET_SERIALISATION_CACHE_TTL', 600)  # secondes
+
+# Champs des relations affichés par TicketListSerializer
+CHAMPS_RELATIONS = (
+    'categorie_id', 'categorie__nom_categorie', 'categorie__description_categorie',
+    'categorie__couleur_affichage',
+    'utilisateur_createur_id', 'utilisateur_createur__email', 'utilisateur_createur__first_name',
+    'utilisateur_createur__last_name', 'utilisateur_createur__role',
+    'technicien_assigne_id', 'technicien_assigne__email', 'technicien_assigne__first_name',
+    'technicien_assigne__last_name', 'technicien_assigne__role',
+    'equipement_id', 'equipement__nom_modele', 'equipement__type_equipement', 'equipement__numero_serie',
+    'equipement__statut_equipement', 'equipement__departement_id', 'equipement__departement__nom_departement',
+    'equipement__departement__responsable', 'equipement__departement__localisation',
+)
+# Colonnes d'une ligne values_list() passée à version_ticket
+CHAMPS_VERSION = ('id', 'date_modification', 'version') + CHAMPS_RELATIONS
+
+
+class _RelationNonChargee(Exception):
+    pass
+
+
+def est_serialisable_en_cache(ticket) -> bool:
+    """Les instances partielles (only()/defer()) ne passent pas par le cache"""
+    return ticket.pk is not None and not ticket.get_deferred_fields()
+
+
+def _valeur_chargee(ticket, chemin: str):
+    """Valeur d'un champ de relation sur l'instance, sans requête (_RelationNonChargee sinon)"""
+    objet = ticket
+    *relations, champ = chemin.split('__')
+    for relation in relations:
+        champ_relation = objet._meta.get_field(relation)
+        if getattr(objet, champ_relation.attname) is None:
+            return None
+        if not champ_relation.is_cached(objet):
+            raise _RelationNonChargee
+        objet = getattr(objet, relation)
+    return getattr(objet, champ)
+
+
+def _version(ticket_id, date_modification, version, relations) -> str:
+    empreinte = hashlib.md5(repr(tuple(relations)).encode()).hexdigest()
+    return f"{ticket_id}_{date_modification.isoformat()}_{version}_{empreinte}"
+
+
+def version_ticket(ligne) -> str:
+    """Version de la représentation d'un ticket (ETag), d'après une ligne values_list(*CHAMPS_VERSION)"""
+    ticket_id, date_modification, version, *relations = ligne
+    return _version(ticket_id, date_modification, version, relations)
+
+
+def cles_serialisation(tickets: List) -> List[str]:
+    """
+    Clés de cache des tickets ; les relations non chargées sur les instances sont lues en une
+    seule requête pour l'ensemble des tickets
+    """
+    relations = {}
+    a_lire = []
+    for ticket in tickets:
+        try:
+            relations[ticket.id] = tuple(_valeur_chargee(ticket, chemin) for chemin in CHAMPS_RELATIONS)
+        except _RelationNonChargee:
+            a_lire.append(ticket.id)
+    if a_lire:
+        for ticket_id, *valeurs in Ticket.objects.filter(id__in=a_lire).values_list('id', *CHAMPS_RELATIONS):
+            relations[ticket_id] = tuple(valeurs)
+
+    return [
+        f"ticket_serialise_{_version(ticket.id, ticket.date_modification, ticket.version, relations.get(ticket.id, ()))}"
+        for ticket in tickets
+    ]
+
+
+def lire_serialisations(cles: List[str]) -> Dict[str, dict]:
+    return cache.get_many(cles)
+
+
+def enregistrer_serialisations(donnees: Dict[str, dict]) -> None:
+    if donnees:
+        cache.set_many(donnees, DUREE_CACHE_SERIALISATION)
+
+
+def serialiser_avec_cache(tickets: List, serialiser) -> List[Optional[dict]]:
+    """
+    Représentation de chaque ticket, lue dans le cache ou calculée par `serialiser(ticket)`
+    puis enregistrée ; deux lectures groupées du cache quel que soit le nombre de tickets
+    """
+    cles = cles_serialisation(tickets)
+    en_cache = lire_serialisations(cles)
+
+    nouvelles = {}
+    resultats = []
+    for ticket, cle in zip(tickets, cles):
+        donnees = en_cache.get(cle)
+        if donnees is None:
+            donnees = nouvelles[cle] = serialiser(ticket)
+        resultats.append(donnees)
+
+    enregistrer_serialisations(nouvelles)
+    return resultats
@@ -0,0 +1,182 @@
+"""
+Service d'envoi SMTP avec connexions persistantes
+Les connexions SMTP (backend Django `get_connection()`) sont gardées ouvertes dans un petit pool :
+une rafale de notifications pour un ticket n'ouvre qu'une session (une seule négociation TLS).
+Une connexion inactive est vérifiée (NOOP) avant réutilisation et rouverte si le serveur l'a fermée.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from queue import Empty, LifoQueue
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+logger = logging.getLogger(__name__)
+
+TAILLE_POOL = getattr(settings, 'SMTP_POOL_TAILLE', 2)
+DELAI_KEEPALIVE = getattr(settings, 'SMTP_POOL_KEEPALIVE', 60)  # secondes d'inactivité avant vérification NOOP
+DELAI_ATTENTE = getattr(settings, 'SMTP_POOL_DELAI_ATTENTE', 30)  # secondes d'attente d'une connexion libre
+
+
+class EnvoiSMTPIncomplet(Exception):
+    """Envoi interrompu : `non_envoyes` contient les messages pas encore acceptés par le serveur"""
+
+    def __init__(self, non_envoyes, cause):
+        super().__init__(f"{len(non_envoyes)} message(s) non envoyé(s) : {cause}")
+        self.non_envoyes = non_envoyes
+        self.cause = cause
+
+
+class ConnexionPoolee:
+    """Connexion du backend email Django et date de sa dernière utilisation"""
+
+    def __init__(self):
+        self.backend = get_connection(fail_silently=False)
+        self.derniere_utilisation = 0.0
+
+    def ouvrir(self):
+        self.backend.open()
+        self.derniere_utilisation = time.monotonic()
+
+    def est_vivante(self) -> bool:
+        """Vérifie la session SMTP si elle est restée inactive trop longtemps"""
+        smtp = getattr(self.backend, 'connection', None)
+        if smtp is None:
+            # Backends sans session réseau (console, locmem...) : rien à vérifier
+            return not hasattr(self.backend, 'connection')
+        if time.monotonic() - self.derniere_utilisation < DELAI_KEEPALIVE:
+            return True
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def fermer(self):
+        try:
+            self.backend.close()
+        except Exception:
+            pass
+
+
+class PoolSMTP:
+    """Pool borné de connexions SMTP réutilisables, sûr entre threads"""
+
+    def __init__(self, taille: int = TAILLE_POOL):
+        self.taille = taille
+        self._libres = LifoQueue()
+        self._nombre = 0
+        self._verrou = threading.Lock()
+        self._disponible = threading.Semaphore(taille)
+
+    def _acquerir(self) -> ConnexionPoolee:
+        if not self._disponible.acquire(timeout=DELAI_ATTENTE):
+            raise TimeoutError("Aucune connexion SMTP disponible")
+        try:
+            connexion = self._libres.get_nowait()
+        except Empty:
+            connexion = ConnexionPoolee()
+            with self._verrou:
+                self._nombre += 1
+
+        if not connexion.est_vivante():
+            logger.info("Connexion SMTP expirée, reconnexion")
+            connexion.fermer()
+        try:
+            connexion.ouvrir()
+        except Exception:
+            self._liberer(connexion, valide=False)
+            raise
+        return connexion
+
+    def _liberer(self, connexion: ConnexionPoolee, valide: bool = True):
+        if valide:
+            self._libres.put(connexion)
+        else:
+            connexion.fermer()
+            with self._verrou:
+                self._nombre -= 1
+        self._disponible.release()
+
+    @staticmethod
+    def _est_coupure(erreur: Exception) -> bool:
+        """Connexion perdue (à rouvrir) ; les refus du serveur (SMTPException) sont définitifs"""
+        if isinstance(erreur, smtplib.SMTPServerDisconnected):
+            return True
+        return isinstance(erreur, OSError) and not isinstance(erreur, smtplib.SMTPException)
+
+    def envoyer(self, messages: Sequence[EmailMultiAlternatives]) -> int:
+        """
+        Envoie les messages sur une même session SMTP, un par un pour savoir où reprendre
+        En cas de coupure, la connexion est rouverte une fois et l'envoi reprend au premier message
+        non accepté (celui en cours lors de la coupure peut donc être reçu deux fois). Un refus du
+        serveur (expéditeur, destinataires, contenu) n'est pas retenté.
+        Lève EnvoiSMTPIncomplet avec les messages non acceptés quand l'envoi s'arrête
+        """
+        if not messages:
+            return 0
+
+        envoyes = 0
+        position = 0
+        for tentative in range(2):
+            connexion = self._acquerir()
+            try:
+                while position < len(messages):
+                    envoyes += connexion.backend.send_messages([messages[position]]) or 0
+                    position += 1
+                    connexion.derniere_utilisation = time.monotonic()
+                self._liberer(connexion)
+                return envoyes
+            except Exception as e:
+                self._liberer(connexion, valide=False)
+                if tentative or not self._est_coupure(e):
+                    raise EnvoiSMTPIncomplet(messages[position:], e) from e
+                logger.warning(
+                    f"Connexion SMTP perdue ({e}), reprise de l'envoi au message {position + 1}/{len(messages)}"
+                )
+        return envoyes
+
+    def fermer(self):
+        """Ferme toutes les connexions libres (arrêt du worker, tests)"""
+        while True:
+            try:
+                connexion = self._libres.get_nowait()
+            except Empty:
+                break
+            connexion.fermer()
+            with self._verrou:
+                self._nombre -= 1
+
+
+pool_smtp = PoolSMTP()
+
+
+def construire_message(sujet: str, texte: str, destinataires: List[str], html: Optional[str] = None,
+                       expediteur: Optional[str] = None) -> EmailMultiAlternatives:
+    """Construit un message texte avec une alternative HTML optionnelle"""
+    message = EmailMultiAlternatives(
+        subject=sujet,
+        body=texte,
+        from_email=expediteur or settings.DEFAULT_FROM_EMAIL,
+        to=destinataires
+    )
+    if html:
+        message.attach_alternative(html, "text/html")
+    return message
+
+
+def envoyer_emails_en_masse(donnees: Iterable[Tuple[str, str, Optional[str], List[str]]],
+                            expediteur: Optional[str] = None) -> int:
+    """
+    Équivalent de `send_mass_mail` avec alternative HTML :
+    chaque élément est (sujet, texte, html, destinataires) et tout part sur une même connexion
+    Retourne le nombre de messages envoyés
+    """
+    messages = [
+        construire_message(sujet, texte, destinataires, html, expediteur)
+        for sujet, texte, html, destinataires in donnees
+    ]
+    return pool_smtp.envoyer(messages)
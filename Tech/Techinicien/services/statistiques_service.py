@@ -0,0 +1,335 @@
+"""
+Service de statistiques des tickets
+- Les compteurs d'un périmètre (tickets créés par un employé, assignés à un technicien, ou tous
+  les tickets pour les admins) sont calculés en une seule requête d'agrégation conditionnelle
+  puis mis en cache quelques secondes ; toute modification d'un ticket invalide les périmètres
+  qui le contiennent
+- Les tableaux de bord lisent la table d'agrégats StatistiqueTicketJour : chaque ticket y compte
+  pour 1 dans la ligne de son jour de création et de son état courant. Les signaux de Ticket
+  déplacent cette contribution à chaque modification, la commande `reconstruire_statistiques`
+  recalcule la table entière
+"""
+
+import math
+import re
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DateField, DurationField, ExpressionWrapper, F, FloatField, IntegerField, \
+    Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+DUREE_CACHE_STATS = getattr(settings, 'TICKET_STATS_CACHE_TTL', 30)  # secondes
+
+
+def cle_stats(role: str, user_id=None) -> str:
+    if role == 'admin':
+        return 'stats_tickets_admin'
+    return f"stats_tickets_{role}_{user_id}"
+
+
+def perimetre_stats(user):
+    """(clé de cache, queryset) du périmètre statistique de l'utilisateur"""
+    from ..models import Ticket
+
+    if user.role == 'employe':
+        # Statistiques pour les employés (leurs propres tickets)
+        return cle_stats('employe', user.id), Ticket.objects.filter(utilisateur_createur=user)
+    if user.role == 'technicien':
+        # Statistiques pour les techniciens (tickets assignés)
+        return cle_stats('technicien', user.id), Ticket.objects.filter(technicien_assigne=user)
+    # Statistiques pour les admins (tous les tickets)
+    return cle_stats('admin'), Ticket.objects.all()
+
+
+def calculer_stats_tickets(tickets) -> Dict[str, int]:
+    """Tous les compteurs en une requête (COUNT ... FILTER / CASE WHEN selon la base)"""
+    return tickets.aggregate(
+        total=Count('id'),
+        ouvert=Count('id', filter=Q(statut_ticket='ouvert')),
+        en_cours=Count('id', filter=Q(statut_ticket='en cours')),
+        resolu=Count('id', filter=Q(statut_ticket='resolu')),
+        ferme=Count('id', filter=Q(statut_ticket='ferme')),
+        priorite_critique=Count('id', filter=Q(priorite='critique')),
+        priorite_urgent=Count('id', filter=Q(priorite='urgent')),
+    )
+
+
+def obtenir_stats_tickets(user) -> Dict[str, int]:
+    cle, tickets = perimetre_stats(user)
+    stats = cache.get(cle)
+    if stats is None:
+        stats = calculer_stats_tickets(tickets)
+        cache.set(cle, stats, DUREE_CACHE_STATS)
+    return stats
+
+
+def invalider_stats_tickets(ticket, ancien_technicien_id=None) -> None:
+    """Invalider les périmètres contenant le ticket (créateur, technicien actuel et précédent, admins)"""
+    cles = [cle_stats('admin'), cle_stats('employe', ticket.utilisateur_createur_id)]
+    for technicien_id in {ticket.technicien_assigne_id, ancien_technicien_id}:
+        if technicien_id is not None:
+            cles.append(cle_stats('technicien', technicien_id))
+    cache.delete_many(cles)
+
+
+def contribution_ticket(ticket, precedente: bool = False) -> Optional[Tuple[Dict, float]]:
+    """
+    (clé de la ligne d'agrégat, durée de résolution en secondes) pour un ticket
+    `precedente` : état avant la sauvegarde en cours (valeurs précédentes du FieldTracker ;
+    date_resolution n'est modifiée qu'en entrant dans le statut résolu, elle reste donc valable)
+    """
+    if ticket.date_creation is None:
+        return None
+
+    if precedente:
+        valeur = ticket.tracker.previous
+    else:
+        def valeur(nom):
+            return getattr(ticket, ticket._meta.get_field(nom).attname)
+
+    statut = valeur('statut_ticket')
+    resolu = statut == 'resolu' and ticket.date_resolution is not None
+    cle = {
+        'jour': timezone.localtime(ticket.date_creation).date(),
+        'statut_ticket': statut,
+        'priorite': valeur('priorite'),
+        'categorie_id': valeur('categorie'),
+        'departement_id': ticket.departement_id,
+        'technicien_id': valeur('technicien_assigne'),
+        'mois_resolution': timezone.localtime(ticket.date_resolution).date().replace(day=1) if resolu else None,
+    }
+    duree = (ticket.date_resolution - ticket.date_creation).total_seconds() if resolu else 0.0
+    return cle, duree
+
+
+def _ajouter_a_la_ligne(cle: Dict, nombre: int, duree: float) -> None:
+    from ..models import StatistiqueTicketJour
+
+    increments = {
+        'nombre': F('nombre') + nombre,
+        'duree_resolution_totale': F('duree_resolution_totale') + duree,
+    }
+    if StatistiqueTicketJour.objects.filter(**cle).update(**increments):
+        return
+    try:
+        # Point de sauvegarde : si la ligne vient d'être créée par une autre transaction, la
+        # contrainte unique refuse le doublon et la mise à jour est rejouée
+        with transaction.atomic():
+            StatistiqueTicketJour.objects.create(**cle, nombre=nombre, duree_resolution_totale=duree)
+    except IntegrityError:
+        StatistiqueTicketJour.objects.filter(**cle).update(**increments)
+
+
+def _appliquer_contribution(contribution: Tuple[Dict, float], signe: int) -> None:
+    cle, duree = contribution
+    _ajouter_a_la_ligne(cle, signe, signe * duree)
+
+
+def deplacer_contribution(ancienne: Optional[Tuple[Dict, float]], nouvelle: Optional[Tuple[Dict, float]]) -> None:
+    """Retirer l'ancienne contribution du ticket et ajouter la nouvelle (si elles diffèrent)"""
+    if ancienne == nouvelle:
+        return
+    with transaction.atomic():
+        if ancienne is not None:
+            _appliquer_contribution(ancienne, -1)
+        if nouvelle is not None:
+            _appliquer_contribution(nouvelle, 1)
+
+
+def detacher_statistiques(champ: str, identifiant) -> None:
+    """
+    Avant la suppression d'un technicien ou d'un département (`champ` : 'technicien_id' ou
+    'departement_id') : ses lignes d'agrégats sont fusionnées dans les lignes sans technicien ou
+    sans département, comme ses tickets (SET_NULL par une mise à jour groupée, sans signal)
+    """
+    from ..models import StatistiqueTicketJour
+
+    with transaction.atomic():
+        lignes = list(
+            StatistiqueTicketJour.objects.select_for_update().filter(**{champ: identifiant}).values(
+                'id', 'jour', 'statut_ticket', 'priorite', 'categorie_id', 'departement_id', 'technicien_id',
+                'mois_resolution', 'nombre', 'duree_resolution_totale'
+            )
+        )
+        StatistiqueTicketJour.objects.filter(id__in=[ligne['id'] for ligne in lignes]).delete()
+        for ligne in lignes:
+            nombre, duree = ligne.pop('nombre'), ligne.pop('duree_resolution_totale')
+            del ligne['id']
+            ligne[champ] = None
+            if nombre or duree:
+                _ajouter_a_la_ligne(ligne, nombre, duree)
+
+
+def duree_resolution():
+    """Durée de résolution d'un ticket résolu, calculée par la base"""
+    return ExpressionWrapper(F('date_resolution') - F('date_creation'), output_field=DurationField())
+
+
+def statistiques_resolution(tickets, percentiles=(50, 90)) -> Dict[str, float]:
+    """
+    Temps de résolution (heures) des tickets résolus de `tickets` : moyenne et percentiles par
+    rang, lus sur une seule liste de durées calculées et triées par la base
+    """
+    durees = list(
+        tickets.filter(statut_ticket='resolu', date_resolution__isnull=False)
+        .annotate(duree=duree_resolution())
+        .order_by('duree')
+        .values_list('duree', flat=True)
+    )
+    nombre = len(durees)
+
+    resultats = {'moyenne': sum(d.total_seconds() for d in durees) / nombre / 3600 if nombre else 0}
+    for percentile in percentiles:
+        valeur = None
+        if nombre:
+            rang = max(math.ceil(percentile / 100 * nombre) - 1, 0)
+            valeur = durees[rang]
+        resultats[f"p{percentile}"] = valeur.total_seconds() / 3600 if valeur else 0
+    return resultats
+
+
+def reconstruire_statistiques(modele_ticket=None, modele_statistique=None) -> int:
+    """
+    Recalculer toute la table d'agrégats depuis les tickets (commande nocturne, migration)
+    Retourne le nombre de lignes créées
+    """
+    if modele_ticket is None:
+        from ..models import StatistiqueTicketJour, Ticket
+        modele_ticket, modele_statistique = Ticket, StatistiqueTicketJour
+
+    est_resolu = Q(statut_ticket='resolu', date_resolution__isnull=False)
+    duree = duree_resolution()
+    lignes = (
+        modele_ticket.objects
+        .annotate(
+            jour=TruncDate('date_creation'),
+            mois_resolution=Case(When(est_resolu, then=TruncMonth('date_resolution', output_field=DateField()))),
+        )
+        .values('jour', 'statut_ticket', 'priorite', 'categorie_id', 'departement_id',
+                'technicien_assigne_id', 'mois_resolution')
+        .annotate(nombre=Count('id'), duree=Sum(Case(When(est_resolu, then=duree))))
+        .order_by()
+    )
+
+    statistiques = [
+        modele_statistique(
+            jour=ligne['jour'],
+            statut_ticket=ligne['statut_ticket'],
+            priorite=ligne['priorite'],
+            categorie_id=ligne['categorie_id'],
+            departement_id=ligne['departement_id'],
+            technicien_id=ligne['technicien_assigne_id'],
+            mois_resolution=ligne['mois_resolution'],
+            nombre=ligne['nombre'],
+            duree_resolution_totale=ligne['duree'].total_seconds() if ligne['duree'] else 0.0,
+        )
+        for ligne in lignes
+    ]
+
+    with transaction.atomic():
+        modele_statistique.objects.all().delete()
+        modele_statistique.objects.bulk_create(statistiques, batch_size=1000)
+    return len(statistiques)
+
+
+def agreger_statistiques(statistiques, aujourd_hui: date, perimetre: Q = Q()) -> Dict[str, float]:
+    """
+    Compteurs d'un tableau de bord en une requête sur les agrégats
+    `perimetre` restreint les lignes comptées (ex. Q(technicien=user)) ; `non_assignes` porte sur toutes les lignes
+    """
+    debut_mois = aujourd_hui.replace(day=1)
+    debut_annee = aujourd_hui.replace(month=1, day=1)
+    resolu = perimetre & Q(statut_ticket='resolu')
+
+    def somme(champ, condition, output_field=IntegerField()):
+        return Coalesce(Sum(champ, filter=condition), Value(0), output_field=output_field)
+
+    return statistiques.aggregate(
+        total=somme('nombre', perimetre),
+        aujourd_hui=somme('nombre', perimetre & Q(jour=aujourd_hui)),
+        ce_mois=somme('nombre', perimetre & Q(jour__gte=debut_mois)),
+        cette_annee=somme('nombre', perimetre & Q(jour__gte=debut_annee)),
+        resolus=somme('nombre', resolu),
+        resolus_ce_mois=somme('nombre', resolu & Q(mois_resolution=debut_mois)),
+        en_attente=somme('nombre', perimetre & Q(statut_ticket__in=['ouvert', 'en_cours'])),
+        urgents=somme('nombre', perimetre & Q(priorite__in=['urgent', 'critique'])),
+        non_assignes=somme('nombre', Q(technicien__isnull=True)),
+        duree_resolution=somme('duree_resolution_totale', resolu, FloatField()),
+    )
+
+
+def duree_moyenne_heures(totaux: Dict[str, float]) -> float:
+    """Temps moyen de résolution (heures) à partir des sommes d'agrégats"""
+    if not totaux['resolus']:
+        return 0
+    return totaux['duree_resolution'] / totaux['resolus'] / 3600
+
+
+# Commentaires automatiques de changement de statut : "Statut changé de 'Ouvert' vers 'Résolu'"
+MOTIF_CHANGEMENT_STATUT = re.compile(r"vers '(?P<statut>[^']+)'")
+STATUTS_PAR_LIBELLE = {'Résolu': 'resolu', 'Fermé': 'ferme'}
+
+
+def remplir_dates_tickets(modele_ticket=None, modele_commentaire=None, ecraser: bool = False) -> Dict[str, int]:
+    """
+    Reconstituer date_assignation, date_resolution et date_fermeture depuis l'historique des
+    commentaires (assignation, changement_statut, resolution, fermeture) : la dernière transition
+    connue est retenue. Un ticket résolu ou fermé sans trace dans l'historique reçoit sa
+    date_modification (approximation). Retourne le nombre de dates renseignées par champ
+    """
+    if modele_ticket is None:
+        from ..models import Commentaire, Ticket
+        modele_ticket, modele_commentaire = Ticket, Commentaire
+
+    dates = {}
+    historique = modele_commentaire.objects.filter(
+        type_action__in=['assignation', 'changement_statut', 'resolution', 'fermeture']
+    ).order_by('date_commentaire').values_list('ticket_id', 'type_action', 'contenu', 'date_commentaire')
+
+    for ticket_id, type_action, contenu, date_commentaire in historique.iterator():
+        if type_action == 'assignation':
+            champ = 'date_assignation'
+        elif type_action == 'resolution':
+            champ = 'date_resolution'
+        elif type_action == 'fermeture':
+            champ = 'date_fermeture'
+        else:
+            correspondance = MOTIF_CHANGEMENT_STATUT.search(contenu)
+            statut = STATUTS_PAR_LIBELLE.get(correspondance.group('statut')) if correspondance else None
+            if statut is None:
+                continue
+            champ = 'date_resolution' if statut == 'resolu' else 'date_fermeture'
+        dates.setdefault(ticket_id, {})[champ] = date_commentaire
+
+    compteurs = {'date_assignation': 0, 'date_resolution': 0, 'date_fermeture': 0}
+    a_mettre_a_jour = []
+    tickets = modele_ticket.objects.values(
+        'id', 'statut_ticket', 'technicien_assigne_id', 'date_modification', *compteurs
+    )
+    for ticket in tickets.iterator():
+        connues = dates.get(ticket['id'], {})
+        approximations = {
+            'date_assignation': ticket['technicien_assigne_id'] is not None,
+            'date_resolution': ticket['statut_ticket'] == 'resolu',
+            'date_fermeture': ticket['statut_ticket'] == 'ferme',
+        }
+        nouvelles = {}
+        for champ in compteurs:
+            if ticket[champ] is not None and not ecraser:
+                continue
+            valeur = connues.get(champ) or (ticket['date_modification'] if approximations[champ] else None)
+            if valeur is not None and valeur != ticket[champ]:
+                nouvelles[champ] = valeur
+                compteurs[champ] += 1
+        if nouvelles:
+            a_mettre_a_jour.append(modele_ticket(
+                id=ticket['id'], **{champ: nouvelles.get(champ, ticket[champ]) for champ in compteurs}
+            ))
+
+    modele_ticket.objects.bulk_update(a_mettre_a_jour, list(compteurs), batch_size=500)
+    return compteurs
@@ -0,0 +1,35 @@
+"""
+Visibilité des tickets selon le rôle de l'utilisateur
+Règle unique pour l'API REST (détail, commentaires, ETag) et les WebSockets (accès au ticket,
+instantanés) : un ticket renvoyé par l'un est accessible par l'autre
+"""
+
+from django.db.models import Q
+
+from ..models import Ticket
+
+
+def tickets_visibles(user):
+    """
+    Tickets que l'utilisateur peut consulter :
+    - employé : ses propres tickets
+    - technicien : les tickets qui lui sont assignés, ceux qu'il a créés et les tickets non
+      assignés (qu'il peut prendre en charge, déjà listés par TechnicianTicketsView)
+    - admin : tous les tickets
+    """
+    queryset = Ticket.objects.all()
+
+    if user.role == 'employe':
+        return queryset.filter(utilisateur_createur=user)
+    elif user.role == 'technicien':
+        return queryset.filter(
+            Q(technicien_assigne=user) | Q(utilisateur_createur=user) | Q(technicien_assigne=None)
+        )
+    elif user.role == 'admin':
+        return queryset
+
+    return queryset.none()
+
+
+def peut_voir_ticket(user, ticket_id) -> bool:
+    return tickets_visibles(user).filter(id=ticket_id).exists()
@@ -1,3 +1,999 @@
-from django.test import TestCase
+import base64
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import psutil
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import diagnostic_engine, email_utils, middleware
+from .consumers import TicketConsumer
+from .management.commands.verifier_plans_requetes import parcours_complets, plan_sql
+from .models import Categorie, Commentaire, CustomUser, Departement, EmailSortant, Equipement, EtatGuidage, \
+    Notification, SessionDiagnostic, StatistiqueTicketJour, Ticket
+from .serializers import CommentaireSerializer, TicketListSerializer
+from .services.commentaires_service import charger_fil_commentaires
+from .services.guidage_service import demarrer_guidage, obtenir_etat_guidage
+from .services import diagnostic_execution_service, email_outbox_service, recherche_service, smtp_service, \
+    statistiques_service
+from .services.banc_disque_service import mesurer_disque
+from .services.echantillonnage_service import ATTRIBUTS_PROCESSUS, EchantillonneurSysteme
+from .services.notification_service import groupe_role, groupe_utilisateur, groupes_destinataires, \
+    serialiser_ticket_pour_utilisateur
+from .services.smtp_service import construire_message
+
+
+# Pas de serveur Redis pendant les tests
+CHANNEL_LAYERS_TEST = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+class DonneesTestMixin:
+    """Utilisateurs, catégorie et ticket communs aux tests"""
+
+    def setUp(self):
+        cache.clear()
+        self.categorie = Categorie.objects.create(nom_categorie='Réseau')
+        self.employe = CustomUser.objects.create_user(email='employe@test.com', password='p', role='employe')
+        self.technicien = CustomUser.objects.create_user(email='tech@test.com', password='p', role='technicien')
+        self.ticket = self.creer_ticket()
+
+    def creer_ticket(self, **champs):
+        valeurs = {
+            'titre': 'Ticket',
+            'description': 'Description',
+            'categorie': self.categorie,
+            'utilisateur_createur': self.employe,
+            'technicien_assigne': self.technicien,
+        }
+        valeurs.update(champs)
+        return Ticket.objects.create(**valeurs)
+
+    @staticmethod
+    def client_pour(user):
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        return client
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS_TEST)
+class GuidageTests(DonneesTestMixin, TestCase):
+    """Compteur des confirmations en attente maintenu par le service de guidage"""
+
+    def envoyer_instruction(self, **donnees):
+        return self.client_pour(self.technicien).post(
+            f'/api/tickets/{self.ticket.id}/guidance/instruction',
+            {'instruction': 'Redémarrer', **donnees}, format='json'
+        )
+
+    def en_attente(self):
+        return obtenir_etat_guidage(self.ticket.id)['confirmations_en_attente']
+
+    def test_confirmation_sans_attente_ne_decremente_pas(self):
+        self.envoyer_instruction()
+        sans_attente = self.envoyer_instruction(attendre_confirmation=False).data
+        self.assertEqual(self.en_attente(), 1)
+
+        reponse = self.client_pour(self.employe).post(f"/api/comments/{sans_attente['id']}/confirm")
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(self.en_attente(), 1)
+
+    def test_instruction_non_creee_ne_modifie_pas_l_etat(self):
+        self.envoyer_instruction()
+        with mock.patch.object(Commentaire.objects, 'create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.envoyer_instruction()
+
+        cache.clear()
+        etat = obtenir_etat_guidage(self.ticket.id)
+        self.assertEqual((etat['derniere_etape'], etat['confirmations_en_attente']), (1, 1))
+
+    def test_fin_du_guidage_vue_par_tous_les_workers(self):
+        demarrer_guidage(self.ticket.id)
+        self.assertTrue(obtenir_etat_guidage(self.ticket.id)['est_actif'])
+
+        # Fin enregistrée par un autre processus : aucun cache local à invalider
+        EtatGuidage.objects.filter(ticket_id=self.ticket.id).update(est_actif=False)
+        with self.assertNumQueries(1):
+            self.assertFalse(obtenir_etat_guidage(self.ticket.id)['est_actif'])
+
+    def test_confirmation_websocket_refuse_un_commentaire(self):
+        self.envoyer_instruction()
+        commentaire = Commentaire.objects.create(
+            ticket=self.ticket, utilisateur_auteur=self.technicien, contenu='Simple commentaire'
+        )
+        consumer = TicketConsumer()
+        consumer.ticket_id = self.ticket.id
+        consumer.user = self.employe
+
+        resultat = TicketConsumer.__dict__['traiter_message'].func(
+            consumer, {'type': 'confirmation', 'commentaire_parent_id': commentaire.id}
+        )
+
+        self.assertIsNone(resultat)
+        commentaire.refresh_from_db()
+        self.assertFalse(commentaire.est_confirme)
+        self.assertEqual(self.en_attente(), 1)
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS_TEST)
+class MessagesWebSocketTicketTests(DonneesTestMixin, TestCase):
+    """Messages du WebSocket d'un ticket : enregistrés puis diffusés une seule fois au groupe"""
+
+    def connecter(self, user):
+        communicator = WebsocketCommunicator(TicketConsumer.as_asgi(), f'/ws/ticket/{self.ticket.id}/')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'ticket_id': str(self.ticket.id)}}
+        return communicator
+
+    def echanger(self, scenario):
+        async def executer():
+            employe, technicien = self.connecter(self.employe), self.connecter(self.technicien)
+            self.assertTrue((await employe.connect())[0])
+            self.assertTrue((await technicien.connect())[0])
+            try:
+                await scenario(employe, technicien)
+                # Aucune diffusion en double (signal post_save du commentaire)
+                self.assertTrue(await employe.receive_nothing(0.1))
+                self.assertTrue(await technicien.receive_nothing(0.1))
+            finally:
+                await employe.disconnect()
+                await technicien.disconnect()
+        async_to_sync(executer)()
+
+    def test_commentaire_diffuse_une_fois(self):
+        async def scenario(employe, technicien):
+            await employe.send_json_to({'type': 'comment', 'message': 'Bonjour'})
+            for communicator in (employe, technicien):
+                reponse = await communicator.receive_json_from()
+                self.assertEqual((reponse['type'], reponse['comment']['contenu']), ('comment', 'Bonjour'))
+
+        self.echanger(scenario)
+        self.assertTrue(Commentaire.objects.filter(ticket=self.ticket, contenu='Bonjour').exists())
+
+    def test_confirmation_diffusee_avec_l_instruction(self):
+        demarrer_guidage(self.ticket.id)
+        instruction = self.client_pour(self.technicien).post(
+            f'/api/tickets/{self.ticket.id}/guidance/instruction', {'instruction': 'Redémarrer'}, format='json'
+        ).data
+
+        async def scenario(employe, technicien):
+            await employe.send_json_to({'type': 'confirmation', 'message': 'Fait',
+                                        'commentaire_parent_id': instruction['id']})
+            for communicator in (employe, technicien):
+                commentaire = await communicator.receive_json_from()
+                mise_a_jour = await communicator.receive_json_from()
+                self.assertEqual(commentaire['type'], 'comment')
+                self.assertEqual(mise_a_jour['type'], 'instruction_updated')
+                self.assertTrue(mise_a_jour['instruction']['est_confirme'])
+
+        self.echanger(scenario)
+        self.assertEqual(obtenir_etat_guidage(self.ticket.id)['confirmations_en_attente'], 0)
+
+    def test_commentaire_hors_websocket_diffuse_par_le_signal(self):
+        async def scenario(employe, technicien):
+            await database_sync_to_async(Commentaire.objects.create)(
+                ticket=self.ticket, utilisateur_auteur=self.technicien, contenu='Depuis l\'API'
+            )
+            for communicator in (employe, technicien):
+                self.assertEqual((await communicator.receive_json_from())['type'], 'comment')
+
+        self.echanger(scenario)
+
+    def test_ticket_supprime(self):
+        async def scenario(employe, technicien):
+            await database_sync_to_async(Ticket.objects.filter(id=self.ticket.id).delete)()
+            await employe.send_json_to({'type': 'comment', 'message': 'Encore là ?'})
+            self.assertEqual((await employe.receive_json_from())['type'], 'error')
+
+        self.echanger(scenario)
+        self.assertFalse(Commentaire.objects.exists())
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS_TEST)
+class VisibiliteTicketsTests(DonneesTestMixin, TestCase):
+    """Le détail REST, la recherche et l'instantané WebSocket appliquent la même règle de visibilité"""
+
+    def setUp(self):
+        super().setUp()
+        self.autre_technicien = CustomUser.objects.create_user(email='tech2@test.com', password='p', role='technicien')
+        self.non_assigne = self.creer_ticket(technicien_assigne=None)
+        self.cree_par_technicien = self.creer_ticket(utilisateur_createur=self.autre_technicien)
+
+    def verifier_visibilite(self, user, ticket, visible):
+        reponse = self.client_pour(user).get(f'/api/tickets/{ticket.id}')
+        self.assertEqual(reponse.status_code, 200 if visible else 404)
+        self.assertEqual(serialiser_ticket_pour_utilisateur(ticket.id, user) is not None, visible)
+        reponse = self.client_pour(user).get(f'/api/tickets/{ticket.id}/comments')
+        self.assertEqual(reponse.status_code, 200 if visible else 403)
+        reponse = self.client_pour(user).get('/api/tickets/search', {'q': ticket.titre, 'limit': 100})
+        self.assertEqual(ticket.id in [t['id'] for t in reponse.data['resultats']], visible)
+
+    def test_technicien(self):
+        self.verifier_visibilite(self.autre_technicien, self.non_assigne, True)
+        self.verifier_visibilite(self.autre_technicien, self.cree_par_technicien, True)
+        self.verifier_visibilite(self.autre_technicien, self.ticket, False)
+
+    def test_employe(self):
+        self.verifier_visibilite(self.employe, self.ticket, True)
+        self.verifier_visibilite(self.employe, self.cree_par_technicien, False)
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS_TEST, SENDGRID_API_KEY='test')
+class EmailSendGridTests(DonneesTestMixin, TestCase):
+    """Repli SMTP limité aux destinataires des lots SendGrid non acceptés"""
+
+    def test_echec_d_un_lot_ne_renvoie_que_les_destinataires_restants(self):
+        destinataires = [f'tech{numero}@test.com' for numero in range(5)]
+        client = mock.Mock()
+        client.send.side_effect = [mock.Mock(status_code=202), RuntimeError('HTTP 500')]
+
+        with mock.patch.object(email_utils, 'SENDGRID_MAX_PERSONNALISATIONS', 2), \
+                mock.patch.object(email_utils, 'get_sendgrid_client', return_value=client), \
+                mock.patch.object(email_utils, 'get_notification_recipients', return_value=destinataires), \
+                mock.patch.object(email_utils, 'envoyer_emails_en_masse') as envoi_smtp:
+            self.assertTrue(email_utils.envoyer_email_nouveau_ticket_sendgrid(self.ticket))
+
+        messages = list(envoi_smtp.call_args.args[0])
+        self.assertEqual([message[3][0] for message in messages], destinataires[2:])
+
+    def test_repli_smtp_reutilise_le_rendu(self):
+        client = mock.Mock()
+        client.send.side_effect = RuntimeError('HTTP 500')
+
+        with mock.patch.object(email_utils, 'get_sendgrid_client', return_value=client), \
+                mock.patch.object(email_utils, 'rendre_email', wraps=email_utils.rendre_email) as rendu, \
+                mock.patch.object(email_utils, 'envoyer_emails_en_masse'):
+            email_utils.envoyer_email_confirmation_employe_sendgrid(self.ticket)
+
+        self.assertEqual(rendu.call_count, 1)
+
+
+class AnnuaireDestinatairesTests(DonneesTestMixin, TestCase):
+    """Annuaire en cache à durée bornée : les changements faits par un autre processus sont vus"""
+
+    def test_technicien_desactive_ailleurs_retire_a_l_expiration(self):
+        self.assertIn(self.technicien.email, email_utils.get_notification_recipients())
+
+        # Mise à jour sans signal dans ce processus, comme depuis un autre worker
+        CustomUser.objects.filter(id=self.technicien.id).update(statut='inactif')
+        self.assertIn(self.technicien.email, email_utils.get_notification_recipients())
+
+        expiration = time.time() + email_utils.DUREE_CACHE_ANNUAIRE + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=expiration):
+            self.assertNotIn(self.technicien.email, email_utils.get_notification_recipients())
+
+
+class GroupesDestinatairesTests(TestCase):
+    """Groupes WebSocket notifiés pour un événement de ticket"""
+
+    def test_groupes_selon_l_assignation(self):
+        admin, techniciens = groupe_role('admin'), groupe_role('technicien')
+        cas = [
+            # (technicien assigné, était non assigné, ancien technicien) -> groupes
+            ((None, False, None), {admin, techniciens}),
+            ((None, False, 3), {admin, techniciens}),
+            ((5, True, None), {admin, techniciens}),
+            ((5, False, None), {admin, groupe_utilisateur(5)}),
+            ((5, False, 5), {admin, groupe_utilisateur(5)}),
+            ((5, False, 3), {admin, groupe_utilisateur(5), groupe_utilisateur(3)}),
+        ]
+        for (technicien_id, etait_non_assigne, ancien_id), attendus in cas:
+            with self.subTest(technicien=technicien_id, etait_non_assigne=etait_non_assigne, ancien=ancien_id):
+                ticket = mock.Mock(technicien_assigne_id=technicien_id)
+                self.assertEqual(groupes_destinataires(ticket, etait_non_assigne, ancien_id), attendus)
+
+
+class PoolSMTPTests(TestCase):
+    """Reprise après coupure et refus définitifs du pool SMTP"""
+
+    def envoyer(self, effets):
+        backend = mock.Mock(connection=None)
+        backend.send_messages.side_effect = effets
+        messages = [construire_message('Sujet', 'Corps', [f'u{numero}@test.com']) for numero in range(3)]
+        with mock.patch.object(smtp_service, 'get_connection', return_value=backend):
+            pool = smtp_service.PoolSMTP()
+            try:
+                return pool.envoyer(messages), backend
+            finally:
+                pool.fermer()
+
+    def test_coupure_reprend_au_message_suivant(self):
+        envoyes, backend = self.envoyer([1, smtplib.SMTPServerDisconnected(), 1, 1])
+
+        self.assertEqual(envoyes, 3)
+        destinataires = [appel.args[0][0].to[0] for appel in backend.send_messages.call_args_list]
+        self.assertEqual(destinataires, ['u0@test.com', 'u1@test.com', 'u1@test.com', 'u2@test.com'])
+
+    def test_refus_expediteur_n_est_pas_retente(self):
+        refus = smtplib.SMTPSenderRefused(550, b'Refus', 'support@test.com')
+        with self.assertRaises(smtp_service.EnvoiSMTPIncomplet) as contexte:
+            self.envoyer([refus, 1, 1])
+
+        self.assertIs(contexte.exception.cause, refus)
+        self.assertEqual(len(contexte.exception.non_envoyes), 3)
+
+    def test_repli_smtp_interrompu_signale_les_destinataires_restants(self):
+        backend = mock.Mock(connection=None)
+        backend.send_messages.side_effect = [1, smtplib.SMTPDataError(554, b'Refus')]
+        ticket = mock.Mock(id=1, titre='Ticket')
+        destinataires = ['a@test.com', 'b@test.com', 'c@test.com']
+
+        with mock.patch.object(smtp_service, 'get_connection', return_value=backend), \
+                mock.patch.object(smtp_service, 'pool_smtp', smtp_service.PoolSMTP()):
+            with self.assertRaises(email_utils.EnvoiIncomplet) as contexte:
+                email_utils.envoyer_email_nouveau_ticket_smtp(ticket, destinataires, ('<p>html</p>', 'texte'))
+
+        self.assertEqual(contexte.exception.non_envoyes, destinataires[1:])
+
+
+class MoteurRechercheTests(TestCase):
+    """Le moteur de recherche est déterminé une seule fois, même quand FTS5 est absent"""
+
+    def setUp(self):
+        recherche_service.reinitialiser_moteur()
+        self.addCleanup(recherche_service.reinitialiser_moteur)
+
+    def test_absence_de_table_memorisee(self):
+        with mock.patch.object(recherche_service, 'TABLE_FTS', 'table_absente'), \
+                CaptureQueriesContext(connection) as requetes:
+            moteurs = {recherche_service.moteur_recherche() for _ in range(3)}
+
+        self.assertEqual(moteurs, {'icontains'})
+        self.assertEqual(len(requetes), 1)
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS_TEST)
+class PaginationTicketsTests(DonneesTestMixin, TestCase):
+    """Pagination par curseur et champs à la demande des listes de tickets"""
+
+    def setUp(self):
+        super().setUp()
+        for _ in range(4):
+            self.creer_ticket()
+        # Même date de création pour tous : l'id départage les positions
+        Ticket.objects.update(date_creation=timezone.now())
+        self.client_employe = self.client_pour(self.employe)
+
+    def test_parcours_avec_dates_egales(self):
+        ids, curseur = [], None
+        for _ in range(5):
+            params = {'page_size': 2}
+            if curseur:
+                params['cursor'] = curseur
+            reponse = self.client_employe.get('/api/tickets/my', params)
+            self.assertEqual(reponse.status_code, 200)
+            ids += [ticket['id'] for ticket in reponse.data['results']]
+            curseur = reponse.data['next_cursor']
+            if curseur is None:
+                break
+
+        attendus = list(Ticket.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual(ids, attendus)
+        self.assertEqual(len(attendus), 5)
+
+    def test_curseur_altere(self):
+        for curseur in ('pas-du-base64!', base64.urlsafe_b64encode(b'hier|1').decode(),
+                        base64.urlsafe_b64encode(b'2024-01-01T00:00:00|x').decode()):
+            reponse = self.client_employe.get('/api/tickets/my', {'cursor': curseur})
+            self.assertEqual(reponse.status_code, 404)
+
+    def test_liste_complete_sans_pagination(self):
+        reponse = self.client_employe.get('/api/tickets/my')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIsInstance(reponse.data, list)
+        self.assertEqual(len(reponse.data), 5)
+
+    def test_champs_demandes(self):
+        reponse = self.client_employe.get('/api/tickets/my', {'fields': 'id, titre,inconnu'})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(all(set(ticket) == {'id', 'titre'} for ticket in reponse.data))
+
+        reponse = self.client_employe.get('/api/tickets/my', {'fields': 'id', 'page_size': 2})
+        self.assertEqual([set(ticket) for ticket in reponse.data['results']], [{'id'}, {'id'}])
+        self.assertIsNotNone(reponse.data['next_cursor'])
+
+        reponse = self.client_employe.get('/api/tickets/my')
+        self.assertIn('statut_ticket', reponse.data[0])
+        self.assertIn('categorie', reponse.data[0])
+
+
+class StatistiquesTicketJourTests(DonneesTestMixin, TestCase):
+    """Agrégats des tableaux de bord tenus à jour par les signaux de Ticket"""
+
+    @staticmethod
+    def lignes():
+        return list(
+            StatistiqueTicketJour.objects.exclude(nombre=0)
+            .order_by('statut_ticket', 'departement_id', 'technicien_id')
+            .values_list('statut_ticket', 'departement_id', 'technicien_id', 'nombre')
+        )
+
+    def test_changement_de_departement_du_createur(self):
+        departement_initial = self.employe.departement_id
+        self.employe.departement = Departement.objects.create(nom_departement='Comptabilité')
+        self.employe.save()
+
+        ticket = Ticket.objects.get(id=self.ticket.id)
+        with self.assertNumQueries(0):  # Le créateur n'est pas chargé pour calculer la contribution
+            statistiques_service.contribution_ticket(ticket)
+        ticket.statut_ticket = 'en cours'
+        ticket.save()
+
+        self.assertEqual(ticket.departement_id, departement_initial)
+        lignes = self.lignes()
+        self.assertEqual(lignes, [('en cours', departement_initial, self.technicien.id, 1)])
+        statistiques_service.reconstruire_statistiques()
+        self.assertEqual(self.lignes(), lignes)
+
+    def test_creation_concurrente_d_une_ligne(self):
+        contribution = statistiques_service.contribution_ticket(self.ticket)
+        mise_a_jour = QuerySet.update
+        appels = []
+
+        def update_manque(queryset, **valeurs):
+            # La ligne existe déjà mais la première mise à jour ne l'a pas vue (création concurrente)
+            appels.append(valeurs)
+            return 0 if len(appels) == 1 else mise_a_jour(queryset, **valeurs)
+
+        with mock.patch.object(QuerySet, 'update', update_manque):
+            statistiques_service.deplacer_contribution(None, contribution)
+
+        self.assertEqual(len(appels), 2)
+        self.assertEqual(self.lignes(), [('ouvert', self.employe.departement_id, self.technicien.id, 2)])
+
+    def test_suppression_d_un_technicien(self):
+        technicien = CustomUser.objects.create_user(email='tech2@test.com', password='p', role='technicien')
+        self.creer_ticket(technicien_assigne=technicien)
+        self.creer_ticket(technicien_assigne=None)
+        departement = self.employe.departement_id
+
+        technicien.delete()
+
+        # Ses tickets passent sans technicien, ses agrégats aussi (fusionnés avec la ligne existante)
+        lignes = self.lignes()
+        self.assertEqual(lignes, [('ouvert', departement, None, 2), ('ouvert', departement, self.technicien.id, 1)])
+        statistiques_service.reconstruire_statistiques()
+        self.assertEqual(self.lignes(), lignes)
+
+    def test_compteurs_en_une_requete(self):
+        critique = self.creer_ticket(statut_ticket='en cours')
+        urgent = self.creer_ticket(statut_ticket='resolu')
+        self.creer_ticket(statut_ticket='resolu', technicien_assigne=None)
+        # Sans passer par save() : un ticket urgent créé est assigné automatiquement
+        Ticket.objects.filter(id=critique.id).update(priorite='critique')
+        Ticket.objects.filter(id=urgent.id).update(priorite='urgent')
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            stats = statistiques_service.obtenir_stats_tickets(self.employe)
+        self.assertEqual(stats, {
+            'total': 4, 'ouvert': 1, 'en_cours': 1, 'resolu': 2, 'ferme': 0,
+            'priorite_critique': 1, 'priorite_urgent': 1,
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(statistiques_service.obtenir_stats_tickets(self.employe), stats)
+        self.assertEqual(statistiques_service.obtenir_stats_tickets(self.technicien)['total'], 3)
+
+    def test_compteurs_invalides_a_la_modification(self):
+        admin = CustomUser.objects.create_user(email='admin@test.com', password='p', role='admin')
+        autre_technicien = CustomUser.objects.create_user(email='tech2@test.com', password='p', role='technicien')
+        utilisateurs = (self.employe, self.technicien, admin, autre_technicien)
+        for user in utilisateurs:
+            statistiques_service.obtenir_stats_tickets(user)
+
+        self.ticket.statut_ticket = 'en cours'
+        self.ticket.save()
+        for user in (self.employe, self.technicien, admin):
+            with self.subTest(role=user.role):
+                stats = statistiques_service.obtenir_stats_tickets(user)
+                self.assertEqual((stats['ouvert'], stats['en_cours']), (0, 1))
+
+        # Réassignation : les périmètres de l'ancien et du nouveau technicien sont invalidés
+        self.ticket.technicien_assigne = autre_technicien
+        self.ticket.save()
+        self.assertEqual(statistiques_service.obtenir_stats_tickets(self.technicien)['total'], 0)
+        self.assertEqual(statistiques_service.obtenir_stats_tickets(autre_technicien)['en_cours'], 1)
+
+    def test_percentiles_de_resolution(self):
+        creation = timezone.now() - timedelta(days=1)
+        for heures in (7, 2, 10, 1, 5, 9, 3, 8, 4, 6):
+            ticket = self.creer_ticket()
+            Ticket.objects.filter(id=ticket.id).update(
+                statut_ticket='resolu', date_creation=creation, date_resolution=creation + timedelta(hours=heures)
+            )
+
+        with self.assertNumQueries(1):
+            resolution = statistiques_service.statistiques_resolution(Ticket.objects.all())
+
+        self.assertEqual(resolution, {'moyenne': 5.5, 'p50': 5, 'p90': 9})
+        self.assertEqual(statistiques_service.statistiques_resolution(Ticket.objects.none()),
+                         {'moyenne': 0, 'p50': 0, 'p90': 0})
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS_TEST)
+class PlansRequetesTests(DonneesTestMixin, TestCase):
+    """
+    Les lectures réellement exécutées par les vues et les services d'un employé ou d'un technicien
+    ne parcourent jamais entièrement les tickets ou les commentaires (EXPLAIN QUERY PLAN)
+    """
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN est propre à SQLite')
+        self.creer_ticket()
+        Commentaire.objects.create(ticket=self.ticket, utilisateur_auteur=self.technicien, contenu='Commentaire')
+
+    def verifier_plans(self, executer):
+        cache.clear()
+        with CaptureQueriesContext(connection) as requetes:
+            executer()
+
+        lectures = [capturee['sql'] for capturee in requetes.captured_queries if capturee['sql'].startswith('SELECT')]
+        self.assertTrue(lectures)
+        for sql in lectures:
+            with self.subTest(sql=sql):
+                self.assertEqual(parcours_complets(plan_sql(sql)), [])
+
+    def verifier_vues(self, user, urls):
+        client = self.client_pour(user)
+        for url in urls:
+            with self.subTest(role=user.role, url=url):
+                self.verifier_plans(lambda: self.assertEqual(client.get(url).status_code, 200))
+
+    def test_vues_employe(self):
+        page = self.client_pour(self.employe).get('/api/tickets/my?page_size=1').data
+        self.assertIsNotNone(page['next'])
+
+        self.verifier_vues(self.employe, [
+            '/api/tickets/my', page['next'], f'/api/tickets/{self.ticket.id}',
+            f'/api/tickets/{self.ticket.id}/comments', '/api/tickets/stats',
+        ])
+
+    def test_vues_technicien(self):
+        page = self.client_pour(self.technicien).get('/api/technician/tickets?page_size=1').data
+        self.assertIsNotNone(page['next'])
+
+        self.verifier_vues(self.technicien, [
+            '/api/technician/tickets', page['next'], f'/api/tickets/{self.ticket.id}',
+            f'/api/tickets/{self.ticket.id}/comments', '/api/tickets/stats', '/api/dashboard',
+        ])
+
+    def test_services(self):
+        self.verifier_plans(lambda: obtenir_etat_guidage(self.ticket.id))
+        self.verifier_plans(lambda: serialiser_ticket_pour_utilisateur(self.ticket.id, self.technicien))
+
+
+@override_settings(CHANNEL_LAYERS=CHANNEL_LAYERS_TEST)
+class FilCommentairesTests(DonneesTestMixin, TestCase):
+    """Le fil de commentaires, réponses et auteurs compris, est lu en une ou deux requêtes"""
+
+    PROFONDEUR = 30
+
+    def setUp(self):
+        super().setUp()
+        self.racines = []
+        for numero in range(3):
+            racine = self.commenter(f'Racine {numero}')
+            self.commenter(f'Réponse {numero}', racine, self.employe)
+            self.racines.append(racine)
+        # Chaîne de réponses imbriquées sous la deuxième racine
+        parent = self.racines[1]
+        for niveau in range(self.PROFONDEUR):
+            parent = self.commenter(f'Niveau {niveau}', parent)
+
+    def commenter(self, contenu, parent=None, auteur=None):
+        return Commentaire.objects.create(
+            ticket=self.ticket, utilisateur_auteur=auteur or self.technicien, contenu=contenu,
+            commentaire_parent=parent
+        )
+
+    @staticmethod
+    def serialiser(*args):
+        commentaires, suivant = charger_fil_commentaires(*args)
+        return CommentaireSerializer(commentaires, many=True).data, suivant
+
+    def profondeur(self, commentaire):
+        reponses = commentaire['reponses']
+        return 1 + max((self.profondeur(reponse) for reponse in reponses), default=0)
+
+    def test_fil_complet_en_une_requete(self):
+        with self.assertNumQueries(1):
+            fil, suivant = self.serialiser(self.ticket.id)
+
+        self.assertIsNone(suivant)
+        self.assertEqual([commentaire['contenu'] for commentaire in fil], ['Racine 0', 'Racine 1', 'Racine 2'])
+        self.assertEqual(self.profondeur(fil[1]), self.PROFONDEUR + 1)
+
+    def test_page_et_descendants_en_deux_requetes(self):
+        with self.assertNumQueries(2):  # Racines de la page, puis descendants (CTE récursive)
+            page, suivant = self.serialiser(self.ticket.id, None, 2)
+
+        self.assertEqual([commentaire['contenu'] for commentaire in page], ['Racine 0', 'Racine 1'])
+        self.assertEqual(suivant, self.racines[1].id)
+        self.assertEqual(self.profondeur(page[1]), self.PROFONDEUR + 1)
+        self.assertEqual(page[0]['reponses'][0]['auteur']['id'], self.employe.id)
+
+    def test_page_suivante(self):
+        with self.assertNumQueries(3):  # Commentaire repère, racines, descendants
+            page, suivant = self.serialiser(self.ticket.id, self.racines[1].id, 2)
+
+        self.assertEqual([commentaire['contenu'] for commentaire in page], ['Racine 2'])
+        self.assertIsNone(suivant)
+        self.assertEqual(self.profondeur(page[0]), 2)
+
+
+class SondesDiagnosticTests(TestCase):
+    """Pool de sondes partagé et borné, échéances transmises aux appels bloquants"""
+
+    class MoteurSondeBloquee(diagnostic_engine.DiagnosticSystemeEngine):
+        SONDES = {'bloquee': 'sonde_bloquee'}
+        DELAIS_SONDES = {}
+        DELAI_SONDE_PAR_DEFAUT = 0.05
+
+        liberation = threading.Event()
+
+        def sonde_bloquee(self):
+            self.liberation.wait(5)
+            return {'statut': 'ok', 'message': '', 'details': {}}
+
+    def test_sondes_bloquees_ne_creent_pas_de_threads(self):
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='diagnostic_test')
+        moteur = self.MoteurSondeBloquee(None)
+        try:
+            with mock.patch.object(diagnostic_engine, '_pool_sondes', pool):
+                resultats = [moteur.executer_sondes()['bloquee'] for _ in range(5)]
+            self.assertLessEqual(len(pool._threads), 2)
+        finally:
+            self.MoteurSondeBloquee.liberation.set()
+            pool.shutdown(wait=True)
+
+        self.assertTrue(all(resultat['details']['delai_depasse'] for resultat in resultats))
+
+    def test_delai_de_connexion_limite_par_l_echeance(self):
+        with mock.patch.object(diagnostic_engine.socket, 'create_connection') as connexion:
+            diagnostic_engine.DiagnosticSystemeEngine._mesurer_sonde(
+                diagnostic_engine.DiagnosticSystemeEngine.diagnostic_reseau, time.monotonic() + 1
+            )
+
+        self.assertLessEqual(connexion.call_args.kwargs['timeout'], 1)
+        self.assertIsNone(diagnostic_engine.echeance_sonde())
+
+    def test_banc_disque_interrompu_a_l_echeance(self):
+        with tempfile.TemporaryDirectory() as repertoire:
+            with self.assertRaises(TimeoutError):
+                mesurer_disque(repertoire, taille_mo=1, synchronisation='aucune', echeance=time.monotonic())
+            self.assertEqual(os.listdir(repertoire), [])
+
+
+class SauvegardeDiagnosticTests(DonneesTestMixin, TestCase):
+    """Résultats des sondes enregistrés en un INSERT groupé, avec la durée propre à chaque sonde"""
+
+    class MoteurDeuxSondes(diagnostic_engine.DiagnosticSystemeEngine):
+        SONDES = {'memoire': 'sonde_rapide', 'cpu': 'sonde_lente'}
+
+        @staticmethod
+        def sonde_rapide():
+            return {'statut': 'ok', 'message': 'Rapide', 'details': {}}
+
+        @staticmethod
+        def sonde_lente():
+            time.sleep(0.1)
+            return {'statut': 'avertissement', 'message': 'Lente', 'details': {'problemes': ['lent']}}
+
+    def test_insert_groupe_et_durees_par_sonde(self):
+        session = SessionDiagnostic.objects.create(utilisateur=self.employe, categorie=self.categorie)
+        moteur = self.MoteurDeuxSondes(session)
+        diagnostics = moteur.executer_sondes()
+
+        with CaptureQueriesContext(connection) as requetes:
+            moteur.sauvegarder_resultats(diagnostics)
+
+        instructions = [requete['sql'].split()[0].upper() for requete in requetes.captured_queries]
+        # Une transaction (point de sauvegarde dans le TestCase) : un INSERT groupé puis la session
+        self.assertEqual(instructions, ['SAVEPOINT', 'INSERT', 'UPDATE', 'RELEASE'])
+        self.assertIn('"diagnostic_automatique"', requetes.captured_queries[2]['sql'])
+
+        durees = dict(session.diagnostics_systeme.values_list('type_diagnostic', 'duree_execution'))
+        self.assertEqual(durees, moteur.latences)
+        self.assertLess(durees['memoire'], 0.1)
+        self.assertGreaterEqual(durees['cpu'], 0.1)
+        session.refresh_from_db()
+        self.assertEqual(session.diagnostic_automatique, diagnostics)
+
+
+@mock.patch.object(diagnostic_execution_service, 'connections', mock.Mock())
+@mock.patch.object(diagnostic_execution_service, '_diffuser', mock.Mock())
+class VerrouExecutionDiagnosticTests(DonneesTestMixin, TestCase):
+    """Verrou d'exécution prolongé au démarrage et libéré seulement par son propriétaire"""
+
+    def setUp(self):
+        super().setUp()
+        self.session = SessionDiagnostic.objects.create(utilisateur=self.employe, categorie=self.categorie)
+        self.cle = diagnostic_execution_service.cle_verrou_execution(self.session.id)
+
+    def executer(self, execution_id, pendant_execution=None):
+        def executer_diagnostic_complet(moteur, sur_resultat=None):
+            if pendant_execution:
+                pendant_execution()
+            return {}
+
+        with mock.patch.object(diagnostic_engine.DiagnosticSystemeEngine, 'executer_diagnostic_complet',
+                               executer_diagnostic_complet):
+            diagnostic_execution_service._executer_diagnostic(self.session.id, execution_id, False)
+
+    def test_verrou_prolonge_au_demarrage_puis_libere(self):
+        cache.set(self.cle, 'a', 1)
+        with mock.patch.object(diagnostic_execution_service.cache, 'set',
+                               wraps=diagnostic_execution_service.cache.set) as ecriture:
+            self.executer('a')
+
+        ecriture.assert_any_call(self.cle, 'a', diagnostic_execution_service.DUREE_VERROU)
+        self.assertIsNone(cache.get(self.cle))
+        self.assertEqual(diagnostic_execution_service.obtenir_etat_execution(self.session.id)['statut'], 'termine')
+
+    def test_execution_reprise_par_une_autre_n_est_pas_lancee(self):
+        cache.set(self.cle, 'b', 60)
+        with mock.patch.object(diagnostic_engine.DiagnosticSystemeEngine, 'executer_diagnostic_complet') as moteur:
+            diagnostic_execution_service._executer_diagnostic(self.session.id, 'a', False)
+
+        moteur.assert_not_called()
+        self.assertEqual(cache.get(self.cle), 'b')
+
+    def test_verrou_d_une_autre_execution_conserve(self):
+        cache.set(self.cle, 'a', 60)
+        self.executer('a', pendant_execution=lambda: cache.set(self.cle, 'b', 60))
+
+        self.assertEqual(cache.get(self.cle), 'b')
+
+
+class EchantillonnageSystemeTests(TestCase):
+    """Le thread d'arrière-plan ne relève que les compteurs CPU, l'instantané est mesuré à la demande"""
+
+    def test_arriere_plan_sans_instantane_complet(self):
+        echantillonneur = EchantillonneurSysteme(duree=0.1, inactivite=1)
+        with mock.patch('psutil.process_iter', wraps=psutil.process_iter) as parcours:
+            echantillonneur.instantane()
+            premier_releve = echantillonneur._dernier_releve
+            thread = echantillonneur._thread
+            thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        attributs = [appel.args[0] for appel in parcours.call_args_list]
+        self.assertEqual(attributs.count(ATTRIBUTS_PROCESSUS), 1)
+        self.assertGreater(attributs.count(['cpu_percent']), 1)
+        self.assertGreater(echantillonneur._dernier_releve, premier_releve)
+
+    def test_instantane_sans_attente(self):
+        echantillonneur = EchantillonneurSysteme(duree=0.1, inactivite=0)
+        with mock.patch('time.sleep') as attente, mock.patch.object(echantillonneur, '_demarrer_renouvellement'):
+            # Démarrage à froid : aucune référence, pourcentages CPU non disponibles
+            premier = echantillonneur.instantane()
+            self.assertIsNone(premier.cpu_percent)
+            self.assertTrue(all(info['cpu_percent'] is None for info in premier.processus))
+
+            # Référence trop récente : l'instantané précédent est servi
+            premier.horodatage -= 1
+            self.assertIs(echantillonneur.instantane(), premier)
+
+            echantillonneur._dernier_releve -= 1
+            second = echantillonneur.instantane()
+            self.assertIsNot(second, premier)
+            self.assertIsNotNone(second.cpu_percent)
+        attente.assert_not_called()
+
+
+class CacheSerialisationTests(DonneesTestMixin, TestCase):
+    """Clés du cache de sérialisation construites sur les champs des relations lus en base"""
+
+    def serialiser(self):
+        ticket = Ticket.objects.select_related(
+            'categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne'
+        ).get(id=self.ticket.id)
+        return TicketListSerializer(ticket).data
+
+    def test_renommage_sans_signal_change_la_representation(self):
+        self.assertEqual(self.serialiser()['categorie']['nom_categorie'], 'Réseau')
+
+        # Mises à jour sans signal, comme depuis un autre worker
+        Categorie.objects.filter(id=self.categorie.id).update(nom_categorie='Réseau local')
+        CustomUser.objects.filter(id=self.technicien.id).update(first_name='Aina')
+
+        donnees = self.serialiser()
+        self.assertEqual(donnees['categorie']['nom_categorie'], 'Réseau local')
+        self.assertEqual(donnees['technicien_assigne']['nom_complet'], 'Aina')
+
+    def test_relations_non_chargees_lues_en_une_requete(self):
+        self.serialiser()
+        ticket = Ticket.objects.get(id=self.ticket.id)
+
+        with self.assertNumQueries(1):
+            donnees = TicketListSerializer(ticket).data
+        self.assertEqual(donnees, self.serialiser())
+
+
+class RequetesConditionnellesTests(DonneesTestMixin, TestCase):
+    """ETag lus en base : 200, puis 304 sans changement, puis 200 après une modification sans signal"""
+
+    def verifier_revalidation(self, url, modifier, user=None):
+        client = self.client_pour(user or self.employe)
+        reponse = client.get(url)
+        self.assertEqual(reponse.status_code, 200)
+        etag = reponse['ETag']
+
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        modifier()
+        reponse = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], etag)
+
+    def test_categories_renommees(self):
+        self.verifier_revalidation('/api/categories', lambda: Categorie.objects.update(nom_categorie='Réseau local'))
+
+    def test_departements_ajoutes(self):
+        self.verifier_revalidation('/api/departments', lambda: Departement.objects.create(nom_departement='Finances'))
+
+    def test_equipements_renommes(self):
+        Equipement.objects.create(nom_modele='HP 400', type_equipement='Imprimante', numero_serie='S1',
+                                  departement=self.employe.departement, date_achat='2024-01-01')
+        self.verifier_revalidation('/api/equipments', lambda: Departement.objects.update(localisation='Étage 2'))
+
+    def test_ticket_apres_renommage_de_sa_categorie(self):
+        self.verifier_revalidation(f'/api/tickets/{self.ticket.id}',
+                                   lambda: Categorie.objects.update(nom_categorie='Réseau local'))
+
+    def test_commentaires_apres_renommage_d_un_auteur(self):
+        Commentaire.objects.create(ticket=self.ticket, utilisateur_auteur=self.technicien, contenu='Vu')
+        self.verifier_revalidation(f'/api/tickets/{self.ticket.id}/comments',
+                                   lambda: CustomUser.objects.filter(id=self.technicien.id).update(last_name='Rabe'))
+
+
+class FileEmailsTests(DonneesTestMixin, TestCase):
+    """File EmailSortant : déduplication, réservation, nouvelles tentatives et envois partiels"""
+
+    def setUp(self):
+        super().setUp()
+        # La création du ticket a planifié 'nouveau_ticket' et 'confirmation_employe'
+        self.email = EmailSortant.objects.get(cle_deduplication=f'nouveau_ticket:{self.ticket.id}')
+        EmailSortant.objects.exclude(id=self.email.id).delete()
+
+    def traiter(self, envoi, decalage=0):
+        """Un passage du worker, `decalage` secondes après maintenant, avec `envoi` à la place de _envoyer"""
+        instant = timezone.now() + timedelta(seconds=decalage)
+        with mock.patch.object(email_outbox_service, '_envoyer', side_effect=envoi) as envoyer, \
+                mock.patch.object(email_outbox_service.timezone, 'now', return_value=instant):
+            resultats = email_outbox_service.traiter_emails_en_attente()
+        self.email.refresh_from_db()
+        return resultats, envoyer
+
+    def test_cle_de_deduplication(self):
+        self.assertEqual(email_outbox_service.planifier_email('nouveau_ticket', self.ticket), self.email)
+        email_outbox_service.planifier_email('urgence_technicien', self.ticket, self.technicien)
+        email_outbox_service.planifier_email('urgence_technicien', self.ticket, self.technicien)
+        email_outbox_service.planifier_email('urgence_technicien', self.ticket, self.employe)
+
+        self.assertCountEqual(
+            EmailSortant.objects.values_list('cle_deduplication', flat=True),
+            [f'nouveau_ticket:{self.ticket.id}',
+             f'urgence_technicien:{self.ticket.id}:{self.technicien.id}',
+             f'urgence_technicien:{self.ticket.id}:{self.employe.id}'],
+        )
+
+    def test_un_seul_worker_reserve_l_email(self):
+        maintenant = timezone.now()
+        vu_par_worker_1 = EmailSortant.objects.get(id=self.email.id)
+        vu_par_worker_2 = EmailSortant.objects.get(id=self.email.id)
+
+        self.assertTrue(email_outbox_service._reserver(vu_par_worker_1, maintenant))
+        self.assertFalse(email_outbox_service._reserver(vu_par_worker_2, maintenant))
+
+        # Réservé : ignoré jusqu'à l'expiration du bail, puis repris (worker interrompu)
+        resultats, envoyer = self.traiter([True])
+        envoyer.assert_not_called()
+        resultats, envoyer = self.traiter([True], decalage=email_outbox_service.DUREE_BAIL + 1)
+        self.assertEqual(resultats['envoyes'], 1)
+        self.assertEqual(self.email.statut, 'envoye')
+
+    def test_delai_double_a_chaque_echec(self):
+        debut = timezone.now()
+        self.traiter(RuntimeError('SMTP indisponible'))
+        self.assertEqual((self.email.statut, self.email.tentatives), ('en_attente', 1))
+        premier_delai = (self.email.prochaine_tentative - debut).total_seconds()
+        self.assertAlmostEqual(premier_delai, email_outbox_service.DELAI_BASE, delta=5)
+
+        self.traiter([False], decalage=premier_delai)
+        self.assertEqual(self.email.tentatives, 2)
+        second_delai = (self.email.prochaine_tentative - debut).total_seconds() - premier_delai
+        self.assertAlmostEqual(second_delai, 2 * email_outbox_service.DELAI_BASE, delta=5)
+
+    def test_echec_definitif_apres_max_tentatives(self):
+        EmailSortant.objects.filter(id=self.email.id).update(tentatives=email_outbox_service.MAX_TENTATIVES - 1)
+
+        resultats, _ = self.traiter(RuntimeError('SMTP indisponible'))
+
+        self.assertEqual(resultats['echecs'], 1)
+        self.assertEqual(self.email.statut, 'echec')
+        self.assertTrue(Notification.objects.filter(ticket=self.ticket, statut_notification='echec').exists())
+        resultats, envoyer = self.traiter([True], decalage=email_outbox_service.DELAI_MAX)
+        envoyer.assert_not_called()
+
+    def test_envoi_partiel_ne_retente_que_les_destinataires_restants(self):
+        with mock.patch.object(email_utils, 'envoyer_email_nouveau_ticket_sendgrid', side_effect=[
+            email_utils.EnvoiIncomplet(['b@test.com', 'c@test.com'], RuntimeError('HTTP 500')), True,
+        ]) as envoi:
+            email_outbox_service.traiter_emails_en_attente()
+            self.email.refresh_from_db()
+            self.assertEqual(self.email.destinataires_restants, ['b@test.com', 'c@test.com'])
+
+            EmailSortant.objects.filter(id=self.email.id).update(prochaine_tentative=timezone.now())
+            email_outbox_service.traiter_emails_en_attente()
+
+        self.assertIsNone(envoi.call_args_list[0].args[1])
+        self.assertEqual(envoi.call_args_list[1].args[1], ['b@test.com', 'c@test.com'])
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.statut, 'envoye')
+
+
+class AuthentificationWebSocketTests(DonneesTestMixin, TestCase):
+    """Résolution du token JWT des WebSockets et cache des utilisateurs"""
+
+    def setUp(self):
+        super().setUp()
+        middleware.cache_utilisateurs.vider()
+        self.addCleanup(middleware.cache_utilisateurs.vider)
+        self.token = str(AccessToken.for_user(self.technicien))
+
+    @staticmethod
+    def resoudre(token):
+        return async_to_sync(middleware.obtenir_utilisateur_depuis_token)(token)
+
+    def test_token_valide_resolu_puis_servi_par_le_cache(self):
+        premier = self.resoudre(self.token)
+        with self.assertNumQueries(0):
+            second = self.resoudre(self.token)
+
+        self.assertEqual((premier, second), (self.technicien, self.technicien))
+        # Une instance par connexion
+        self.assertIsNot(premier, second)
+
+    def test_token_expire_ou_sans_identifiant(self):
+        expire = AccessToken.for_user(self.technicien)
+        expire.set_exp(lifetime=-timedelta(seconds=1))
+        self.assertIsNone(self.resoudre(str(expire)))
+        self.assertIsNone(self.resoudre(str(AccessToken())))
+
+    def test_utilisateur_inactif_refuse(self):
+        CustomUser.objects.filter(id=self.technicien.id).update(is_active=False)
+        self.assertIsNone(self.resoudre(self.token))
+
+    def test_desactivation_vue_immediatement_par_le_processus_qui_enregistre(self):
+        self.resoudre(self.token)
+        self.technicien.is_active = False
+        self.technicien.save()
+        self.assertIsNone(self.resoudre(self.token))
+
+    def test_desactivation_par_un_autre_processus_vue_a_l_expiration(self):
+        self.resoudre(self.token)
+        CustomUser.objects.filter(id=self.technicien.id).update(is_active=False)
+        self.assertIsNotNone(self.resoudre(self.token))
+
+        expiration = time.time() + middleware.cache_utilisateurs.duree + 1
+        with mock.patch.object(middleware.time, 'time', return_value=expiration):
+            self.assertIsNone(self.resoudre(self.token))
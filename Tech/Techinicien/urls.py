@@ -3,7 +3,7 @@ from django.urls import path
 from .views import (
     UserRegistrationView, CustomTokenObtainPairView, UserProfileView, ChangePasswordView,
     CategorieListView, EquipementListView, TicketCreateView, MyTicketsView, DepartementListView,
-    TicketDetailView, TicketStatsView, TechnicianTicketsView, AssignTicketToSelfView,
+    TicketDetailView, TicketStatsView, TicketSearchView, TechnicianTicketsView, AssignTicketToSelfView,
     UpdateTicketStatusView, TicketCommentsView, StartGuidanceView, SendInstructionView,
     EndGuidanceView, ConfirmInstructionView,
     # Vues de diagnostic existantes
@@ -35,6 +35,7 @@ urlpatterns = [
     path('tickets/my', MyTicketsView.as_view(), name='my_tickets'),
     path('tickets/<int:pk>', TicketDetailView.as_view(), name='ticket_detail'),
     path('tickets/stats', TicketStatsView.as_view(), name='ticket_stats'),
+    path('tickets/search', TicketSearchView.as_view(), name='ticket_search'),
 
     # Ticket URLs - Technician
     path('technician/tickets', TechnicianTicketsView.as_view(), name='technician_tickets'),
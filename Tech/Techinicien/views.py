@@ -1,18 +1,21 @@
 from datetime import datetime, timedelta
 
-from django.db.models.aggregates import Count, Avg, Sum
+from django.db import transaction
+from django.db.models.aggregates import Count, Avg, Sum, Max
 from rest_framework import status, permissions, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.permissions import IsAuthenticated, BasePermission
+from rest_framework.utils.urls import replace_query_param
 from django.db.models import Q, Count, F, Avg
 from django.db.models.functions import ExtractMonth, ExtractYear, ExtractDay, TruncDate
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 
-from .email_utils import envoyer_email_nouveau_ticket_smtp, envoyer_email_confirmation_employe_smtp
 from .models import Ticket, Categorie, Equipement, Departement, SessionDiagnostic, TemplateDiagnostic, \
-    DiagnosticSysteme, HistoriqueDiagnostic, QuestionDiagnostic, Commentaire, ReponseDiagnostic, CustomUser
+    DiagnosticSysteme, HistoriqueDiagnostic, QuestionDiagnostic, Commentaire, ReponseDiagnostic, CustomUser, \
+    StatistiqueTicketJour
 from .serializers import (
     UserRegistrationSerializer,
     CustomTokenObtainPairSerializer,
@@ -27,6 +30,23 @@ from .serializers import (
     TemplateDiagnosticSerializer, SessionStatistiquesSerializer,
     SessionDiagnosticDetailSerializer, QuestionDiagnosticAvanceSerializer
 )
+from .conditionnel import etiquette, get_conditionnel
+from .pagination import TicketCursorPagination
+from .services.commentaires_service import charger_fil_commentaires
+from .services.diagnostic_execution_service import lancer_diagnostic
+from .services.recherche_service import rechercher_tickets, moteur_recherche
+from .services.serialisation_service import CHAMPS_VERSION, version_ticket
+from .services.visibilite_service import tickets_visibles
+from .services.statistiques_service import (
+    obtenir_stats_tickets, agreger_statistiques, duree_moyenne_heures, statistiques_resolution
+)
+from .services.guidage_service import (
+    demarrer_guidage,
+    terminer_guidage,
+    enregistrer_instruction,
+    enregistrer_confirmation,
+    synchroniser_avec_commentaire,
+)
 
 class UserRegistrationView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -120,64 +140,158 @@ class TicketCreateView(generics.CreateAPIView):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Seuls les employés peuvent créer des tickets.")
 
-        # Créer le ticket
-        ticket = serializer.save(utilisateur_createur=self.request.user)
+        # Créer le ticket (les emails sont planifiés par le signal post_save)
+        serializer.save(utilisateur_createur=self.request.user)
 
-        try:
-            # Envoyer les notifications
-            envoyer_email_nouveau_ticket_smtp(ticket)
-            envoyer_email_confirmation_employe_smtp(ticket)
 
-        except Exception as e:
-            # Log l'erreur, mais ne pas empêcher la création du ticket
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Erreur lors de l'envoi des notifications par email: {str(e)}")
+class ListeTicketsMixin:
+    """
+    Listes de tickets : pagination par curseur optionnelle (?cursor=, ?page_size=)
+    et champs à la demande (?fields=id,titre,statut_ticket,priorite)
+    """
+    serializer_class = TicketListSerializer
+    pagination_class = TicketCursorPagination
+    relations_ticket = ('categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne')
 
+    def optimiser_queryset(self, queryset):
+        """Ne charger que les relations et colonnes nécessaires aux champs demandés"""
+        champs = TicketListSerializer.champs_demandes(self.request)
+        if champs is None:
+            return queryset.select_related(*self.relations_ticket)
 
-class MyTicketsView(generics.ListAPIView):
+        queryset = queryset.select_related(*[nom for nom in self.relations_ticket if nom in champs])
+        colonnes = {champ.name for champ in Ticket._meta.concrete_fields}
+        # date_creation et id servent de curseur ; les clés étrangères suivies par le FieldTracker
+        # ne peuvent pas être différées (il rechargerait l'instance à chaque ligne)
+        cles_suivies = [nom for nom in Ticket.CHAMPS_SUIVIS if Ticket._meta.get_field(nom).is_relation]
+        return queryset.only('id', 'date_creation', *cles_suivies, *[nom for nom in champs if nom in colonnes])
+
+
+class MyTicketsView(ListeTicketsMixin, generics.ListAPIView):
     """
     Vue pour lister les tickets créés par l'utilisateur connecté.
     """
-    serializer_class = TicketListSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         """Retourner seulement les tickets créés par l'utilisateur connecté."""
-        return Ticket.objects.filter(
+        return self.optimiser_queryset(Ticket.objects.filter(
             utilisateur_createur=self.request.user
-        ).select_related('categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne')
+        ))
+
+
+class TicketSearchView(APIView):
+    """
+    Recherche plein texte dans les tickets (titre, description) et leurs commentaires.
+    Paramètres : q (mots recherchés, par préfixe), limit (20 par défaut, 100 au maximum), fields.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def get(request):
+        """Retourner les tickets visibles correspondant à la recherche, par pertinence."""
+        texte = request.query_params.get('q', '').strip()
+        if len(texte) < 2:
+            return Response(
+                {'error': 'La recherche doit contenir au moins 2 caractères'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limite = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            return Response({'error': 'Paramètre limit invalide'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Même règle de visibilité que le détail, les commentaires et les WebSockets
+        moteur = moteur_recherche()
+        resultats = rechercher_tickets(texte, tickets_visibles(request.user), limite, moteur)
+        donnees = TicketListSerializer(resultats, many=True, context={'request': request}).data
+        for ticket, ticket_data in zip(resultats, donnees):
+            ticket_data['score'] = ticket.score_recherche
+
+        return Response({
+            'requete': texte,
+            'moteur': moteur,
+            'total': len(donnees),
+            'resultats': donnees
+        })
 
 
+def version_ticket_detail(request, pk):
+    """ETag : version du ticket et champs affichés de ses relations (cache de sérialisation) ; Last-Modified"""
+    ligne = tickets_visibles(request.user).filter(pk=pk).values_list(*CHAMPS_VERSION).first()
+    if ligne is None:
+        return None, None
+    return etiquette(request.build_absolute_uri(), version_ticket(ligne)), ligne[1]
+
+
+# Auteur d'un commentaire tel qu'affiché par CommentaireSerializer
+CHAMPS_AUTEUR = ('utilisateur_auteur', 'utilisateur_auteur__email', 'utilisateur_auteur__first_name',
+                 'utilisateur_auteur__last_name', 'utilisateur_auteur__role')
+
+
+def version_commentaires_ticket(request, ticket_id):
+    """ETag : compteurs des commentaires par auteur et champs affichés des auteurs ; Last-Modified"""
+    auteurs = list(
+        Commentaire.objects.filter(
+            ticket_id=ticket_id, ticket__in=tickets_visibles(request.user)
+        ).values(*CHAMPS_AUTEUR).annotate(
+            nombre=Count('id'),
+            dernier_id=Max('id'),
+            confirmes=Count('id', filter=Q(est_confirme=True)),
+            derniere_date=Max('date_commentaire'),
+            derniere_confirmation=Max('date_confirmation'),
+        ).order_by('utilisateur_auteur')
+    )
+    # Ticket invisible ou sans commentaire : la vue répond normalement
+    if not auteurs:
+        return None, None
+
+    derniere_modification = max(
+        date for auteur in auteurs for date in (auteur['derniere_date'], auteur['derniere_confirmation']) if date
+    )
+    return etiquette(request.build_absolute_uri(), auteurs), derniere_modification
+
+
+def version_liste(requete, champs):
+    """
+    Fabrique de fonction de version pour les listes du référentiel : l'ETag est calculé sur les
+    colonnes sérialisées lues en base (une requête, sans instancier les modèles), si bien qu'un
+    ajout ou un renommage est vu par tous les workers, même fait par QuerySet.update()
+    """
+    def version(request, *args, **kwargs):
+        return etiquette(request.build_absolute_uri(), list(requete(request.user).values_list(*champs))), None
+    return version
+
+
+def equipements_utilisateur(user):
+    """Équipements du département de l'utilisateur (tous s'il n'en a pas)"""
+    queryset = Equipement.objects.select_related('departement')
+    if user.departement_id:
+        return queryset.filter(departement_id=user.departement_id)
+    return queryset
+
+
+@method_decorator(get_conditionnel(version_ticket_detail), name='get')
 class TicketDetailView(generics.RetrieveAPIView):
     """
     Vue pour voir les détails d'un ticket.
     Les employés ne peuvent voir que leurs propres tickets.
+    Requêtes conditionnelles : 304 si le ticket et ses relations n'ont pas changé.
     """
     serializer_class = TicketListSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         """Filtrer selon le rôle de l'utilisateur."""
-        user = self.request.user
-        queryset = Ticket.objects.select_related('categorie', 'equipement', 'utilisateur_createur',
-                                                 'technicien_assigne')
-
-        if user.role == 'employe':
-            # Les employés ne voient que leurs propres tickets
-            return queryset.filter(utilisateur_createur=user)
-        elif user.role == 'technicien':
-            # Les techniciens voient leurs tickets assignés et ceux qu'ils ont créés
-            return queryset.filter(
-                Q(technicien_assigne=user) | Q(utilisateur_createur=user)
-            )
-        elif user.role == 'admin':
-            # Les admins voient tous les tickets
-            return queryset
-
-        return queryset.none()
+        return tickets_visibles(self.request.user).select_related(
+            'categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne'
+        )
 
 
+@method_decorator(get_conditionnel(version_liste(
+    lambda user: Categorie.objects.all(), ['id', 'nom_categorie', 'description_categorie', 'couleur_affichage']
+)), name='get')
 class CategorieListView(generics.ListAPIView):
     """
     Vue pour lister toutes les catégories disponibles.
@@ -187,6 +301,10 @@ class CategorieListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
 
+@method_decorator(get_conditionnel(version_liste(equipements_utilisateur, [
+    'id', 'nom_modele', 'type_equipement', 'numero_serie', 'statut_equipement',
+    'departement_id', 'departement__nom_departement', 'departement__responsable', 'departement__localisation',
+])), name='get')
 class EquipementListView(generics.ListAPIView):
     """
     Vue pour lister les équipements disponibles.
@@ -196,16 +314,12 @@ class EquipementListView(generics.ListAPIView):
 
     def get_queryset(self):
         """Filtrer les équipements selon le département de l'utilisateur si nécessaire."""
-        user = self.request.user
-        queryset = Equipement.objects.select_related('departement')
-
-        # Optionnel : filtrer par département de l'utilisateur
-        if user.departement:
-            return queryset.filter(departement=user.departement)
-
-        return queryset
+        return equipements_utilisateur(self.request.user)
 
 
+@method_decorator(get_conditionnel(version_liste(
+    lambda user: Departement.objects.all(), ['id', 'nom_departement', 'responsable', 'localisation']
+)), name='get')
 class DepartementListView(generics.ListAPIView):
     """
     Vue pour lister tous les départements.
@@ -223,38 +337,15 @@ class TicketStatsView(APIView):
 
     @staticmethod
     def get(request):
-        """Retourner les statistiques des tickets de l'utilisateur."""
-        user = request.user
-
-        if user.role == 'employe':
-            # Statistiques pour les employés (leurs propres tickets)
-            tickets = Ticket.objects.filter(utilisateur_createur=user)
-        elif user.role == 'technicien':
-            # Statistiques pour les techniciens (tickets assignés)
-            tickets = Ticket.objects.filter(technicien_assigne=user)
-        else:
-            # Statistiques pour les admins (tous les tickets)
-            tickets = Ticket.objects.all()
-
-        stats = {
-            'total': tickets.count(),
-            'ouvert': tickets.filter(statut_ticket='ouvert').count(),
-            'en_cours': tickets.filter(statut_ticket='en cours').count(),
-            'resolu': tickets.filter(statut_ticket='resolu').count(),
-            'ferme': tickets.filter(statut_ticket='ferme').count(),
-            'priorite_critique': tickets.filter(priorite='critique').count(),
-            'priorite_urgent': tickets.filter(priorite='urgent').count(),
-        }
+        """Retourner les statistiques des tickets de l'utilisateur (une requête, mise en cache)."""
+        return Response(obtenir_stats_tickets(request.user))
 
-        return Response(stats)
 
-
-class TechnicianTicketsView(generics.ListAPIView):
+class TechnicianTicketsView(ListeTicketsMixin, generics.ListAPIView):
     """
     Vue pour lister tous les tickets disponibles pour les techniciens.
     Inclut les tickets non assignés et ceux assignés au technicien connecté.
     """
-    serializer_class = TicketListSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -263,13 +354,12 @@ class TechnicianTicketsView(generics.ListAPIView):
 
         if user.role == 'technicien':
             # Techniciens voient : tickets non assignés + leurs tickets assignés
-            return Ticket.objects.filter(
+            return self.optimiser_queryset(Ticket.objects.filter(
                 Q(technicien_assigne=None) | Q(technicien_assigne=user)
-            ).select_related('categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne')
+            ))
         elif user.role == 'admin':
             # Admins voient tous les tickets
-            return Ticket.objects.all().select_related('categorie', 'equipement', 'utilisateur_createur',
-                                                       'technicien_assigne')
+            return self.optimiser_queryset(Ticket.objects.all())
 
         # Autres rôles n'ont pas accès
         return Ticket.objects.none()
@@ -448,42 +538,57 @@ class UpdateTicketStatusView(APIView):
 class TicketCommentsView(APIView):
     """
     Vue pour gérer les commentaires d'un ticket.
+    Le fil complet est renvoyé par défaut ; avec `limit` (50 par défaut, 200 au maximum) et/ou
+    `after=<id d'un commentaire principal>`, il est paginé par commentaire principal.
+    Requêtes conditionnelles : 304 si aucun commentaire n'a été ajouté, supprimé ou confirmé.
     """
     permission_classes = [IsAuthenticated]
+    limite_par_defaut = 50
+    limite_max = 200
 
     @staticmethod
+    @get_conditionnel(version_commentaires_ticket)
     def get(request, ticket_id):
-        """Récupérer les commentaires d'un ticket."""
+        """Récupérer les commentaires d'un ticket (arbre chargé en une ou deux requêtes)."""
         try:
-            ticket = Ticket.objects.get(id=ticket_id)
-
-            # Vérifier les permissions d'accès au ticket
-            user = request.user
-            if user.role == 'employe':
-                # L'employé peut voir les commentaires de ses propres tickets
-                if ticket.utilisateur_createur != user:
-                    return Response(
-                        {'error': 'Accès refusé'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            elif user.role == 'technicien':
-                # Le technicien peut voir les commentaires des tickets qui lui sont assignés OU qu'il a créés
-                if ticket.technicien_assigne != user and ticket.utilisateur_createur != user:
-                    return Response(
-                        {'error': 'Accès refusé'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            elif user.role != 'admin':
-                # Autres rôles n'ont pas accès
+            # Même règle de visibilité que le détail du ticket et les WebSockets
+            if not tickets_visibles(request.user).filter(id=ticket_id).exists():
+                if not Ticket.objects.filter(id=ticket_id).exists():
+                    raise Ticket.DoesNotExist
                 return Response(
                     {'error': 'Accès refusé'},
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            # Récupérer seulement les commentaires principaux (sans parent)
-            comments = ticket.commentaires.filter(commentaire_parent=None).order_by('date_commentaire')
+            params = request.query_params
+            if 'after' not in params and 'limit' not in params:
+                # Commentaires principaux (sans parent), leurs réponses imbriquées
+                comments, _ = charger_fil_commentaires(ticket_id)
+                serializer = CommentaireSerializer(comments, many=True, context={'request': request})
+                return Response(serializer.data, status=status.HTTP_200_OK)
+
+            try:
+                limite = int(params.get('limit', TicketCommentsView.limite_par_defaut))
+                apres = int(params['after']) if params.get('after') else None
+            except ValueError:
+                return Response({'error': 'Paramètres de pagination invalides'}, status=status.HTTP_400_BAD_REQUEST)
+            limite = max(1, min(limite, TicketCommentsView.limite_max))
+
+            try:
+                comments, suivant = charger_fil_commentaires(ticket_id, apres, limite)
+            except Commentaire.DoesNotExist:
+                return Response(
+                    {'error': 'Commentaire de référence introuvable sur ce ticket'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
             serializer = CommentaireSerializer(comments, many=True, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response({
+                'next': replace_query_param(request.build_absolute_uri(), 'after', suivant) if suivant else None,
+                'next_after': suivant,
+                'limit': limite,
+                'results': serializer.data
+            }, status=status.HTTP_200_OK)
 
         except Ticket.DoesNotExist:
             return Response(
@@ -518,6 +623,7 @@ class TicketCommentsView(APIView):
 
             if serializer.is_valid():
                 comment = serializer.save(ticket=ticket)
+                synchroniser_avec_commentaire(comment)
 
                 # Retourner le commentaire créé avec toutes les informations
                 response_serializer = CommentaireSerializer(comment, context={'request': request})
@@ -581,6 +687,7 @@ class StartGuidanceView(APIView):
                 contenu="🔧 Session de guidage à distance démarrée. Je vais vous guider étape par étape pour résoudre votre problème.",
                 type_action='guidage_debut'
             )
+            demarrer_guidage(ticket.id)
 
             # Optionnel : changer le statut du ticket si nécessaire
             if ticket.statut_ticket == 'ouvert':
@@ -633,17 +740,22 @@ class SendInstructionView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Créer l'instruction
             from .models import Commentaire
-            comment = Commentaire.objects.create(
-                ticket=ticket,
-                utilisateur_auteur=user,
-                contenu=instruction,
-                type_action='instruction',
-                est_instruction=True,
-                numero_etape=numero_etape,
-                attendre_confirmation=attendre_confirmation
-            )
+            # L'état du guidage n'avance que si l'instruction est bien créée
+            with transaction.atomic():
+                # Réserver le numéro d'étape (attribué automatiquement s'il n'est pas fourni)
+                numero_etape = enregistrer_instruction(ticket.id, numero_etape, attendre_confirmation)
+
+                # Créer l'instruction
+                comment = Commentaire.objects.create(
+                    ticket=ticket,
+                    utilisateur_auteur=user,
+                    contenu=instruction,
+                    type_action='instruction',
+                    est_instruction=True,
+                    numero_etape=numero_etape,
+                    attendre_confirmation=attendre_confirmation
+                )
 
             serializer = CommentaireSerializer(comment, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -696,6 +808,7 @@ class ConfirmInstructionView(APIView):
 
             # Marquer comme confirmé
             comment.marquer_comme_confirme()
+            enregistrer_confirmation(comment)
 
             # Envoyer une notification WebSocket pour mettre à jour l'instruction
             from channels.layers import get_channel_layer
@@ -765,6 +878,7 @@ class EndGuidanceView(APIView):
                 contenu=f"{message_fin}",
                 type_action='guidage_fin'
             )
+            terminer_guidage(ticket.id)
 
             # Marquer le ticket comme résolu si demandé
             if resolu:
@@ -834,19 +948,17 @@ class SessionDiagnosticCreateView(APIView):
         if serializer.is_valid():
             session = serializer.save()
 
-            # Lancer le diagnostic système automatique et attendre qu'il se termine
-            from .diagnostic_engine import DiagnosticSystemeEngine
-            diagnostic_engine = DiagnosticSystemeEngine(session)
-            diagnostic_engine.executer_diagnostic_complet()
-
-            # Recharger la session pour avoir les données à jour
-            session.refresh_from_db()
+            # Le diagnostic système automatique s'exécute en arrière-plan : les résultats sont
+            # publiés sonde par sonde sur ws/diagnostic/<session_id>/
+            execution_id, _ = lancer_diagnostic(session)
 
             return Response({
                 'session_id': session.id,
                 'message': 'Session de diagnostic créée avec succès',
                 'session_existante': False,
-                'diagnostic_automatique': session.diagnostic_automatique
+                'execution_id': execution_id,
+                'diagnostic_statut': 'en_cours',
+                'diagnostic_automatique': None
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -980,18 +1092,14 @@ class DiagnosticSystemeView(APIView):
                 utilisateur=request.user
             )
 
-            # Supprimer les anciens diagnostics
-            session.diagnostics_systeme.all().delete()
-
-            # Relancer le diagnostic
-            from .diagnostic_engine import DiagnosticSystemeEngine
-            diagnostic_engine = DiagnosticSystemeEngine(session)
-            resultats = diagnostic_engine.executer_diagnostic_complet()
+            # Relancer le diagnostic en arrière-plan (les anciens résultats sont remplacés)
+            execution_id, lance = lancer_diagnostic(session, remplacer=True)
 
             return Response({
-                'message': 'Diagnostic système mis à jour',
-                'resultats': resultats
-            })
+                'message': 'Diagnostic système relancé' if lance else 'Diagnostic système déjà en cours',
+                'execution_id': execution_id,
+                'diagnostic_statut': 'en_cours'
+            }, status=status.HTTP_202_ACCEPTED)
 
         except SessionDiagnostic.DoesNotExist:
             return Response(
@@ -1779,45 +1887,31 @@ class DashboardDataView(APIView):
         """Récupère les données du tableau de bord pour un employé"""
         # Tickets de l'employé
         user_tickets = Ticket.objects.filter(utilisateur_createur=user).order_by('-date_creation')
-        
-        # Statistiques temporelles
-        today = timezone.now().date()
-        tickets_today = user_tickets.filter(date_creation__date=today).count()
-        tickets_this_month = user_tickets.filter(
-            date_creation__year=current_year,
-            date_creation__month=current_month
-        ).count()
-        tickets_this_year = user_tickets.filter(date_creation__year=current_year).count()
-
-        # Statistiques par statut
-        tickets_by_status = user_tickets.values('statut_ticket').annotate(
-            count=Count('id')
-        ).order_by('statut_ticket')
-        
-        # Formater les données pour le graphique des statuts
-        status_display_map = dict(Ticket.STATUT_TICKET_CHOICES)
-        status_data = [
-            {
-                'name': status_display_map.get(item['statut_ticket'], item['statut_ticket']),
-                'value': item['count']
-            }
-            for item in tickets_by_status
-        ]
 
-        # Statistiques par priorité
-        tickets_by_priority = user_tickets.values('priorite').annotate(
-            count=Count('id')
-        ).order_by('priorite')
+        # Compteurs en une seule requête (les tickets d'un employé ne sont pas agrégés par jour)
+        today = timezone.now().date()
+        compteurs = user_tickets.aggregate(
+            total_tickets=Count('id'),
+            tickets_today=Count('id', filter=Q(date_creation__date=today)),
+            tickets_this_month=Count('id', filter=Q(date_creation__year=current_year,
+                                                    date_creation__month=current_month)),
+            tickets_this_year=Count('id', filter=Q(date_creation__year=current_year)),
+            tickets_resolved_this_month=Count('id', filter=Q(statut_ticket='resolu',
+                                                             date_resolution__year=current_year,
+                                                             date_resolution__month=current_month)),
+            pending_tickets=Count('id', filter=Q(statut_ticket__in=['ouvert', 'en_cours'])),
+            urgent_tickets=Count('id', filter=Q(priorite__in=['urgent', 'critique'])),
+        )
 
-        # Formater les données pour le graphique des priorités
-        priority_display_map = dict(Ticket.PRIORITE_CHOICES)
-        priority_data = [
-            {
-                'name': priority_display_map.get(item['priorite'], item['priorite']),
-                'value': item['count']
-            }
-            for item in tickets_by_priority
-        ]
+        # Statistiques par statut et par priorité
+        status_data = self.format_distribution(
+            user_tickets.values('statut_ticket').annotate(count=Count('id')).order_by('statut_ticket'),
+            'statut_ticket', Ticket.STATUT_TICKET_CHOICES
+        )
+        priority_data = self.format_distribution(
+            user_tickets.values('priorite').annotate(count=Count('id')).order_by('priorite'),
+            'priorite', Ticket.PRIORITE_CHOICES
+        )
 
         # Statistiques par catégorie pour les 6 derniers mois
         six_months_ago = timezone.now() - timedelta(days=180)
@@ -1832,187 +1926,107 @@ class DashboardDataView(APIView):
             count=Count('id')
         ).order_by('year', 'month')
 
-        # Organiser les données par mois pour le graphique
-        category_data = {}
-        for item in tickets_by_category_month:
-            month_key = f"{self.get_month_name(item['month'])} {item['year']}"
-            if month_key not in category_data:
-                category_data[month_key] = {'name': month_key}
-            category_data[month_key][item['categorie__nom_categorie']] = item['count']
-
         # Derniers tickets
+        derniers_tickets = list(user_tickets.select_related(
+            'categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne'
+        )[:5])
         recent_tickets = TicketListSerializer(
-            user_tickets[:5], 
-            many=True, 
+            derniers_tickets,
+            many=True,
             context={'request': self.request}
         ).data
-        
-        # Temps moyen de résolution de mes tickets
-        resolved_tickets = user_tickets.filter(statut_ticket='resolu')
-        avg_resolution_time = 0
-        if resolved_tickets.exists():
-            resolution_times = []
-            for ticket in resolved_tickets:
-                if ticket.date_modification:
-                    resolution_time = (ticket.date_modification - ticket.date_creation).total_seconds() / 3600
-                    resolution_times.append(resolution_time)
-
-            if resolution_times:
-                avg_resolution_time = sum(resolution_times) / len(resolution_times)
-
-        # Statistiques de satisfaction (si applicable)
-        tickets_resolved_this_month = user_tickets.filter(
-            statut_ticket='resolu',
-            date_modification__year=current_year,
-            date_modification__month=current_month
-        ).count()
+
+        # Temps de résolution de mes tickets (moyenne et percentiles calculés en SQL)
+        resolution = statistiques_resolution(user_tickets)
+        avg_resolution_time = resolution['moyenne']
 
         return Response({
-            'user_info': {
-                'name': user.get_full_name() or user.email,
-                'role': user.get_role_display(),
-                'department': user.departement.nom_departement if user.departement else 'Non spécifié'
-            },
+            'user_info': self.get_user_info(user),
             'stats': {
-                'total_tickets': user_tickets.count(),
-                'tickets_today': tickets_today,
-                'tickets_this_month': tickets_this_month,
-                'tickets_this_year': tickets_this_year,
-                'tickets_resolved_this_month': tickets_resolved_this_month,
+                'total_tickets': compteurs['total_tickets'],
+                'tickets_today': compteurs['tickets_today'],
+                'tickets_this_month': compteurs['tickets_this_month'],
+                'tickets_this_year': compteurs['tickets_this_year'],
+                'tickets_resolved_this_month': compteurs['tickets_resolved_this_month'],
                 'avg_resolution_time_hours': round(avg_resolution_time, 1),
+                'resolution_time_p50_hours': round(resolution['p50'], 1),
+                'resolution_time_p90_hours': round(resolution['p90'], 1),
                 'tickets_by_status': status_data,
-                'tickets_by_category': list(category_data.values()),
+                'tickets_by_category': self.format_category_months(tickets_by_category_month),
                 'tickets_by_priority': priority_data,
             },
             'recent_tickets': recent_tickets,
             'summary': {
-                'pending_tickets': user_tickets.filter(statut_ticket__in=['ouvert', 'en_cours']).count(),
-                'urgent_tickets': user_tickets.filter(priorite__in=['urgent', 'critique']).count(),
-                'last_ticket_date': user_tickets.first().date_creation if user_tickets.exists() else None
+                'pending_tickets': compteurs['pending_tickets'],
+                'urgent_tickets': compteurs['urgent_tickets'],
+                'last_ticket_date': derniers_tickets[0].date_creation if derniers_tickets else None
             }
         })
-    
-    def get_technician_dashboard(self, user, current_year, current_month):
-        """Récupère les données du tableau de bord pour un technicien"""
-        # Tickets assignés au technicien
-        assigned_tickets = Ticket.objects.filter(technicien_assigne=user)
-        all_tickets = Ticket.objects.all()
 
-        # Statistiques temporelles
-        today = timezone.now().date()
-        tickets_assigned_today = assigned_tickets.filter(date_creation__date=today).count()
-        tickets_resolved_this_month = assigned_tickets.filter(
-            statut_ticket='resolu',
-            date_modification__year=current_year,
-            date_modification__month=current_month
-        ).count()
-        tickets_assigned_this_year = assigned_tickets.filter(date_creation__year=current_year).count()
-
-        # Tickets non assignés (disponibles)
-        unassigned_tickets = all_tickets.filter(technicien_assigne__isnull=True).count()
-
-        # Temps moyen de résolution
-        resolved_tickets = assigned_tickets.filter(statut_ticket='resolu')
-        avg_resolution_time = 0
-        if resolved_tickets.exists():
-            resolution_times = []
-            for ticket in resolved_tickets:
-                if ticket.date_modification:
-                    resolution_time = (ticket.date_modification - ticket.date_creation).total_seconds() / 3600
-                    resolution_times.append(resolution_time)
-
-            if resolution_times:
-                avg_resolution_time = sum(resolution_times) / len(resolution_times)
-
-        # Statistiques par statut (tickets assignés)
-        tickets_by_status = assigned_tickets.values('statut_ticket').annotate(
-            count=Count('id')
-        ).order_by('statut_ticket')
-
-        status_display_map = dict(Ticket.STATUT_TICKET_CHOICES)
-        status_data = [
-            {
-                'name': status_display_map.get(item['statut_ticket'], item['statut_ticket']),
-                'value': item['count']
-            }
-            for item in tickets_by_status
-        ]
-
-        # Statistiques par priorité (tickets assignés)
-        tickets_by_priority = assigned_tickets.values('priorite').annotate(
-            count=Count('id')
-        ).order_by('priorite')
-
-        # Formater les données pour le graphique des priorités
-        priority_display_map = dict(Ticket.PRIORITE_CHOICES)
-        priority_data = [
-            {
-                'name': priority_display_map.get(item['priorite'], item['priorite']),
-                'value': item['count']
-            }
-            for item in tickets_by_priority
-        ]
+    def get_technician_dashboard(self, user, current_year, current_month):
+        """Récupère les données du tableau de bord pour un technicien (lu dans les agrégats)"""
+        statistiques = StatistiqueTicketJour.objects.all()
+        assigned_stats = statistiques.filter(technicien=user)
+        today = timezone.localdate()
+
+        # Compteurs des tickets assignés (et tickets non assignés disponibles) en une requête
+        totaux = agreger_statistiques(statistiques, today, Q(technicien=user))
+        avg_resolution_time = duree_moyenne_heures(totaux)
+        resolution = statistiques_resolution(Ticket.objects.filter(technicien_assigne=user))
+
+        # Statistiques par statut et par priorité (tickets assignés)
+        status_data = self.format_distribution(
+            self.sum_by(assigned_stats, 'statut_ticket'), 'statut_ticket', Ticket.STATUT_TICKET_CHOICES
+        )
+        priority_data = self.format_distribution(
+            self.sum_by(assigned_stats, 'priorite'), 'priorite', Ticket.PRIORITE_CHOICES
+        )
 
         # Tickets par catégorie (6 derniers mois) - tous les tickets
-        six_months_ago = timezone.now() - timedelta(days=180)
-        tickets_by_category_month = all_tickets.filter(
-            date_creation__gte=six_months_ago
-        ).annotate(
-            month=ExtractMonth('date_creation'),
-            year=ExtractYear('date_creation')
-        ).values(
-            'month', 'year', 'categorie__nom_categorie'
-        ).annotate(
-            count=Count('id')
-        ).order_by('year', 'month')
-
-        # Organiser les données par mois
-        category_data = {}
-        for item in tickets_by_category_month:
-            month_key = f"{self.get_month_name(item['month'])} {item['year']}"
-            if month_key not in category_data:
-                category_data[month_key] = {'name': month_key}
-            category_data[month_key][item['categorie__nom_categorie']] = item['count']
+        tickets_by_category_month = self.sum_by_category_month(statistiques)
 
         # Derniers commentaires sur les tickets assignés
-        recent_comments = Commentaire.objects.filter(
-            Q(ticket__technicien_assigne=user) | Q(utilisateur_auteur=user)
-        ).order_by('-date_commentaire')[:5]
+        # Deux requêtes indexées fusionnées : le OR à travers la jointure forçait un parcours complet
+        commentaires = Commentaire.objects.select_related('utilisateur_auteur').order_by('-date_commentaire')
+        recent_comments = {
+            comment.id: comment
+            for comment in [*commentaires.filter(ticket__technicien_assigne=user)[:5],
+                            *commentaires.filter(utilisateur_auteur=user)[:5]]
+        }
+        recent_comments = sorted(recent_comments.values(), key=lambda comment: comment.date_commentaire,
+                                 reverse=True)[:5]
 
         recent_comments_data = CommentaireSerializer(recent_comments, many=True, context={'request': self.request}).data
 
         # Tickets récents assignés
         recent_assigned_tickets = TicketListSerializer(
-            assigned_tickets.order_by('-date_creation')[:5],
+            Ticket.objects.filter(technicien_assigne=user).select_related(
+                'categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne'
+            ).order_by('-date_creation')[:5],
             many=True,
             context={'request': self.request}
         ).data
 
         # Performance du technicien
-        total_assigned = assigned_tickets.count()
-        total_resolved = resolved_tickets.count()
+        total_assigned = totaux['total']
+        total_resolved = totaux['resolus']
         resolution_rate = (total_resolved / total_assigned * 100) if total_assigned > 0 else 0
 
-        # Tickets prioritaires assignés
-        urgent_tickets = assigned_tickets.filter(priorite__in=['urgent', 'critique']).count()
-
         return Response({
-            'user_info': {
-                'name': user.get_full_name() or user.email,
-                'role': user.get_role_display(),
-                'department': user.departement.nom_departement if user.departement else 'Non spécifié'
-            },
+            'user_info': self.get_user_info(user),
             'stats': {
                 'total_assigned': total_assigned,
-                'tickets_assigned_today': tickets_assigned_today,
-                'tickets_resolved_this_month': tickets_resolved_this_month,
-                'tickets_assigned_this_year': tickets_assigned_this_year,
-                'unassigned_tickets': unassigned_tickets,
+                'tickets_assigned_today': totaux['aujourd_hui'],
+                'tickets_resolved_this_month': totaux['resolus_ce_mois'],
+                'tickets_assigned_this_year': totaux['cette_annee'],
+                'unassigned_tickets': totaux['non_assignes'],
                 'avg_resolution_time_hours': round(avg_resolution_time, 1),
+                'resolution_time_p50_hours': round(resolution['p50'], 1),
+                'resolution_time_p90_hours': round(resolution['p90'], 1),
                 'resolution_rate': round(resolution_rate, 1),
-                'urgent_tickets': urgent_tickets,
+                'urgent_tickets': totaux['urgents'],
                 'tickets_by_status': status_data,
-                'tickets_by_category': list(category_data.values()),
+                'tickets_by_category': self.format_category_months(tickets_by_category_month),
                 'tickets_by_priority': priority_data,
             },
             'recent_tickets': recent_assigned_tickets,
@@ -2021,119 +2035,89 @@ class DashboardDataView(APIView):
                 'total_resolved': total_resolved,
                 'resolution_rate': round(resolution_rate, 1),
                 'avg_resolution_time': round(avg_resolution_time, 1),
-                'tickets_this_month': tickets_resolved_this_month
+                'tickets_this_month': totaux['resolus_ce_mois']
             }
         })
 
     def get_admin_dashboard(self, user, current_year, current_month):
-        """Récupère les données du tableau de bord pour un administrateur"""
-        all_tickets = Ticket.objects.all()
+        """Récupère les données du tableau de bord pour un administrateur (lu dans les agrégats)"""
+        statistiques = StatistiqueTicketJour.objects.all()
+        today = timezone.localdate()
 
-        # Statistiques temporelles globales
-        today = timezone.now().date()
-        tickets_today = all_tickets.filter(date_creation__date=today).count()
-        tickets_this_month = all_tickets.filter(
-            date_creation__year=current_year,
-            date_creation__month=current_month
-        ).count()
-        tickets_this_year = all_tickets.filter(date_creation__year=current_year).count()
+        # Compteurs globaux en une requête
+        totaux = agreger_statistiques(statistiques, today)
+        avg_resolution_time = duree_moyenne_heures(totaux)
+        resolution = statistiques_resolution(Ticket.objects.all())
+        total_tickets = totaux['total']
+        resolved_tickets = totaux['resolus']
 
         # Statistiques par statut (tous les tickets)
-        tickets_by_status = all_tickets.values('statut_ticket').annotate(
-            count=Count('id')
-        ).order_by('statut_ticket')
-        
-        status_display_map = dict(Ticket.STATUT_TICKET_CHOICES)
-        status_data = [
-            {
-                'name': status_display_map.get(item['statut_ticket'], item['statut_ticket']),
-                'value': item['count']
-            }
-            for item in tickets_by_status
-        ]
-        
-        # Tickets par catégorie (6 derniers mois)
-        six_months_ago = timezone.now() - timedelta(days=180)
-        tickets_by_category_month = all_tickets.filter(
-            date_creation__gte=six_months_ago
-        ).annotate(
-            month=ExtractMonth('date_creation'),
-            year=ExtractYear('date_creation')
-        ).values(
-            'month', 'year', 'categorie__nom_categorie'
-        ).annotate(
-            count=Count('id')
-        ).order_by('year', 'month')
+        status_data = self.format_distribution(
+            self.sum_by(statistiques, 'statut_ticket'), 'statut_ticket', Ticket.STATUT_TICKET_CHOICES
+        )
 
-        # Organiser les données par mois
-        category_data = {}
-        for item in tickets_by_category_month:
-            month_key = f"{self.get_month_name(item['month'])} {item['year']}"
-            if month_key not in category_data:
-                category_data[month_key] = {'name': month_key}
-            category_data[month_key][item['categorie__nom_categorie']] = item['count']
+        # Tickets par catégorie (6 derniers mois)
+        tickets_by_category_month = self.sum_by_category_month(statistiques)
 
         # Statistiques des techniciens
-        technician_stats = CustomUser.objects.filter(role='technicien', statut='actif').annotate(
-            assigned_tickets=Count('tickets_assignes'),
-            resolved_tickets=Count('tickets_assignes', filter=Q(tickets_assignes__statut_ticket='resolu'))
-        ).values('email', 'first_name', 'last_name', 'assigned_tickets', 'resolved_tickets')
-
-        # Performance globale
-        total_tickets = all_tickets.count()
-        resolved_tickets = all_tickets.filter(statut_ticket='resolu').count()
-        pending_tickets = all_tickets.filter(statut_ticket__in=['ouvert', 'en_cours']).count()
-        urgent_tickets = all_tickets.filter(priorite__in=['urgent', 'critique']).count()
-
-        # Temps moyen de résolution global
-        resolved_tickets_with_time = all_tickets.filter(statut_ticket='resolu', date_modification__isnull=False)
-        avg_resolution_time = 0
-        if resolved_tickets_with_time.exists():
-            resolution_times = []
-            for ticket in resolved_tickets_with_time:
-                resolution_time = (ticket.date_modification - ticket.date_creation).total_seconds() / 3600
-                resolution_times.append(resolution_time)
-
-            if resolution_times:
-                avg_resolution_time = sum(resolution_times) / len(resolution_times)
+        technicians = list(CustomUser.objects.filter(role='technicien', statut='actif').values(
+            'id', 'email', 'first_name', 'last_name'
+        ))
+        per_technician = {
+            item['technicien']: item
+            for item in statistiques.filter(technicien__isnull=False).values('technicien').annotate(
+                assigned_tickets=Sum('nombre'),
+                resolved_tickets=Sum('nombre', filter=Q(statut_ticket='resolu'))
+            ).order_by()
+        }
+        technician_stats = [
+            {
+                'email': technician['email'],
+                'first_name': technician['first_name'],
+                'last_name': technician['last_name'],
+                'assigned_tickets': per_technician.get(technician['id'], {}).get('assigned_tickets') or 0,
+                'resolved_tickets': per_technician.get(technician['id'], {}).get('resolved_tickets') or 0,
+            }
+            for technician in technicians
+        ]
 
         # Tickets récents (tous)
         recent_tickets = TicketListSerializer(
-            all_tickets.order_by('-date_creation')[:10],
+            Ticket.objects.select_related(
+                'categorie', 'equipement', 'utilisateur_createur', 'technicien_assigne'
+            ).order_by('-date_creation')[:10],
             many=True,
             context={'request': self.request}
         ).data
 
         # Statistiques par département
-        dept_stats = all_tickets.values(
-            'utilisateur_createur__departement__nom_departement'
+        dept_stats = statistiques.values(
+            'departement__nom_departement'
         ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:5]
+            count=Sum('nombre')
+        ).filter(count__gt=0).order_by('-count')[:5]
 
         return Response({
-            'user_info': {
-                'name': user.get_full_name() or user.email,
-                'role': user.get_role_display(),
-                'department': user.departement.nom_departement if user.departement else 'Non spécifié'
-            },
+            'user_info': self.get_user_info(user),
             'stats': {
                 'total_tickets': total_tickets,
-                'tickets_today': tickets_today,
-                'tickets_this_month': tickets_this_month,
-                'tickets_this_year': tickets_this_year,
+                'tickets_today': totaux['aujourd_hui'],
+                'tickets_this_month': totaux['ce_mois'],
+                'tickets_this_year': totaux['cette_annee'],
                 'resolved_tickets': resolved_tickets,
-                'pending_tickets': pending_tickets,
-                'urgent_tickets': urgent_tickets,
+                'pending_tickets': totaux['en_attente'],
+                'urgent_tickets': totaux['urgents'],
                 'avg_resolution_time_hours': round(avg_resolution_time, 1),
+                'resolution_time_p50_hours': round(resolution['p50'], 1),
+                'resolution_time_p90_hours': round(resolution['p90'], 1),
                 'tickets_by_status': status_data,
-                'tickets_by_category': list(category_data.values()),
+                'tickets_by_category': self.format_category_months(tickets_by_category_month),
             },
             'recent_tickets': recent_tickets,
-            'technician_performance': list(technician_stats),
+            'technician_performance': technician_stats,
             'department_stats': [
                 {
-                    'department': item['utilisateur_createur__departement__nom_departement'] or 'Non spécifié',
+                    'department': item['departement__nom_departement'] or 'Non spécifié',
                     'count': item['count']
                 }
                 for item in dept_stats
@@ -2141,11 +2125,62 @@ class DashboardDataView(APIView):
             'system_health': {
                 'resolution_rate': round((resolved_tickets / total_tickets * 100) if total_tickets > 0 else 0, 1),
                 'avg_resolution_time': round(avg_resolution_time, 1),
-                'active_technicians': CustomUser.objects.filter(role='technicien', statut='actif').count(),
+                'active_technicians': len(technicians),
                 'total_users': CustomUser.objects.filter(statut='actif').count()
             }
         })
-    
+
+    @staticmethod
+    def get_user_info(user):
+        return {
+            'name': user.get_full_name() or user.email,
+            'role': user.get_role_display(),
+            'department': user.departement.nom_departement if user.departement else 'Non spécifié'
+        }
+
+    @staticmethod
+    def sum_by(statistiques, champ):
+        """Nombre de tickets par valeur de `champ` (lignes vides ignorées)"""
+        return statistiques.values(champ).annotate(count=Sum('nombre')).filter(count__gt=0).order_by(champ)
+
+    @staticmethod
+    def sum_by_category_month(statistiques):
+        """Tickets créés par mois et par catégorie sur les 6 derniers mois"""
+        # Granularité journalière : le jour limite (partiellement hors période) est exclu
+        six_months_ago = (timezone.now() - timedelta(days=180)).date()
+        return statistiques.filter(
+            jour__gt=six_months_ago
+        ).annotate(
+            month=ExtractMonth('jour'),
+            year=ExtractYear('jour')
+        ).values(
+            'month', 'year', 'categorie__nom_categorie'
+        ).annotate(
+            count=Sum('nombre')
+        ).filter(count__gt=0).order_by('year', 'month')
+
+    @staticmethod
+    def format_distribution(items, champ, choices):
+        """Formater une répartition pour les graphiques ({name, value})"""
+        display_map = dict(choices)
+        return [
+            {
+                'name': display_map.get(item[champ], item[champ]),
+                'value': item['count']
+            }
+            for item in items
+        ]
+
+    def format_category_months(self, items):
+        """Organiser les données par mois pour le graphique des catégories"""
+        category_data = {}
+        for item in items:
+            month_key = f"{self.get_month_name(item['month'])} {item['year']}"
+            if month_key not in category_data:
+                category_data[month_key] = {'name': month_key}
+            category_data[month_key][item['categorie__nom_categorie']] = item['count']
+        return list(category_data.values())
+
     def get_month_name(self, month_number):
         """Retourne le nom du mois à partir de son numéro"""
         months = [
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import {
   FaRobot, FaPause, FaStop, FaTimes,
   FaClock, FaExclamationTriangle, FaInfoCircle,
@@ -7,6 +7,10 @@ import {
 } from 'react-icons/fa';
 import apiService from '../../services/api';
 
+// Le diagnostic système s'exécute en arrière-plan (20 s au plus côté serveur, plus l'attente dans la file)
+const DELAI_MAX_DIAGNOSTIC_SYSTEME = 60000;
+const INTERVALLE_INTERROGATION_MS = 1500;
+
 const DiagnosticManuelModal = ({ isOpen, onClose, categoryId, onComplete }) => {
   // États pour le diagnostic en cours
   const [currentSession, setCurrentSession] = useState(null);
@@ -22,28 +26,117 @@ const DiagnosticManuelModal = ({ isOpen, onClose, categoryId, onComplete }) => {
   const [showSystemInfo, setShowSystemInfo] = useState(false);
   const [systemInfoLoading, setSystemInfoLoading] = useState(false);
 
-  // Charger les informations système détaillées (fallback)
-  const loadSystemInfo = useCallback(async (sessionId) => {
-    try {
-      setSystemInfoLoading(true);
+  // Suivi du diagnostic système exécuté en arrière-plan (WebSocket, puis interrogation en secours)
+  const suiviSystemeRef = useRef(null);
+
+  const arreterSuiviSysteme = useCallback(() => {
+    const suivi = suiviSystemeRef.current;
+    if (suivi) {
+      suivi.actif = false;
+      clearTimeout(suivi.timer);
+      if (suivi.socket) {
+        suivi.socket.onclose = null;
+        suivi.socket.close();
+      }
+      suiviSystemeRef.current = null;
+    }
+  }, []);
 
-      // Attendre un peu pour que le diagnostic automatique se termine
-      await new Promise(resolve => setTimeout(resolve, 2000));
+  // Interroger la session jusqu'à ce que les résultats du diagnostic soient enregistrés
+  const interrogerSession = useCallback((suivi, sessionId) => {
+    const echeance = Date.now() + DELAI_MAX_DIAGNOSTIC_SYSTEME;
+
+    const interroger = async () => {
+      if (!suivi.actif) return;
+      try {
+        const sessionDetails = await apiService.getDiagnosticSession(sessionId);
+        const resultats = sessionDetails.diagnostic_automatique;
+        if (!suivi.actif) return;
+        if (resultats && Object.keys(resultats).length > 0) {
+          setSystemInfo(resultats);
+          setSystemInfoLoading(false);
+          arreterSuiviSysteme();
+          return;
+        }
+      } catch (err) {
+        console.error('Erreur lors du chargement des infos système:', err);
+      }
+      if (Date.now() >= echeance) {
+        setError('Impossible de charger les informations système');
+        setSystemInfoLoading(false);
+        arreterSuiviSysteme();
+        return;
+      }
+      suivi.timer = setTimeout(interroger, INTERVALLE_INTERROGATION_MS);
+    };
 
-      // Récupérer les détails de la session avec les diagnostics
-      const sessionDetails = await apiService.getDiagnosticSession(sessionId);
+    interroger();
+  }, [arreterSuiviSysteme]);
 
-      if (sessionDetails.diagnostic_automatique) {
-        setSystemInfo(sessionDetails.diagnostic_automatique);
-      }
+  // Charger les informations système : chaque sonde est affichée dès qu'elle est terminée
+  const loadSystemInfo = useCallback((sessionId) => {
+    arreterSuiviSysteme();
+    const suivi = { actif: true, socket: null, timer: null };
+    suiviSystemeRef.current = suivi;
+    setSystemInfoLoading(true);
 
+    const token = localStorage.getItem('access_token');
+    let socket;
+    try {
+      socket = new WebSocket(`ws://localhost:8000/ws/diagnostic/${sessionId}/?token=${token}`);
     } catch (err) {
-      console.error('Erreur lors du chargement des infos système:', err);
+      console.error('Erreur lors de la création du WebSocket diagnostic:', err);
+      interrogerSession(suivi, sessionId);
+      return;
+    }
+    suivi.socket = socket;
+
+    const terminer = (resultats) => {
+      setSystemInfo(resultats);
+      setSystemInfoLoading(false);
+      arreterSuiviSysteme();
+    };
+
+    const echouer = (message) => {
+      console.error('Erreur du diagnostic système:', message);
       setError('Impossible de charger les informations système');
-    } finally {
       setSystemInfoLoading(false);
-    }
-  }, []);
+      arreterSuiviSysteme();
+    };
+
+    socket.onmessage = (event) => {
+      if (!suivi.actif) return;
+      try {
+        const data = JSON.parse(event.data);
+        if (data.type === 'diagnostic_etat') {
+          if (data.statut === 'termine') {
+            terminer(data.resultats);
+          } else if (data.statut === 'erreur') {
+            echouer(data.erreur);
+          } else if (data.resultats && Object.keys(data.resultats).length > 0) {
+            setSystemInfo({ ...data.resultats });
+            setSystemInfoLoading(false);
+          }
+        } else if (data.type === 'diagnostic_progression') {
+          setSystemInfo(prev => ({ ...(prev || {}), [data.sonde]: data.resultat }));
+          setSystemInfoLoading(false);
+        } else if (data.type === 'diagnostic_termine') {
+          terminer(data.resultats);
+        } else if (data.type === 'diagnostic_erreur') {
+          echouer(data.erreur);
+        }
+      } catch (err) {
+        console.error('Erreur parsing message WebSocket diagnostic:', err);
+      }
+    };
+
+    // Connexion refusée ou perdue avant la fin : les résultats sont lus sur la session
+    socket.onclose = () => {
+      if (!suivi.actif) return;
+      suivi.socket = null;
+      interrogerSession(suivi, sessionId);
+    };
+  }, [arreterSuiviSysteme, interrogerSession]);
 
   // Charger les informations de la catégorie
   const loadCategoryInfo = useCallback(async () => {
@@ -81,17 +174,13 @@ const DiagnosticManuelModal = ({ isOpen, onClose, categoryId, onComplete }) => {
 
       setCurrentSession(response.session_id);
 
-      // Toujours attendre un minimum pour l'effet visuel du chargement
+      // Les résultats du diagnostic système arrivent après la réponse, sans bloquer les questions
       if (showSystemInfo) {
-        // Si les données sont déjà dans la réponse, les utiliser après un délai minimum
-        if (response.diagnostic_automatique) {
-          // Attendre un minimum de 2 secondes pour l'effet visuel
-          await new Promise(resolve => setTimeout(resolve, 2000));
+        if (response.diagnostic_automatique && Object.keys(response.diagnostic_automatique).length > 0) {
           setSystemInfo(response.diagnostic_automatique);
           setSystemInfoLoading(false);
         } else {
-          // Sinon, utiliser le fallback avec loadSystemInfo
-          await loadSystemInfo(response.session_id);
+          loadSystemInfo(response.session_id);
         }
       }
 
@@ -133,8 +222,12 @@ const DiagnosticManuelModal = ({ isOpen, onClose, categoryId, onComplete }) => {
       setSystemInfo(null);
       setShowSystemInfo(false);
       setSystemInfoLoading(false);
+      arreterSuiviSysteme();
     }
-  }, [isOpen]);
+  }, [isOpen, arreterSuiviSysteme]);
+
+  // Fermer le suivi du diagnostic système au démontage
+  useEffect(() => arreterSuiviSysteme, [arreterSuiviSysteme]);
 
   // Charger la prochaine question
   const loadNextQuestion = useCallback(async (sessionId) => {